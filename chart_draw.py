@@ -1,25 +1,24 @@
 import math
-import os
 import sys
 from typing import Dict
 
 import matplotlib
 import matplotlib.pyplot
 import numpy
-import pandas
 from gym.envs.registration import patch_deprecated_methods
 
+from src.summary import box_stats, summarize_folder
+
 
 def invalid_moves_while_learning(folder):
-    headers = ['invalid', 'reward', 'cards_played']
     data: Dict[str, numpy.ndarray] = {}
     files = ("0defence", "10defence", "29defence")
+    summaries = summarize_folder(folder)
 
-    for data_file in sorted(sorted(os.listdir(folder)), key=len):
+    for data_file in sorted(sorted(summaries), key=len):
         for f in files:
             if data_file.startswith(f):
-                df = pandas.read_csv(os.path.join(folder, data_file), names=headers)
-                data[f] = df['invalid']
+                data[f] = numpy.asarray(summaries[data_file]['invalid'])
 
     x = numpy.arange(len(data[f]))
 
@@ -35,31 +34,30 @@ def invalid_moves_while_learning(folder):
 
 
 def validation_tricks_won(folders):
-    return _draw_boxchart(folders, 'tricks_won', 'Mean tricks won on validation', 'Mean tricks')
+    return _draw_boxchart(folders, 'value_counts', 'Mean tricks won on validation', 'Mean tricks')
 
 
 def validation_invalid(folders):
-    return _draw_boxchart(folders, 'invalid', 'Invalid moves on validation', 'Invalid moves')
+    return _draw_boxchart(folders, 'invalid_counts', 'Invalid moves on validation', 'Invalid moves')
 
 
 def _draw_boxchart(folders, column, title, y_label):
-    headers = ['invalid', 'tricks_won', 'cards_played']
-    data: Dict[str, numpy.ndarray] = {}
+    data: Dict[str, dict] = {}
     fig, ax = matplotlib.pyplot.subplots()
     labels = ['initial state', 'learning rules', 'learning both rules and q value']
     colors = ['green', 'blue', 'aqua']
     legend = []
 
     for i, folder in enumerate(folders):
-        width = 1 / (len(os.listdir(folder)) + 1)
-        for data_file in sorted(sorted(os.listdir(folder)), key=len):
+        summaries = summarize_folder(folder)
+        width = 1 / (len(summaries) + 1)
+        for data_file in sorted(sorted(summaries), key=len):
             dataset = " ".join(data_file.split('.')[0])
-            df = pandas.read_csv(os.path.join(folder, data_file), names=headers)
-            data[dataset] = df[column]
+            data[dataset] = box_stats(summaries[data_file][column], dataset)
 
         x = numpy.arange(len(data.items()))
         x = x - width + (i * width)
-        box = ax.boxplot(data.values(), widths=width, positions=x, patch_artist=True)
+        box = ax.bxp(list(data.values()), widths=width, positions=x, patch_artist=True)
         for patch in box['boxes']:
             patch.set_facecolor(colors[i])
         legend.append(patch)
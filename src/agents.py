@@ -1,20 +1,63 @@
-import json
 import random
 import sys
 from abc import ABCMeta
-from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
 
 import numpy
 
+from src.architectures import ARCHITECTURES, DEFAULT_ARCHITECTURE
+from src.encoding import DECK_SIZE, STATE_SIZE, InputPattern, encode_game
+from src.endgame import EndgameTable
+from src.engine import StateView
+from src.inference import NUMPY_FILE, NumpyQNetwork
 from src.models import GameState
-from src.network import InputPattern, load_model, model
+from src.replay import Batch
+from src.solver import DoubleDummySolver, to_bit_state
+from src.store import HashStore
 
 
-class NumpyEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, numpy.ndarray):
-            return obj.tolist()
-        return json.JSONEncoder.default(self, obj)
+def legal_mask(state: GameState) -> numpy.ndarray:
+    # (DECK_SIZE,) legal cards of the player to move, what action selection and the Q updates are masked by
+    if isinstance(state, StateView):
+        return state.action_mask()
+    mask = numpy.zeros(DECK_SIZE, dtype=bool)
+    mask[list(state.valid_moves)] = True
+    return mask
+
+
+def masked_argmax(q_values: numpy.ndarray, legal: numpy.ndarray) -> int:
+    return int(numpy.argmax(numpy.where(legal, q_values, -numpy.inf)))
+
+
+def _indexed(state: Dict[str, numpy.ndarray], prefix: str) -> List[numpy.ndarray]:
+    # arrays stored as `prefix.0`, `prefix.1`, ... back in order
+    count = sum(1 for name in state if name.startswith(f'{prefix}.'))
+    return [state[f'{prefix}.{index}'] for index in range(count)]
+
+
+def _optimizer_variables(optimizer) -> list:
+    # optimizers of models loaded from old files are the legacy Keras kind, where `variables` is a method
+    variables = optimizer.variables
+    return variables() if callable(variables) else variables
+
+
+def state_input(state: GameState, out: numpy.ndarray = None) -> numpy.ndarray:
+    # (1, STATE_SIZE) network input of the position; engine states are encoded from their bit masks into `out`
+    if isinstance(state, StateView):
+        return encode_game(state.game, out).reshape(1, STATE_SIZE)
+    model_input = InputPattern(
+        trump=state.trump.id,
+        hand1=state.player_hand,
+        hand2=state.left_opponent_hand,
+        hand3=state.partner_hand,
+        hand4=state.right_opponent_hand,
+        trick=state.trick.cards,
+        trick_suite=state.trick.color.id if state.trick.color else -1
+    )
+    if out is None:
+        return model_input.get_array()
+    out[...] = model_input.input
+    return out.reshape(1, STATE_SIZE)
 
 
 class Agent(metaclass=ABCMeta):
@@ -26,125 +69,216 @@ class Agent(metaclass=ABCMeta):
 class RandomAgent(Agent):
     @classmethod
     def move(cls, state: GameState) -> int:
-        return random.sample(state.valid_moves, 1)[0]
+        if isinstance(state, StateView):
+            return random.choice(state.game.legal_moves())
+        return random.choice(tuple(state.valid_moves))
+
+
+class DoubleDummyAgent(Agent):
+    # Perfect play with all hands visible; as a teacher `move_values` gives the tricks each legal card leads to.
+    # Positions with more than `max_cards` in the player's hand are left to `fallback`, as early full-deal
+    # searches take too long for the training loop; up to 7 cards a search stays well under a second.
+    def __init__(self, solver: DoubleDummySolver = None, max_cards: int = 7, fallback: Agent = None):
+        self.solver = solver or DoubleDummySolver()
+        self.max_cards = max_cards
+        self.fallback = fallback or RandomAgent()
+
+    def move(self, state: GameState) -> int:
+        if len(state.player_hand) > self.max_cards:
+            return self.fallback.move(state)
+        return self.solver.best_move(state)
+
+    def move_values(self, state: GameState) -> Dict[int, int]:
+        return self.solver.move_values(state)
 
 
 class QLearnAgent(Agent):
-    def __init__(self, learning_rate: float = 0.0, discount_factor: float = 0.0, rand_factor: float = 0.0):
-        self.q_table = defaultdict(lambda: numpy.zeros(52))
+    def __init__(
+        self,
+        learning_rate: float = 0.0,
+        discount_factor: float = 0.0,
+        rand_factor: float = 0.0,
+        dtype: numpy.dtype = numpy.float32
+    ):
+        self.q_table = HashStore(DECK_SIZE, dtype)
         self.learning_rate = learning_rate
         self.rand_factor = rand_factor
         self.discount_factor = discount_factor
-        self.data_file = f'src/q_models_data/q_learn.json'
+        self.data_file = f'src/q_models_data/q_learn.bin'
         self.load()
 
     def move(self, state: GameState) -> int:
-        key = self._state_to_input(state)
-        #Update invalid actions:
-        for action, _ in enumerate(self.q_table[key]):
-            if action not in state.valid_moves:
-                self.q_table[key][action] = -float('inf')
+        legal = legal_mask(state)
         if self.learning_rate > 0 and random.random() < self.rand_factor:
-            valid_actions = numpy.where(self.q_table[key] > -float('inf'))[0]
-            return int(numpy.random.choice(valid_actions))
+            return int(numpy.random.choice(numpy.flatnonzero(legal)))
+        return masked_argmax(self.q_table.get(self._state_to_input(state)), legal)
 
-        return int(numpy.argmax(self.q_table[key]))
+    def _state_to_input(self, state: GameState) -> int:
+        return to_bit_state(state).key()
 
-    def _state_to_input(self, state: GameState):
-        return str(state)
-
-    def update_q(self, state: GameState, action: int, reward: float, new_state: GameState):
-        state_key = self._state_to_input(state)
-        new_state_key = self._state_to_input(new_state)
-        old_q_value = self.q_table[state_key][action]
-        next_max = numpy.max(self.q_table[new_state_key])
-        new_q_value = (1 - self.learning_rate) * old_q_value \
+    def update_q(self, state: GameState, action: int, reward: float, new_state: GameState, done: bool = False):
+        q_values = self.q_table.row(self._state_to_input(state))
+        next_max = 0 if done else numpy.max(self.q_table.get(self._state_to_input(new_state))[legal_mask(new_state)])
+        new_q_value = (1 - self.learning_rate) * q_values[action] \
                     + self.learning_rate * (reward + self.discount_factor * next_max)
-        self.q_table[state_key][action] = new_q_value
+        q_values[action] = new_q_value
+
+    def get_state(self) -> Dict[str, numpy.ndarray]:
+        # copies of everything training changes, for checkpoints
+        return {'q_table.keys': numpy.array(self.q_table.keys), 'q_table.values': numpy.array(self.q_table.values)}
+
+    def set_state(self, state: Dict[str, numpy.ndarray]) -> None:
+        values = state['q_table.values']
+        self.q_table = HashStore(values.shape[1], values.dtype, capacity=1)
+        self.q_table.keys = numpy.array(state['q_table.keys'])
+        self.q_table.values = numpy.array(values)
+        self.q_table.count = int(numpy.count_nonzero(self.q_table.keys))
 
     def save(self):
-        with open(self.data_file, 'w') as f:
-            json.dump(self.q_table, f, sort_keys=True, indent=2, cls=NumpyEncoder)
+        self.q_table.save(self.data_file)
 
     def load(self):
         try:
-            with open(self.data_file, 'r') as f:
-                json_data = json.load(f)
-            for key, value in json_data.items():
-                self.q_table[key] = numpy.asarray(value)
-
-        except:
+            self.q_table = HashStore.load(self.data_file)
+        except FileNotFoundError:
             print(f'Data file {self.data_file} not found', sys.stderr)
 
 
 class DeepQLearnAgent(Agent):
     # Implementing EpsGreedyPolicy
-    def __init__(self, learning_rate: float = 0.0, discount_factor: float = 0.0, rand_factor: float = 0.0):
+    # Every named architecture (see `architectures.ARCHITECTURES`) keeps its own data file; the default one the
+    # original.
+    def __init__(
+        self,
+        learning_rate: float = 0.0,
+        discount_factor: float = 0.0,
+        rand_factor: float = 0.0,
+        target_sync: int = 0,
+        architecture: str = None
+    ):
         self.learning_rate = learning_rate
         self.rand_factor = rand_factor
         self.discount_factor = discount_factor
+        self.target_sync = target_sync
+        self.architecture = architecture
+        self.config = None
         self.model = None
-        self.data_file = f'src/q_models_data/deep_q_learn.h5'
+        self.predictor = None
+        self.trainer = None
+        suffix = f'-{architecture}' if architecture else ''
+        self.data_file = f'src/q_models_data/deep_q_learn{suffix}.h5'
         self.load()
 
     def move(self, state: GameState) -> int:
-        state_input = self._state_to_input(state)
-        q_values = self.model.predict(state_input)[0]
+        q_values = self.predictor(self._state_to_input(state))[0]
+        return self._select_action(state, q_values)
+
+    def move_batch(self, states: Sequence[GameState]) -> numpy.ndarray:
+        inputs = numpy.empty((len(states), STATE_SIZE), dtype=numpy.float32)
+        for row, state in enumerate(states):
+            state_input(state, inputs[row])
+        q_values = self.predictor(inputs)
+        return numpy.asarray([self._select_action(state, values) for state, values in zip(states, q_values)])
+
+    def _select_action(self, state: GameState, q_values: numpy.ndarray) -> int:
+        legal = legal_mask(state)
         if self.learning_rate > 0 and random.random() < self.rand_factor:
-            card_in_hand = len(state.player_hand)
-            n_best = q_values.argsort()[card_in_hand:][::-1]
-            action = random.choice(n_best)
-        else:
-            action = int(numpy.argmax(q_values))
-        return action
-
-    def _state_to_input(self, state: GameState):
-        model_input = InputPattern(
-            trump=state.trump.id,
-            hand1=state.player_hand,
-            hand2=state.left_opponent_hand,
-            hand3=state.partner_hand,
-            hand4=state.right_opponent_hand,
-            trick=state.trick.cards,
-            trick_suite=state.trick.color.id if state.trick.color else -1
+            return int(random.choice(numpy.flatnonzero(legal)))
+        return masked_argmax(q_values, legal)
+
+    def _state_to_input(self, state: GameState) -> numpy.ndarray:
+        return state_input(state)
+
+    def update_q(self, state: GameState, action: int, reward: float, new_state: GameState, done: bool = False):
+        self.trainer(
+            self._state_to_input(state), [action], [reward], self._state_to_input(new_state), [done],
+            legal_mask(state)[None], legal_mask(new_state)[None]
         )
-        return model_input.get_array()
 
-    def update_q(self, state: GameState, action: int, reward: float, new_state: GameState):
-        state_input = self._state_to_input(state)
-        new_state_input = self._state_to_input(new_state)
-        old_q_values = self.model.predict(state_input)[0]
-        next_q_values = self.model.predict(new_state_input)[0]
-        next_max = numpy.max(next_q_values)
-        old_q_value = old_q_values[action]
-        new_q_value = (1 - self.learning_rate) * old_q_value \
-                    + self.learning_rate * (reward + self.discount_factor * next_max)
-        rewards = self._get_state_rewards_rules(state, old_q_values, action, new_q_value)
-        self.model.fit(state_input, rewards, steps_per_epoch=1, verbose=False)
-
-    def _get_state_rewards_q(self, state: GameState, old_q_values: numpy.ndarray, action: int, new_q_value: float):
-        rewards = old_q_values
-        rewards[action] = new_q_value
-        return rewards.reshape(1, len(rewards))
-
-    def _get_state_rewards_rules(self, state: GameState, old_q_values: numpy.ndarray, action: int, new_q_value: float):
-        reward_invalid = -13
-        raward_valid = 0.1
-        rewards = old_q_values
-        for index, _ in enumerate(rewards):
-            if index not in state.valid_moves:
-                rewards[index] = reward_invalid
+    def transition(self, state: GameState, action: int, reward: float, new_state: GameState, done: bool) -> Tuple:
+        return (
+            self._state_to_input(state)[0], action, reward, self._state_to_input(new_state)[0], done,
+            legal_mask(state), legal_mask(new_state)
+        )
+
+    def update_batch(self, batch: Batch) -> numpy.ndarray:
+        return self.trainer(
+            batch.states, batch.actions, batch.rewards, batch.next_states, batch.dones, batch.legal, batch.next_legal,
+            batch.weights
+        )
+
+    def get_state(self) -> Dict[str, numpy.ndarray]:
+        # copies of the weights, the optimizer slots, the target network and the update count, for checkpoints
+        state = {f'weights.{index}': weight for index, weight in enumerate(self.model.get_weights())}
+        state.update(
+            {f'optimizer.{index}': variable.numpy()
+             for index, variable in enumerate(_optimizer_variables(self.model.optimizer))}
+        )
+        target_model = self.trainer.target_model
+        if target_model is not None:
+            state.update({f'target.{index}': weight for index, weight in enumerate(target_model.get_weights())})
+        state['updates'] = numpy.array(self.trainer.updates)
+        return state
+
+    def set_state(self, state: Dict[str, numpy.ndarray]) -> None:
+        self.model.set_weights(_indexed(state, 'weights'))
+        slots = _indexed(state, 'optimizer')
+        optimizer = self.model.optimizer
+        if len(_optimizer_variables(optimizer)) != len(slots):
+            # slots are created on the first update
+            if hasattr(optimizer, 'build'):
+                optimizer.build(self.model.trainable_variables)
             else:
-                rewards[index] = raward_valid
-        rewards[action] = new_q_value
-        return rewards.reshape(1, len(rewards))
+                optimizer._create_all_weights(self.model.trainable_variables)
+        for variable, value in zip(_optimizer_variables(optimizer), slots):
+            variable.assign(value)
+        if self.trainer.target_model is not None:
+            self.trainer.target_model.set_weights(_indexed(state, 'target') or self.model.get_weights())
+        self.trainer.updates = int(state['updates'])
 
     def save(self):
-        self.model.save(self.data_file)
+        from src.network import save_model
+
+        save_model(self.model, self.config, self.data_file)
 
     def load(self):
+        # TensorFlow is only imported by the agents that train or run a Keras model
+        from src.network import Predictor, Trainer, load_model, model
+
         try:
-            self.model = load_model(self.data_file)
+            self.model, self.config = load_model(self.data_file)
         except OSError:
             print(f'Data file {self.data_file} not found', sys.stderr)
-            self.model = model()
+            self.config = ARCHITECTURES[self.architecture or DEFAULT_ARCHITECTURE]
+            self.model = model(self.config)
+        self.predictor = Predictor(self.model)
+        self.trainer = Trainer(self.model, self.learning_rate, self.discount_factor, self.target_sync)
+
+
+class NumpyQAgent(Agent):
+    # Greedy play of a network exported by `python -m src.inference`, without TensorFlow.
+    def __init__(self, data_file: str = NUMPY_FILE):
+        self.data_file = data_file
+        self.network = NumpyQNetwork.load(data_file)
+
+    def move(self, state: GameState) -> int:
+        return masked_argmax(self.network(state_input(state))[0], legal_mask(state))
+
+    def move_batch(self, states: Sequence[GameState]) -> numpy.ndarray:
+        inputs = numpy.empty((len(states), STATE_SIZE), dtype=numpy.float32)
+        for row, state in enumerate(states):
+            state_input(state, inputs[row])
+        legal = numpy.stack([legal_mask(state) for state in states])
+        return numpy.argmax(numpy.where(legal, self.network(inputs), -numpy.inf), axis=1)
+
+
+class EndgameAgent(Agent):
+    # Exact moves from an endgame table (`python -m src.endgame`) once it covers the position, those of `agent`
+    # before.
+    def __init__(self, agent: Agent, table: EndgameTable):
+        self.agent = agent
+        self.table = table
+
+    def move(self, state: GameState) -> int:
+        card = self.table.best_move(state)
+        return self.agent.move(state) if card is None else card
@@ -0,0 +1,69 @@
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+from src.encoding import DECK_SIZE, INPUT_CODES, STATE_SIZE
+
+
+@dataclass
+class ModelConfig:
+    # `hidden` widths of the relu layers; with `embedding` > 0 the input goes through a `CardEmbedding` of that
+    # width first, and `dueling` splits the output into a state value and per card advantages.
+    hidden: Tuple[int, ...] = (256, 256)
+    embedding: int = 0
+    dueling: bool = False
+
+    def __post_init__(self):
+        self.hidden = tuple(self.hidden)
+
+    def layer_sizes(self) -> Sequence[Tuple[int, int]]:
+        # (inputs, outputs) of every dense layer, the heads included
+        sizes = []
+        width = self.embedding or STATE_SIZE
+        for units in self.hidden:
+            sizes.append((width, units))
+            width = units
+        sizes.extend([(width, 1), (width, DECK_SIZE)] if self.dueling else [(width, DECK_SIZE)])
+        return sizes
+
+    def parameters(self) -> int:
+        embedding = (STATE_SIZE * INPUT_CODES + 1) * self.embedding
+        return embedding + sum((inputs + 1) * outputs for inputs, outputs in self.layer_sizes())
+
+    def flops(self) -> int:
+        # Per position forward pass, a multiply-add counted as two. The embedding only adds up looked up rows.
+        embedding = STATE_SIZE * self.embedding
+        dueling = 3 * DECK_SIZE if self.dueling else 0
+        return embedding + dueling + sum(2 * inputs * outputs for inputs, outputs in self.layer_sizes())
+
+
+# The original network: a hidden layer as wide as the input, then one of DECK_SIZE * STATE_SIZE units
+ARCHITECTURES: Dict[str, ModelConfig] = {
+    'legacy': ModelConfig((STATE_SIZE, DECK_SIZE * STATE_SIZE)),
+    'medium': ModelConfig((256, 256)),
+    'small': ModelConfig((128, )),
+    'embedding': ModelConfig((128, ), embedding=64),
+    'dueling': ModelConfig((256, 256), dueling=True),
+}
+DEFAULT_ARCHITECTURE = 'legacy'
+
+
+def metadata_file(filename: str) -> str:
+    return f'{os.path.splitext(filename)[0]}.json'
+
+
+def write_metadata(config: ModelConfig, filename: str) -> None:
+    # The architecture to rebuild a model saved in `filename` from, with its size and cost
+    metadata = {'architecture': asdict(config), 'parameters': config.parameters(), 'flops': config.flops()}
+    with open(metadata_file(filename), 'w') as f:
+        json.dump(metadata, f, indent=2)
+
+
+def read_metadata(filename: str) -> Optional[ModelConfig]:
+    # None for files saved before the metadata existed, which hold the legacy architecture
+    try:
+        with open(metadata_file(filename)) as f:
+            return ModelConfig(**json.load(f)['architecture'])
+    except FileNotFoundError:
+        return None
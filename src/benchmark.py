@@ -0,0 +1,183 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+from src.agents import DeepQLearnAgent, QLearnAgent, RandomAgent
+from src.data import player_deal
+from src.env import BridgeEnv
+from src.models import Card, GameState, Trick, Trump
+from src.train import learn
+from src.validate import play
+
+BASELINE_FILE = 'benchmarks/baseline.json'
+Results = Dict[str, Dict[str, float]]
+
+
+def measure(function: Callable[[], object], min_time: float = 0.2, repeat: int = 3) -> float:
+    # Calls per second of the fastest of `repeat` runs, each at least `min_time` long.
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed < min_time / 10 else max(2, int(min_time / max(elapsed, 1e-9)) + 1)
+    rates = [number / elapsed]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        rates.append(number / (time.perf_counter() - start))
+    return max(rates)
+
+
+def _mid_trick_state() -> GameState:
+    state = GameState.from_deal(player_deal)
+    lead = min(state.player_hand)
+    state.player_hand.remove(lead)
+    state.trick.add_card(lead, state.current_player)
+    state.current_player = state.current_player.next
+    return state
+
+
+def _full_trick() -> Trick:
+    trick = Trick(Trump.SPADES)
+    for card in ('H2', 'HK', 'S3', 'HA'):
+        trick.add_card(Card.from_str(card), player_deal.leader)
+    return trick
+
+
+def _env_stepper() -> Callable[[], None]:
+    env = BridgeEnv()
+    env.setup(player_deal, RandomAgent())
+
+    def step():
+        _, _, done, _ = env.step(random.choice(env.game.legal_moves()))
+        if done:
+            env.reset()
+
+    return step
+
+
+def _env_resetter() -> Callable[[], None]:
+    env = BridgeEnv()
+    env.setup(player_deal, RandomAgent())
+    return env.reset
+
+
+def _agent_benchmarks(name: str, agent, min_time: float) -> Dict[str, float]:
+    env = BridgeEnv()
+    env.setup(player_deal, RandomAgent())
+    state = env.state.copy()
+    env.step(random.choice(env.game.legal_moves()))
+    new_state = env.state
+    action = min(state.valid_moves)
+    return {
+        f'{name}.move': measure(lambda: agent.move(state), min_time),
+        f'{name}.update_q': measure(lambda: agent.update_q(state, action, 0.1, new_state, False), min_time),
+    }
+
+
+BENCHMARKS: Dict[str, Callable[[float], Dict[str, float]]] = {
+    'models':
+    lambda min_time: {
+        'models.valid_moves': measure(lambda state=_mid_trick_state(): state.valid_moves, min_time),
+        'models.trick_winner': measure(lambda trick=_full_trick(): trick.winner, min_time),
+        'models.card_color': measure(lambda card=Card(37): card.color, min_time),
+    },
+    'env':
+    lambda min_time: {
+        'env.step': measure(_env_stepper(), min_time),
+        'env.reset': measure(_env_resetter(), min_time),
+    },
+    'qlearn':
+    lambda min_time: _agent_benchmarks('qlearn', QLearnAgent(0.1, 0.9, 0.1), min_time),
+    'deepq':
+    lambda min_time: _agent_benchmarks('deepq', DeepQLearnAgent(0.1, 0.9, 0.1), min_time),
+    'loops':
+    lambda min_time: {
+        # episodes per second: one call plays 4 episodes
+        'loops.learn': 4 * measure(
+            lambda player=DeepQLearnAgent(0.1, 0.9, 0.1), opponent=DeepQLearnAgent():
+            sum(1 for _ in learn(BridgeEnv(), player, opponent, 4)), min_time, 1
+        ),
+        'loops.play': 4 * measure(
+            lambda agent=DeepQLearnAgent(): sum(1 for _ in play(BridgeEnv(), agent, agent, 4)), min_time, 1
+        ),
+    },
+}
+
+
+def run(groups: List[str] = None, min_time: float = 0.2, seed: int = 0) -> Results:
+    random.seed(seed)
+    results = {}
+    for group, benchmark in BENCHMARKS.items():
+        if groups and group not in groups:
+            continue
+        for name, rate in benchmark(min_time).items():
+            results[name] = {'rate': rate}
+    return results
+
+
+def compare(results: Results, baseline: Results, threshold: float) -> List[str]:
+    # Benchmarks slower than the baseline by more than `threshold` (a fraction), as printable lines.
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        expected = baseline[name]['rate']
+        change = result['rate'] / expected - 1
+        if change < -threshold:
+            regressions.append(f'{name}: {result["rate"]:.1f}/s, baseline {expected:.1f}/s ({change:+.0%})')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure throughput and compare it with the stored baseline')
+    parser.add_argument('groups', nargs='*', help=f'benchmark groups out of {", ".join(BENCHMARKS)}, all by default')
+    parser.add_argument('--output', help='JSON file for the results')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, 0.2 is 20%%')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per measurement')
+    parser.add_argument('--update-baseline', action='store_true', help='store these results as the baseline')
+    args = parser.parse_args()
+
+    results = run(args.groups, args.min_time)
+    document = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    for name, result in results.items():
+        print(f'{name:24} {result["rate"]:14.1f}/s')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if args.update_baseline:
+        try:
+            with open(args.baseline) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            stored = {'results': {}}
+        stored.update(python=document['python'], machine=document['machine'])
+        stored['results'].update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline {args.baseline} updated')
+        sys.exit(0)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    except FileNotFoundError:
+        print(f'Baseline {args.baseline} not found', file=sys.stderr)
+        sys.exit(0)
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print(f'REGRESSION {line}', file=sys.stderr)
+    sys.exit(1 if regressions else 0)
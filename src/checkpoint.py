@@ -0,0 +1,87 @@
+import json
+import os
+import random
+import threading
+from typing import Dict, Optional
+
+import numpy
+
+from src.agents import Agent
+from src.replay import ReplayBuffer
+
+# Training state in one .npz file: the player's weights and optimizer slots (or Q-table), the replay buffer, the
+# random generators and the caller's progress counters, so a killed job resumes where its last checkpoint was taken.
+CHECKPOINT_FILE = 'checkpoints/train.npz'
+Progress = Dict[str, object]
+
+
+def capture(player: Agent, replay: Optional[ReplayBuffer] = None, **progress) -> Dict[str, numpy.ndarray]:
+    # Copies, so training can go on while they are written. `progress` must be JSON serializable.
+    arrays = {f'player.{name}': array for name, array in player.get_state().items()}
+    if replay is not None:
+        arrays.update({f'replay.{name}': array for name, array in replay.get_state().items()})
+    name, keys, position, has_gauss, cached_gaussian = numpy.random.get_state()
+    arrays['numpy_random.keys'] = keys.copy()
+    arrays['numpy_random'] = numpy.array(json.dumps([name, position, has_gauss, cached_gaussian]))
+    arrays['random'] = numpy.array(json.dumps(random.getstate()))
+    arrays['progress'] = numpy.array(json.dumps(progress))
+    return arrays
+
+
+def write(path: str, arrays: Dict[str, numpy.ndarray]) -> None:
+    # Written next to the target and renamed, so a crash mid-write leaves the previous checkpoint intact.
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        numpy.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def _prefixed(arrays: Dict[str, numpy.ndarray], prefix: str) -> Dict[str, numpy.ndarray]:
+    return {name[len(prefix):]: array for name, array in arrays.items() if name.startswith(prefix)}
+
+
+def restore(path: str, player: Agent, replay: Optional[ReplayBuffer] = None) -> Progress:
+    # Puts the state of the checkpoint at `path` back into `player`, `replay` and the random generators and returns
+    # the progress it was saved with.
+    with numpy.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    player.set_state(_prefixed(arrays, 'player.'))
+    if replay is not None:
+        replay.set_state(_prefixed(arrays, 'replay.'))
+    name, position, has_gauss, cached_gaussian = json.loads(str(arrays['numpy_random']))
+    numpy.random.set_state((name, arrays['numpy_random.keys'], position, has_gauss, cached_gaussian))
+    version, internal, gauss = json.loads(str(arrays['random']))
+    random.setstate((version, tuple(internal), gauss))
+    return json.loads(str(arrays['progress']))
+
+
+class Checkpointer:
+    # Snapshots are taken on the calling thread and written from a background one, so training only waits for the
+    # copies. A save waits for the previous write, and the first write error is raised by the next `save` or `wait`.
+    def __init__(self, path: str = CHECKPOINT_FILE):
+        self.path = path
+        self.thread = None
+        self.error = None
+
+    def save(self, player: Agent, replay: Optional[ReplayBuffer] = None, **progress) -> None:
+        arrays = capture(player, replay, **progress)
+        self.wait()
+        self.thread = threading.Thread(target=self._write, args=(arrays, ), daemon=True)
+        self.thread.start()
+
+    def _write(self, arrays: Dict[str, numpy.ndarray]) -> None:
+        try:
+            write(self.path, arrays)
+        except Exception as error:
+            self.error = error
+
+    def wait(self) -> None:
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error:
+            error, self.error = self.error, None
+            raise error
@@ -0,0 +1,233 @@
+import argparse
+import random
+import sys
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy
+
+from src.engine import DECK_SIZE, PLAYER_ID, PLAYERS, TRUMP_ID, TRUMPS
+from src.models import Card, Contract, Deal, Hand, Player, Trump, hand_factory
+
+DealSource = Iterator[Deal]
+
+# PBN hands go clockwise (like `Player.next`) from the player named before the colon, suits from spades down
+PBN_ORDER = 'NESW'
+PBN_SUITS = 'SHDC'
+
+MAGIC = b'DEALS001'
+HEADER_SIZE = 16  # magic, deal count
+# 2 bits per card owner (engine player index), declarer | leader << 2, trump id | level << 3, padding
+RECORD = numpy.dtype([('owners', numpy.uint8, (DECK_SIZE // 4, )), ('players', numpy.uint8),
+                      ('contract', numpy.uint8), ('pad', numpy.uint8)])
+SHIFTS = numpy.arange(0, 8, 2, dtype=numpy.uint8)
+
+
+def random_deals(seed: Optional[int] = None, contract: Contract = None) -> DealSource:
+    # Endless uniformly shuffled deals. Declarer and contract are random unless `contract` is given;
+    # the player left of declarer leads.
+    rng = random.Random(seed)
+    cards = list(range(DECK_SIZE))
+    while True:
+        rng.shuffle(cards)
+        declarer = PLAYERS[rng.randrange(4)]
+        hands = [hand_of(cards[i * 13:(i + 1) * 13]) for i in range(4)]
+        yield Deal(
+            hand_w=hands[0],
+            hand_n=hands[1],
+            hand_e=hands[2],
+            hand_s=hands[3],
+            declarer=declarer,
+            leader=declarer.next,
+            contract=contract or Contract(rng.randint(1, 7), TRUMPS[rng.randrange(5)]),
+        )
+
+
+def hand_of(cards: Iterable[int]) -> Hand:
+    return {Card(card) for card in cards}
+
+
+def parse_pbn_deal(text: str) -> Dict[Player, Hand]:
+    first, hands = text.split(':', 1)
+    player = Player(first.strip().upper())
+    result = {}
+    for hand in hands.split():
+        cards = []
+        if hand != '-':
+            for suit, values in zip(PBN_SUITS, hand.split('.')):
+                cards.extend(suit + value for value in values.upper() if value != '-')
+        result[player] = hand_factory(cards)
+        player = player.next
+    return result
+
+
+def parse_contract(text: str) -> Optional[Contract]:
+    # '4S', '3NTX', '6HXX'; None for a passed-out board
+    text = text.strip().upper().rstrip('X')
+    if not text or text == 'PASS':
+        return None
+    return Contract(int(text[0]), Trump(text[1:]))
+
+
+def parse_pbn(lines: Iterable[str], declarer: Player = None, contract: Contract = None) -> DealSource:
+    # Streams the games of a PBN file. Games without a [Declarer] or [Contract] tag use the given defaults
+    # and are skipped when there are none; passed-out boards are always skipped.
+    tags = {}
+    for line in lines:
+        line = line.strip()
+        if not line.startswith('['):
+            continue
+        name, _, value = line[1:].rstrip(']').partition(' ')
+        if name == 'Deal' and 'Deal' in tags:
+            deal = _pbn_game(tags, declarer, contract)
+            if deal:
+                yield deal
+            tags = {}
+        tags[name] = value.strip().strip('"')
+    if 'Deal' in tags:
+        deal = _pbn_game(tags, declarer, contract)
+        if deal:
+            yield deal
+
+
+def _pbn_game(tags: Dict[str, str], declarer: Player, contract: Contract) -> Optional[Deal]:
+    game_declarer = Player(tags['Declarer'].upper()) if tags.get('Declarer') else declarer
+    game_contract = parse_contract(tags['Contract']) if 'Contract' in tags else contract
+    if not game_declarer or not game_contract:
+        return None
+    hands = parse_pbn_deal(tags['Deal'])
+    return Deal(
+        hand_w=hands[Player.WEST],
+        hand_n=hands[Player.NORTH],
+        hand_e=hands[Player.EAST],
+        hand_s=hands[Player.SOUTH],
+        declarer=game_declarer,
+        leader=game_declarer.next,
+        contract=game_contract,
+    )
+
+
+def format_pbn(deal: Deal) -> str:
+    hands = []
+    for name in PBN_ORDER:
+        hand = deal.hands[Player(name)]
+        suits = []
+        for suit in PBN_SUITS:
+            values = sorted((card for card in hand if card.color.value == suit), reverse=True)
+            suits.append(''.join(card.value_str for card in values))
+        hands.append('.'.join(suits))
+    return (
+        f'[Deal "N:{" ".join(hands)}"]\n'
+        f'[Declarer "{deal.declarer.value}"]\n'
+        f'[Contract "{deal.contract}"]\n'
+    )
+
+
+def pack_deal(deal: Deal, record: numpy.ndarray) -> None:
+    owners = numpy.zeros(DECK_SIZE, dtype=numpy.uint8)
+    for player, hand in deal.hands.items():
+        owners[list(hand)] = PLAYER_ID[player]
+    record['owners'] = (owners.reshape(-1, 4) << SHIFTS).sum(axis=1)
+    record['players'] = PLAYER_ID[deal.declarer] | PLAYER_ID[deal.leader] << 2
+    record['contract'] = TRUMP_ID[deal.trump] | deal.contract.tricks << 3
+
+
+def write_corpus(path: str, deals: Iterable[Deal], chunk: int = 65536) -> int:
+    # Streams `deals` to a corpus file and returns how many were written.
+    count = 0
+    records = numpy.zeros(chunk, dtype=RECORD)
+    with open(path, 'wb') as f:
+        f.write(MAGIC + numpy.uint64(0).tobytes())
+        deals = iter(deals)
+        while True:
+            size = 0
+            for size, deal in enumerate(islice(deals, chunk), 1):
+                pack_deal(deal, records[size - 1])
+            f.write(records[:size].tobytes())
+            count += size
+            if size < chunk:
+                break
+        f.seek(len(MAGIC))
+        f.write(numpy.uint64(count).tobytes())
+    return count
+
+
+class DealCorpus:
+    # Memory-mapped corpus of packed deals, 16 bytes each; deals only become `Deal` objects when indexed.
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a deal corpus')
+        count = int(numpy.frombuffer(header[len(MAGIC):], dtype=numpy.uint64)[0])
+        self.path = path
+        self.records = numpy.memmap(path, RECORD, 'r', HEADER_SIZE, (count, )) if count else numpy.zeros(0, RECORD)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def owners(self, indices: numpy.ndarray) -> numpy.ndarray:
+        # (len(indices), 52) engine player index owning every card
+        packed = self.records['owners'][indices]
+        return ((packed[..., None] >> SHIFTS) & 3).reshape(*packed.shape[:-1], DECK_SIZE).astype(numpy.int8)
+
+    def __getitem__(self, index: int) -> Deal:
+        record = self.records[index]
+        owners = self.owners(index)
+        hands = [hand_of(numpy.nonzero(owners == player)[0]) for player in range(4)]
+        players, contract = int(record['players']), int(record['contract'])
+        return Deal(
+            hand_w=hands[0],
+            hand_n=hands[1],
+            hand_e=hands[2],
+            hand_s=hands[3],
+            declarer=PLAYERS[players & 3],
+            leader=PLAYERS[players >> 2 & 3],
+            contract=Contract(contract >> 3, TRUMPS[contract & 7]),
+        )
+
+    def stream(self, seed: Optional[int] = None, shuffle: bool = True) -> DealSource:
+        # Endless pass over the corpus, in a new random order every epoch unless `shuffle` is off.
+        assert len(self), "empty deal corpus"
+        rng = numpy.random.default_rng(seed)
+        while True:
+            order = rng.permutation(len(self)) if shuffle else range(len(self))
+            for index in order:
+                yield self[int(index)]
+
+
+def deal_source(path: str, seed: Optional[int] = None) -> DealSource:
+    # Endless deals from a PBN file (in file order, repeated) or a corpus file (shuffled).
+    if path.lower().endswith('.pbn'):
+
+        def repeat_pbn():
+            while True:
+                found = False
+                with open(path) as f:
+                    for deal in parse_pbn(f):
+                        found = True
+                        yield deal
+                if not found:
+                    return
+
+        return repeat_pbn()
+    return DealCorpus(path).stream(seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a deal corpus from a PBN file or the random dealer')
+    parser.add_argument('corpus')
+    parser.add_argument('--pbn', help='PBN file to convert')
+    parser.add_argument('--random', type=int, default=0, help='number of random deals')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    if args.pbn:
+        with open(args.pbn) as pbn:
+            written = write_corpus(args.corpus, parse_pbn(pbn))
+    elif args.random:
+        written = write_corpus(args.corpus, islice(random_deals(args.seed), args.random))
+    else:
+        print('Nothing to write, pass --pbn or --random', file=sys.stderr)
+        sys.exit(1)
+    print(f'{written} deals written to {args.corpus}')
@@ -0,0 +1,132 @@
+from enum import Enum
+from typing import List, Sequence
+
+import numpy
+
+from src.engine import CARD_SUIT, NO_TRUMP, BitState
+
+Hand = Sequence[int]
+
+STATE_SIZE = 54
+DECK_SIZE = 52
+# input values run from -1 (no card, no suit) to 4 (`CardPosition.RIGHT_OPPONENT`)
+INPUT_CODES = 6
+# one-hot layout: a plane of DECK_SIZE cards per `CardPosition`, then trump and trick suit as in `InputPattern`
+PLANES = 5
+PLANES_SIZE = PLANES * DECK_SIZE + 2
+
+
+class CardPosition(Enum):
+    TRICK = 0
+    PLAYER = 1
+    LEFT_OPPONENT = 2
+    PARTNER = 3
+    RIGHT_OPPONENT = 4
+
+
+class Suit(Enum):
+    NONE = -1
+    CLUBS = 0
+    DIAMONDS = 1
+    HEARTS = 2
+    SPADES = 3
+
+
+class Trump(Enum):
+    NO_TRUMP = -1
+    CLUBS = 0
+    DIAMONDS = 1
+    HEARTS = 2
+    SPADES = 3
+
+
+class InputPattern:
+    def __init__(self, trump: int, hand1: Hand, hand2: Hand, hand3: Hand, hand4: Hand, trick: Hand, trick_suite: int):
+        self.input = numpy.repeat(-1, STATE_SIZE)
+        self._map_cards_to_input(hand1, CardPosition.PLAYER)
+        self._map_cards_to_input(hand2, CardPosition.LEFT_OPPONENT)
+        self._map_cards_to_input(hand3, CardPosition.PARTNER)
+        self._map_cards_to_input(hand4, CardPosition.RIGHT_OPPONENT)
+        self._map_cards_to_input(trick, CardPosition.TRICK)
+        self.input[52] = Trump(trump).value
+        self.input[53] = Suit(trick_suite).value
+
+    def _map_cards_to_input(self, input_list: Hand, position: CardPosition):
+        for item in input_list or []:
+            self.input[item] = position.value
+
+    def get_array(self) -> numpy.ndarray:
+        return self.input.reshape(1, len(self.input))
+
+
+# Card owners as the encoders keep them: engine player index, or a card in the trick or played before
+IN_TRICK = 4
+GONE = 5
+# `InputPattern` value and one-hot row of every owner code, by the engine index of the player to move
+RELATIVE_CODES = numpy.asarray(
+    [[(owner - player) % 4 + 1 for owner in range(4)] + [CardPosition.TRICK.value, -1] for player in range(4)],
+    dtype=numpy.float32
+)
+PLANE_CODES = numpy.zeros((4, INPUT_CODES, PLANES), dtype=numpy.float32)
+for player_codes, planes in zip(RELATIVE_CODES, PLANE_CODES):
+    for code, value in enumerate(player_codes):
+        if value >= 0:
+            planes[code, int(value)] = 1
+
+
+def card_owners(hands: Sequence[int], trick: Sequence[int], out: numpy.ndarray = None) -> numpy.ndarray:
+    # (DECK_SIZE,) owner codes from the engine hand masks and trick cards
+    bits = numpy.unpackbits(numpy.asarray(hands, dtype='<u8').view(numpy.uint8).reshape(4, 8), axis=1,
+                            count=DECK_SIZE, bitorder='little')
+    out = numpy.empty(DECK_SIZE, dtype=numpy.intp) if out is None else out
+    out[...] = numpy.where(bits.any(axis=0), bits.argmax(axis=0), GONE)
+    out[list(trick)] = IN_TRICK
+    return out
+
+
+def write_input(
+    owners: numpy.ndarray, player: int, trump: int, lead: int, out: numpy.ndarray = None, planes: bool = False
+) -> numpy.ndarray:
+    # The network input of the position, into `out` (a row of a batch buffer, say) without other allocations.
+    # `trump` is the engine strain, `lead` the suit of the trick or -1.
+    out = numpy.empty(PLANES_SIZE if planes else STATE_SIZE, dtype=numpy.float32) if out is None else out
+    if planes:
+        out[:-2].reshape(PLANES, DECK_SIZE).T[...] = PLANE_CODES[player][owners]
+    else:
+        numpy.take(RELATIVE_CODES[player], owners, out=out[:DECK_SIZE])
+    out[-2] = -1 if trump == NO_TRUMP else trump
+    out[-1] = lead
+    return out
+
+
+def encode_game(game: BitState, out: numpy.ndarray = None, planes: bool = False) -> numpy.ndarray:
+    # `InputPattern` of the player to move, computed from the bit masks
+    lead = CARD_SUIT[game.trick[0]] if game.trick else -1
+    return write_input(card_owners(game.hands, game.trick), game.player, game.trump, lead, out, planes)
+
+
+class ObservationEncoder:
+    # The card owners of one game, updated in O(1) per card played, and a preallocated input they are written into
+    # for the player to move. `reset` rebuilds them, for a new deal or after taking cards back.
+    def __init__(self, planes: bool = False):
+        self.planes = planes
+        self.size = PLANES_SIZE if planes else STATE_SIZE
+        self.owners = numpy.full(DECK_SIZE, GONE, dtype=numpy.intp)
+        self.trump = NO_TRUMP
+        self.observation = numpy.zeros(self.size, dtype=numpy.float32)
+
+    def reset(self, game: BitState) -> None:
+        card_owners(game.hands, game.trick, self.owners)
+        self.trump = game.trump
+
+    def play(self, card: int) -> None:
+        self.owners[card] = IN_TRICK
+
+    def close_trick(self, cards: List[int]) -> None:
+        for card in cards:
+            self.owners[card] = GONE
+
+    def write(self, player: int, lead: int, out: numpy.ndarray = None) -> numpy.ndarray:
+        # into the encoder's own array unless given `out`; that one is overwritten by the next call
+        out = self.observation if out is None else out
+        return write_input(self.owners, player, self.trump, lead, out, self.planes)
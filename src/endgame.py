@@ -0,0 +1,298 @@
+import argparse
+import math
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy
+
+from src.engine import NO_TRUMP, SUIT_MASKS, BitState
+from src.solver import AnyState, remaining_tricks, to_bit_state
+
+# Exact results of every ending with up to `cards` cards in each hand, at the start of a trick. Only the order of
+# the cards left in a suit matters, so an ending is, per suit (the trump suit first), the owners of its cards from
+# the highest down, counted from the player on lead. Endings are numbered by ranking the suit lengths and that owner
+# sequence, a minimal perfect hash, and the file holds for each the tricks the side on lead takes, 4 bits each:
+# magic, cards, then for every hand size from 1 up the no trump and the trump table.
+# Each size is solved from the one below by playing out a trick, so no search is needed. Generation is plain Python
+# over every ending: about two minutes for 2 cards, while 3 cards mean some 168M endings per kind, out of reach.
+MAGIC = b'ENDGAME1'
+HEADER_SIZE = 16
+ENDGAME_FILE = 'src/q_models_data/endgame.bin'
+DEFAULT_CARDS = 2
+KINDS = ('no_trump', 'trump')
+# suits in table order, the trump suit first, for every engine trump
+SUIT_ORDERS = tuple((trump, *(suit for suit in range(4) if suit != trump)) for trump in range(4)) + ((0, 1, 2, 3), )
+FACTORIALS = [math.factorial(n) for n in range(53)]
+# per suit slot, the owners of its cards from the highest down
+Position = Tuple[Tuple[int, ...], ...]
+
+
+def compositions(total: int, parts: int = 4) -> List[Tuple[int, ...]]:
+    # suit lengths adding up to `total`, in lexicographic order
+    if parts == 1:
+        return [(total, )]
+    return [(first, *rest) for first in range(total + 1) for rest in compositions(total - first, parts - 1)]
+
+
+def words(cards: int) -> Iterator[Tuple[int, ...]]:
+    # owner sequences of the 4 * `cards` cards left, every player owning `cards`, in lexicographic order
+    counts = [cards] * 4
+    word = []
+
+    def extend():
+        if len(word) == 4 * cards:
+            yield tuple(word)
+            return
+        for owner in range(4):
+            if counts[owner]:
+                counts[owner] -= 1
+                word.append(owner)
+                yield from extend()
+                word.pop()
+                counts[owner] += 1
+
+    return extend()
+
+
+def word_count(cards: int) -> int:
+    return FACTORIALS[4 * cards] // FACTORIALS[cards]**4
+
+
+def word_rank(word: Sequence[int], cards: int) -> int:
+    # position of `word` in the order of `words`: the sequences sharing a prefix and a smaller next owner before it
+    counts = [cards] * 4
+    remaining = len(word)
+    rank = 0
+    for owner in word:
+        remaining -= 1
+        for smaller in range(owner):
+            if counts[smaller]:
+                counts[smaller] -= 1
+                rank += FACTORIALS[remaining] // (
+                    FACTORIALS[counts[0]] * FACTORIALS[counts[1]] * FACTORIALS[counts[2]] * FACTORIALS[counts[3]]
+                )
+                counts[smaller] += 1
+        counts[owner] -= 1
+    return rank
+
+
+class Level:
+    # The numbering of the endings with `cards` cards in each hand.
+    def __init__(self, cards: int):
+        self.cards = cards
+        self.lengths = compositions(4 * cards)
+        self.length_index = {lengths: index for index, lengths in enumerate(self.lengths)}
+        self.words = word_count(cards)
+        self.size = len(self.lengths) * self.words
+
+    def index(self, position: Position) -> int:
+        return self.rank(tuple(len(suit) for suit in position), [owner for suit in position for owner in suit])
+
+    def rank(self, lengths: Tuple[int, ...], word: Sequence[int]) -> int:
+        return self.length_index[lengths] * self.words + word_rank(word, self.cards)
+
+    def positions(self) -> Iterator[Position]:
+        # every ending, in index order
+        for lengths in self.lengths:
+            for word in words(self.cards):
+                position, start = [], 0
+                for length in lengths:
+                    position.append(word[start:start + length])
+                    start += length
+                yield tuple(position)
+
+
+def encode(hands: List[int], leader: int, trump: int) -> Tuple[Tuple[int, ...], List[int]]:
+    # Suit lengths and owner sequence of the ending at the start of a trick, relative to the player on lead.
+    present = hands[0] | hands[1] | hands[2] | hands[3]
+    lengths, word = [], []
+    for suit in SUIT_ORDERS[trump]:
+        cards = present & SUIT_MASKS[suit]
+        lengths.append(bin(cards).count('1'))
+        while cards:
+            bit = 1 << cards.bit_length() - 1
+            cards ^= bit
+            owner = 0 if hands[0] & bit else 1 if hands[1] & bit else 2 if hands[2] & bit else 3
+            word.append((owner - leader) % 4)
+    return tuple(lengths), word
+
+
+def position_of(hands: List[int], leader: int, trump: int) -> Position:
+    lengths, word = encode(hands, leader, trump)
+    position, start = [], 0
+    for length in lengths:
+        position.append(tuple(word[start:start + length]))
+        start += length
+    return tuple(position)
+
+
+def solve_position(position: Position, cards: int, trump: bool, child_values, child_level: Optional[Level]) -> int:
+    # Tricks the side on lead takes with best play of all four hands; `child_values` of the endings one card smaller.
+    hands = [[] for _ in range(4)]
+    for slot, owners in enumerate(position):
+        for index, owner in enumerate(owners):
+            hands[owner].append((slot, index))
+
+    def outcome(played: List[Tuple[int, int]]) -> int:
+        best = 0
+        for player in range(1, 4):
+            slot, index = played[player]
+            best_slot, best_index = played[best]
+            if slot == best_slot and index < best_index or trump and slot == 0 and best_slot != 0:
+                best = player
+        if child_level is None:
+            return 1 if best % 2 == 0 else 0
+        gone = set(played)
+        child = tuple(
+            tuple((owner - best) % 4 for index, owner in enumerate(owners) if (slot, index) not in gone)
+            for slot, owners in enumerate(position)
+        )
+        value = int(child_values[child_level.index(child)])
+        return 1 + value if best % 2 == 0 else cards - 1 - value
+
+    def search(player: int, played: List[Tuple[int, int]]) -> int:
+        if player == 4:
+            return outcome(played)
+        cards_held = hands[player]
+        if player:
+            following = [card for card in cards_held if card[0] == played[0][0]]
+            cards_held = following or cards_held
+        results = []
+        for card in cards_held:
+            played.append(card)
+            results.append(search(player + 1, played))
+            played.pop()
+        # the side on lead maximizes, the other side minimizes
+        return max(results) if player % 2 == 0 else min(results)
+
+    return search(0, [])
+
+
+def generate(cards: int = DEFAULT_CARDS) -> Dict[Tuple[int, str], numpy.ndarray]:
+    # (hand size, kind) -> tricks of the side on lead for every ending, sizes 1 to `cards`
+    tables = {}
+    for size in range(1, cards + 1):
+        level = Level(size)
+        child_level = Level(size - 1) if size > 1 else None
+        for kind in KINDS:
+            child_values = tables.get((size - 1, kind))
+            values = numpy.empty(level.size, dtype=numpy.uint8)
+            for index, position in enumerate(level.positions()):
+                values[index] = solve_position(position, size, kind == 'trump', child_values, child_level)
+            tables[(size, kind)] = values
+    return tables
+
+
+def _pack(values: numpy.ndarray) -> numpy.ndarray:
+    padded = numpy.zeros(len(values) + len(values) % 2, dtype=numpy.uint8)
+    padded[:len(values)] = values
+    return padded[0::2] | padded[1::2] << 4
+
+
+def write(path: str, cards: int, tables: Dict[Tuple[int, str], numpy.ndarray]) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC + numpy.uint64(cards).tobytes())
+        for size in range(1, cards + 1):
+            for kind in KINDS:
+                f.write(_pack(tables[(size, kind)]).tobytes())
+    os.replace(temporary, path)
+
+
+class EndgameTable:
+    # Lookups into a generated file, memory-mapped so processes share it. Positions are covered once the hands are
+    # down to `cards` cards at the end of the current trick; mid-trick ones play the trick out over the table.
+    def __init__(self, path: str = ENDGAME_FILE):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not an endgame table')
+        self.cards = int(numpy.frombuffer(header[len(MAGIC):], dtype=numpy.uint64)[0])
+        self.data = numpy.memmap(path, numpy.uint8, 'r')
+        # plain int indexing of the mapping, without numpy scalars
+        self.bytes = memoryview(self.data)
+        self.levels = [Level(size) for size in range(self.cards + 1)]
+        # byte offset of every (hand size, kind) table
+        self.offsets = {}
+        offset = HEADER_SIZE
+        for size in range(1, self.cards + 1):
+            for kind in KINDS:
+                self.offsets[(size, kind)] = offset
+                offset += (self.levels[size].size + 1) // 2
+
+    def covers(self, state: AnyState) -> bool:
+        game = to_bit_state(state)
+        return remaining_tricks(game) - (1 if game.trick else 0) <= self.cards
+
+    def lookup(self, hands: List[int], leader: int, trump: int) -> int:
+        # Tricks the side on lead takes, at the start of a trick with at most `cards` cards in each hand.
+        size = bin(hands[leader]).count('1')
+        if not size:
+            return 0
+        index = self.levels[size].rank(*encode(hands, leader, trump))
+        byte = self.bytes[self.offsets[(size, KINDS[trump != NO_TRUMP])] + index // 2]
+        return byte >> 4 if index % 2 else byte & 15
+
+    def _ns_tricks(self, game: BitState) -> int:
+        if not game.trick:
+            tricks = self.lookup(game.hands, game.player, game.trump)
+            return tricks if game.player % 2 else remaining_tricks(game) - tricks
+        values = []
+        for card in game.legal_moves():
+            winner = game.play(card)
+            values.append((1 if winner >= 0 and winner % 2 else 0) + self._ns_tricks(game))
+            game.unplay()
+        return max(values) if game.player % 2 else min(values)
+
+    def ns_tricks(self, state: AnyState) -> Optional[int]:
+        # Tricks North and South take from the remaining ones, None when the position is not covered.
+        game = to_bit_state(state)
+        return self._ns_tricks(game) if self.covers(game) else None
+
+    def tricks(self, state: AnyState) -> Optional[int]:
+        # Tricks the side to move takes from the remaining ones, None when the position is not covered.
+        game = to_bit_state(state)
+        if not self.covers(game):
+            return None
+        ns = self._ns_tricks(game)
+        return ns if game.player % 2 else remaining_tricks(game) - ns
+
+    def move_values(self, state: AnyState) -> Optional[Dict[int, int]]:
+        # Like `DoubleDummySolver.move_values`: tricks the side to move takes with each of its legal cards.
+        game = to_bit_state(state)
+        if not self.covers(game):
+            return None
+        remaining = remaining_tricks(game)
+        player = game.player
+        values = {}
+        for card in game.legal_moves():
+            winner = game.play(card)
+            ns = (1 if winner >= 0 and winner % 2 else 0) + self._ns_tricks(game)
+            game.unplay()
+            values[card] = ns if player % 2 else remaining - ns
+        return values
+
+    def best_move(self, state: AnyState) -> Optional[int]:
+        values = self.move_values(state)
+        if values is None:
+            return None
+        return max(values, key=values.get)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve every ending with few cards left into a lookup file')
+    parser.add_argument(
+        '--cards', type=int, default=DEFAULT_CARDS, help='cards in each hand, at most; only up to 2 is practical'
+    )
+    parser.add_argument('--output', default=ENDGAME_FILE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tables = generate(args.cards)
+    write(args.output, args.cards, tables)
+    endings = sum(len(values) for values in tables.values())
+    print(f'{endings} endings solved in {time.perf_counter() - start:.1f}s, {os.path.getsize(args.output)} bytes '
+          f'in {args.output}')
@@ -0,0 +1,334 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy
+
+from src.models import Card, Deal, GameState, Hand, Player, PlayType, Trick, Trump
+
+# Players are indexed in the `Player.order` sequence, so `(player + 1) % 4` is the next player
+# and `(player + 2) % 4` the partner.
+PLAYERS = (Player.WEST, Player.NORTH, Player.EAST, Player.SOUTH)
+PLAYER_ID = {player: index for index, player in enumerate(PLAYERS)}
+WEST, NORTH, EAST, SOUTH = range(4)
+
+# Strains are indexed like `Color.id`, with no trump stored as 4 so it can index tables.
+NO_TRUMP = 4
+TRUMPS = (Trump.CLUBS, Trump.DIAMONDS, Trump.HEARTS, Trump.SPADES, Trump.NO_TRUMP)
+TRUMP_ID = {trump: index for index, trump in enumerate(TRUMPS)}
+
+DECK_SIZE = 52
+SUIT_SIZE = 13
+FULL_DECK = (1 << DECK_SIZE) - 1
+SUIT_MASKS = tuple(((1 << SUIT_SIZE) - 1) << (suit * SUIT_SIZE) for suit in range(4))
+CARD_SUIT = tuple(card // SUIT_SIZE for card in range(DECK_SIZE))
+CARD_BIT = tuple(1 << card for card in range(DECK_SIZE))
+
+
+def _rank_table(lead: int, trump: int) -> Tuple[int, ...]:
+    # Strength of every card for a trick led in `lead`: trumps beat the led suit, discards never win.
+    ranks = []
+    for card in range(DECK_SIZE):
+        suit, value = CARD_SUIT[card], card % SUIT_SIZE
+        if suit == trump:
+            ranks.append(2 * SUIT_SIZE + value + 1)
+        elif suit == lead:
+            ranks.append(SUIT_SIZE + value + 1)
+        else:
+            ranks.append(0)
+    return tuple(ranks)
+
+
+# TRICK_RANKS[lead * 5 + trump][card]
+TRICK_RANKS = tuple(_rank_table(lead, trump) for lead in range(4) for trump in range(5))
+
+
+MASK_64 = (1 << 64) - 1
+
+
+def mix_64(value: int) -> int:
+    # splitmix64 finalizer, stable across processes and Python versions unlike `hash`
+    value = (value ^ value >> 30) * 0xBF58476D1CE4E5B9 & MASK_64
+    value = (value ^ value >> 27) * 0x94D049BB133111EB & MASK_64
+    return value ^ value >> 31
+
+
+def cards_of(mask: int) -> Iterator[int]:
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def hand_to_mask(hand: Optional[Hand]) -> int:
+    mask = 0
+    for card in hand or ():
+        mask |= CARD_BIT[card]
+    return mask
+
+
+def mask_to_hand(mask: int) -> Hand:
+    return {Card(card) for card in cards_of(mask)}
+
+
+def mask_to_array(mask: int) -> numpy.ndarray:
+    # (DECK_SIZE,) bool array of the cards in `mask`, indexed by card id
+    return numpy.unpackbits(numpy.array([mask], dtype='<u8').view(numpy.uint8), count=DECK_SIZE,
+                            bitorder='little').view(bool)
+
+
+def trick_winner(cards: List[int], leader: int, trump: int) -> int:
+    ranks = TRICK_RANKS[CARD_SUIT[cards[0]] * 5 + trump]
+    best = 0
+    for index in range(1, len(cards)):
+        if ranks[cards[index]] > ranks[cards[best]]:
+            best = index
+    return (leader + best) % 4
+
+
+class BitState:
+    # `moves` lists every card played and `closed` the (leader, cards) of every finished trick, so moves can be
+    # taken back with `unplay` instead of copying the state before them.
+    __slots__ = (
+        'hands', 'player', 'trump', 'play_type', 'trick', 'leader', 'tricks_ns', 'tricks_ew', 'moves', 'closed'
+    )
+
+    def __init__(
+        self,
+        hands: List[int],
+        player: int,
+        trump: int,
+        play_type: int = PlayType.DEFENCE.value,
+        trick: List[int] = None,
+        leader: int = -1,
+        tricks_ns: int = 0,
+        tricks_ew: int = 0,
+        moves: List[int] = None,
+        closed: List[Tuple[int, List[int]]] = None
+    ):
+        self.hands = hands
+        self.player = player
+        self.trump = trump
+        self.play_type = play_type
+        self.trick = trick if trick is not None else []
+        self.leader = leader if self.trick else -1
+        self.tricks_ns = tricks_ns
+        self.tricks_ew = tricks_ew
+        self.moves = moves if moves is not None else []
+        self.closed = closed if closed is not None else []
+
+    @staticmethod
+    def from_deal(deal: Deal):
+        return BitState(
+            hands=[hand_to_mask(deal.hands[player]) for player in PLAYERS],
+            player=PLAYER_ID[deal.leader],
+            trump=TRUMP_ID[deal.trump],
+            play_type=PlayType.DEFENCE.value,  # defence always start
+        )
+
+    @staticmethod
+    def from_state(state: GameState):
+        return BitState(
+            hands=[hand_to_mask(state.hands[player]) for player in PLAYERS],
+            player=PLAYER_ID[state.current_player],
+            trump=TRUMP_ID[state.trump],
+            play_type=state.play_type.value,
+            trick=[int(card) for card in state.trick.cards or []],
+            leader=PLAYER_ID[state.trick.leader] if state.trick.leader else -1,
+            tricks_ns=state.tricks_ns,
+            tricks_ew=state.tricks_ew,
+        )
+
+    def copy(self):
+        return BitState(
+            list(self.hands), self.player, self.trump, self.play_type, list(self.trick), self.leader, self.tricks_ns,
+            self.tricks_ew, list(self.moves), list(self.closed)
+        )
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    @property
+    def done(self) -> bool:
+        return not (self.hands[0] | self.hands[1] | self.hands[2] | self.hands[3])
+
+    def legal_mask(self) -> int:
+        hand = self.hands[self.player]
+        if not self.trick:
+            return hand
+        return hand & SUIT_MASKS[CARD_SUIT[self.trick[0]]] or hand
+
+    def legal_moves(self) -> List[int]:
+        return list(cards_of(self.legal_mask()))
+
+    def is_legal(self, card: int) -> bool:
+        return bool(self.legal_mask() & CARD_BIT[card])
+
+    def play(self, card: int) -> int:
+        # Returns the winner when the card completes a trick, -1 otherwise.
+        player = self.player
+        self.hands[player] ^= CARD_BIT[card]
+        self.moves.append(card)
+        if not self.trick:
+            self.leader = player
+        self.trick.append(card)
+        if len(self.trick) < 4:
+            self.player = (player + 1) % 4
+            return -1
+
+        winner = trick_winner(self.trick, self.leader, self.trump)
+        if winner % 2:
+            self.tricks_ns += 1
+        else:
+            self.tricks_ew += 1
+        self.closed.append((self.leader, self.trick))
+        self.trick = []
+        self.leader = -1
+        self.player = winner
+        return winner
+
+    def unplay(self) -> int:
+        # Takes back the last card played and returns it.
+        card = self.moves.pop()
+        if self.trick:
+            self.trick.pop()
+            player = (self.player - 1) % 4
+            if not self.trick:
+                self.leader = -1
+        else:
+            if self.player % 2:
+                self.tricks_ns -= 1
+            else:
+                self.tricks_ew -= 1
+            self.leader, trick = self.closed.pop()
+            self.trick = trick[:3]
+            player = (self.leader + 3) % 4
+        self.hands[player] |= CARD_BIT[card]
+        self.player = player
+        return card
+
+    def snapshot(self) -> int:
+        # Handle for `restore`: positions are told apart by how many cards were played to reach them.
+        return len(self.moves)
+
+    def restore(self, snapshot: int) -> None:
+        while len(self.moves) > snapshot:
+            self.unplay()
+
+    def key(self) -> int:
+        # Non-zero 64-bit hash of what `str(GameState)` shows: trump, trick and hands from the player to move.
+        trick = 0
+        for card in self.trick:
+            trick = trick << 6 | card + 1
+        key = mix_64(self.trump | trick << 3)
+        for offset in range(4):
+            key = mix_64(key ^ self.hands[(self.player + offset) % 4])
+        return key or 1
+
+    def view(self):
+        return StateView(self)
+
+    def __str__(self):
+        return str(self.view())
+
+
+class StateView:
+    # Read-only `GameState` API over a `BitState`, for agents and code written against the object model.
+    __slots__ = ('game', )
+
+    def __init__(self, game: BitState):
+        self.game = game
+
+    @property
+    def hands(self) -> Dict[Player, Hand]:
+        return {player: mask_to_hand(mask) for player, mask in zip(PLAYERS, self.game.hands)}
+
+    @property
+    def current_player(self) -> Player:
+        return PLAYERS[self.game.player]
+
+    @property
+    def trump(self) -> Trump:
+        return TRUMPS[self.game.trump]
+
+    @property
+    def play_type(self) -> PlayType:
+        return PlayType(self.game.play_type)
+
+    @property
+    def trick(self) -> Trick:
+        game = self.game
+        if not game.trick:
+            return Trick(self.trump)
+        return Trick(self.trump, [Card(card) for card in game.trick], PLAYERS[game.leader])
+
+    @property
+    def tricks_ns(self) -> int:
+        return self.game.tricks_ns
+
+    @property
+    def tricks_ew(self) -> int:
+        return self.game.tricks_ew
+
+    def to_dict(self):
+        return self.to_state().to_dict()
+
+    def to_state(self) -> GameState:
+        return GameState(
+            hands=self.hands,
+            current_player=self.current_player,
+            trump=self.trump,
+            play_type=self.play_type,
+            trick=self.trick,
+            tricks_ns=self.tricks_ns,
+            tricks_ew=self.tricks_ew,
+        )
+
+    def _hand(self, offset: int) -> Hand:
+        return mask_to_hand(self.game.hands[(self.game.player + offset) % 4])
+
+    @property
+    def player_hand(self) -> Hand:
+        return self._hand(0)
+
+    @property
+    def left_opponent_hand(self) -> Hand:
+        return self._hand(1)
+
+    @property
+    def partner_hand(self) -> Hand:
+        return self._hand(2)
+
+    @property
+    def right_opponent_hand(self) -> Hand:
+        return self._hand(3)
+
+    @property
+    def valid_moves(self) -> Hand:
+        return mask_to_hand(self.game.legal_mask())
+
+    def action_mask(self) -> numpy.ndarray:
+        return mask_to_array(self.game.legal_mask())
+
+    @property
+    def any_hand_not_empty(self):
+        return not self.game.done
+
+    def copy(self):
+        return StateView(self.game.copy())
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __str__(self):
+        game = self.game
+
+        def cards(mask: int) -> str:
+            return "".join(str(Card(card)) for card in cards_of(mask))
+
+        return (
+            f'{self.trump.value}'
+            f',{"".join(str(Card(card)) for card in game.trick)}'
+            f',{cards(game.hands[game.player])}'
+            f',{cards(game.hands[(game.player + 1) % 4])}'
+            f',{cards(game.hands[(game.player + 2) % 4])}'
+            f',{cards(game.hands[(game.player + 3) % 4])}'
+        )
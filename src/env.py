@@ -2,25 +2,24 @@ import random
 import sys
 from enum import Enum
 from io import StringIO
-from typing import Dict, Tuple
+from typing import Tuple
 
 import gym
+import numpy
 
 from src.agents import Agent
-from src.models import Card, Deal, GameState, Player
+from src.encoding import ObservationEncoder
+from src.engine import CARD_SUIT, EAST, PLAYERS, WEST, BitState, StateView
+from src.models import Card, Deal
 
 # Types declaration
-Observation = Dict
+Observation = numpy.ndarray
 Reward = float
 Done = bool
 Info = str
 
 DECK_SIZE = 52
-CARDS_FOR_PLAYER = 13
 TRICK_SIZE = 4
-SUIT_COUNT = 4
-HAND = [DECK_SIZE] * CARDS_FOR_PLAYER
-TRICK = [DECK_SIZE] * TRICK_SIZE
 
 
 class Rewards(Enum):
@@ -34,19 +33,15 @@ class Rewards(Enum):
 
 
 class BridgeEnv(gym.Env):
-    def __init__(self):
+    # Observations are the network input of North or South, to move next (`InputPattern` layout, or one-hot planes
+    # with `planes`). The array is the encoder's own, rewritten every step: copy it to keep it.
+    def __init__(self, planes: bool = False):
         self.action_space = gym.spaces.Discrete(DECK_SIZE)
-        self.observation_space = gym.spaces.Dict({
-            'my_hand': gym.spaces.MultiDiscrete(HAND),
-            'partner_hand': gym.spaces.MultiDiscrete(HAND),
-            'opponent1_hand': gym.spaces.MultiDiscrete(HAND),
-            'opponent2_hand': gym.spaces.MultiDiscrete(HAND),
-            'trick': gym.spaces.MultiDiscrete(TRICK),
-            'trump': gym.spaces.Discrete(SUIT_COUNT),
-            "gamer_type": gym.spaces.Discrete(2),  # offence, defence
-        })
+        self.encoder = ObservationEncoder(planes)
+        self.observation_space = gym.spaces.Box(-1, 4, (self.encoder.size, ), dtype=numpy.float32)
         self.deal: Deal = None
-        self.state: GameState = None
+        self.game: BitState = None
+        self.state: StateView = None
         self.opponent: Agent = None
 
     def setup(self, deal: Deal, opponent: Agent) -> None:
@@ -55,12 +50,11 @@ class BridgeEnv(gym.Env):
         return self.reset()
 
     def reset(self) -> None:
-        self.state = GameState.from_deal(self.deal)
-        if self.state.current_player == Player.WEST or self.state.current_player == Player.EAST:
-            opponent_card = Card(self.opponent.move(self.state))
-            if opponent_card not in self.state.valid_moves:
-                opponent_card = random.sample(self.state.valid_moves, 1)[0]
-            _, _, info = self._move_and_get_reward(opponent_card)
+        self.game = BitState.from_deal(self.deal)
+        self.state = StateView(self.game)
+        self.encoder.reset(self.game)
+        if self._opponent_to_move():
+            _, _, info = self._move_and_get_reward(self._opponent_card())
             return info
 
     def step(self, action: Card) -> Tuple[Observation, Reward, Done, Info]:
@@ -73,12 +67,8 @@ class BridgeEnv(gym.Env):
         info = opponent_move_info = ''
         reward, done, info = self._move_and_get_reward(card)
 
-        while not done and (self.state.current_player == Player.WEST or self.state.current_player == Player.EAST):
-            opponent_card = Card(self.opponent.move(self.state))
-            # fallback to random card if opponent move is invalid
-            if Card(opponent_card) not in self.state.valid_moves:
-                opponent_card = random.sample(self.state.valid_moves, 1)[0]
-            opponent_reward, done, opponent_move_info = self._move_and_get_reward(opponent_card)
+        while not done and self._opponent_to_move():
+            opponent_reward, done, opponent_move_info = self._move_and_get_reward(self._opponent_card())
             if opponent_reward != Rewards.VALID_MOVE.value:
                 reward = -opponent_reward
 
@@ -90,25 +80,39 @@ class BridgeEnv(gym.Env):
 
         return self._state_to_observation(), reward, done, "".join([info, opponent_move_info])
 
+    def snapshot(self) -> int:
+        return self.game.snapshot()
+
+    def restore(self, snapshot: int) -> None:
+        # Takes back every card played since `snapshot`, opponent cards included.
+        self.game.restore(snapshot)
+        self.encoder.reset(self.game)
+
+    def _opponent_to_move(self) -> bool:
+        return self.game.player == WEST or self.game.player == EAST
+
+    def _opponent_card(self) -> Card:
+        opponent_card = Card(self.opponent.move(self.state))
+        # fallback to random card if opponent move is invalid
+        if not 0 <= opponent_card < DECK_SIZE or not self.game.is_legal(opponent_card):
+            opponent_card = Card(random.choice(self.game.legal_moves()))
+        return opponent_card
+
     def _move_and_get_reward(self, card: Card) -> Tuple[Reward, Done, Info]:
-        self.state.trick.add_card(card, self.state.current_player)
-        self.state.player_hand.remove(card)
-        info = f'{self.state.current_player.value}:{str(card)}'
-        done = not self.state.any_hand_not_empty
-
-        if self.state.trick.full:
-            winner = self.state.trick.winner
-            if winner in [Player.NORTH, Player.SOUTH]:
-                self.state.tricks_ns += 1
-            else:
-                self.state.tricks_ew += 1
-            current_pair_won = winner == self.state.current_player or winner == self.state.current_player.partner
+        player = self.game.player
+        info = f'{PLAYERS[player].value}:{str(card)}'
+        # the trick is cleared when this card closes it
+        closing = self.game.trick + [card] if len(self.game.trick) == TRICK_SIZE - 1 else None
+        winner = self.game.play(card)
+        done = self.game.done
+        self.encoder.play(card)
+
+        if winner >= 0:
+            self.encoder.close_trick(closing)
+            current_pair_won = (winner - player) % 2 == 0
             reward = Rewards.TRICK_WON.value if current_pair_won else Rewards.TRICK_LOST.value
-            self.state.trick.clear()
-            self.state.current_player = winner
             return reward, done, info
         else:
-            self.state.current_player = self.state.current_player.next
             return Rewards.VALID_MOVE.value, done, info
 
     def render(self, mode: str = "human") -> StringIO:
@@ -116,20 +120,13 @@ class BridgeEnv(gym.Env):
         outfile.write(f'\n{self.state.to_dict()}\n')
         return outfile
 
+    def legal_mask(self) -> numpy.ndarray:
+        # the cards North or South may play next, as the agents mask their choice with
+        return self.state.action_mask()
+
     def _action_is_valid(self, action: Card) -> bool:
-        if action not in self.state.player_hand:
-            return False
-        if action not in self.state.valid_moves:
-            return False
-        return True
+        return self.game.is_legal(action)
 
     def _state_to_observation(self) -> Observation:
-        return {
-            "my_hand": self.state.player_hand,
-            "opponent1_hand": self.state.left_opponent_hand,
-            "partner_hand": self.state.partner_hand,
-            "opponent2_hand": self.state.right_opponent_hand,
-            "trick": self.state.trick,
-            "gamer_type": self.state.play_type.value,
-            "trump": self.state.trump.id,
-        }
\ No newline at end of file
+        trick = self.game.trick
+        return self.encoder.write(self.game.player, CARD_SUIT[trick[0]] if trick else -1)
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+from dataclasses import asdict
+from typing import Dict, List
+
+import numpy
+
+from src.architectures import ModelConfig
+from src.encoding import INPUT_CODES, STATE_SIZE
+
+# Q-networks for play only: the weights of a Keras model in a flat file that is memory-mapped, so worker processes
+# share one copy through the page cache, and a forward pass in NumPy. The file holds the magic, the uint64 size of
+# a JSON header (architecture and array layout), the header, then every array 64-byte aligned.
+# Quantized files keep kernels as int8 with a float32 scale per output unit; they are a quarter of the size, and
+# every process dequantizes them once on load into its own float32 copy.
+MAGIC = b'QNETNP01'
+ALIGN = 64
+NUMPY_FILE = 'src/q_models_data/deep_q_learn.qnet'
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def layer_names(config: ModelConfig) -> List[str]:
+    # arrays in `Model.get_weights` order: embedding table and bias, then kernel and bias of every dense layer
+    names = ['embedding.table', 'embedding.bias'] if config.embedding else []
+    for index in range(len(config.layer_sizes())):
+        names.extend([f'dense.{index}.kernel', f'dense.{index}.bias'])
+    return names
+
+
+def quantize(kernel: numpy.ndarray) -> List[numpy.ndarray]:
+    # symmetric int8 per output unit
+    scale = numpy.abs(kernel).max(axis=0) / 127
+    scale[scale == 0] = 1
+    return [numpy.round(kernel / scale).clip(-127, 127).astype(numpy.int8), scale.astype(numpy.float32)]
+
+
+def export(weights: List[numpy.ndarray], config: ModelConfig, path: str, int8: bool = False) -> None:
+    names = layer_names(config)
+    assert len(weights) == len(names), f'{len(weights)} arrays for {len(names)} weights of {config}'
+    arrays: Dict[str, numpy.ndarray] = {}
+    for name, weight in zip(names, weights):
+        weight = numpy.asarray(weight, dtype=numpy.float32)
+        if int8 and name.endswith(('.kernel', '.table')):
+            arrays[name], arrays[f'{name}.scale'] = quantize(weight)
+        else:
+            arrays[name] = weight
+
+    layout, offset = [], 0
+    for name, array in arrays.items():
+        layout.append([name, array.dtype.str, list(array.shape), offset])
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({'architecture': asdict(config), 'int8': int8, 'arrays': layout}).encode()
+    start = _align(len(MAGIC) + 8 + len(header))
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC + numpy.uint64(len(header)).tobytes() + header)
+        for (_, _, _, array_offset), array in zip(layout, arrays.values()):
+            f.seek(start + array_offset)
+            f.write(array.tobytes())
+        f.truncate(start + offset)
+    os.replace(temporary, path)
+
+
+class NumpyQNetwork:
+    def __init__(self, config: ModelConfig, arrays: Dict[str, numpy.ndarray]):
+        self.config = config
+        weights = {}
+        for name, array in arrays.items():
+            if name.endswith('.scale'):
+                continue
+            scale = arrays.get(f'{name}.scale')
+            weights[name] = array if scale is None else array.astype(numpy.float32) * scale
+        self.embedding = (weights['embedding.table'], weights['embedding.bias']) if config.embedding else None
+        self.offsets = numpy.arange(STATE_SIZE) * INPUT_CODES + 1
+        self.layers = [
+            (weights[f'dense.{index}.kernel'], weights[f'dense.{index}.bias'])
+            for index in range(len(config.layer_sizes()))
+        ]
+
+    @staticmethod
+    def load(path: str) -> 'NumpyQNetwork':
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not an exported Q-network')
+            size = int(numpy.frombuffer(f.read(8), dtype=numpy.uint64)[0])
+            header = json.loads(f.read(size))
+        start = _align(len(MAGIC) + 8 + size)
+        mapped = numpy.memmap(path, numpy.uint8, 'r')
+        arrays = {}
+        for name, dtype, shape, offset in header['arrays']:
+            dtype = numpy.dtype(dtype)
+            count = int(numpy.prod(shape, dtype=int))
+            # plain arrays viewing the mapping, so the math does not go through `memmap` wrapping
+            arrays[name] = numpy.asarray(mapped[start + offset:start + offset + count * dtype.itemsize]) \
+                .view(dtype).reshape(shape)
+        return NumpyQNetwork(ModelConfig(**header['architecture']), arrays)
+
+    def __call__(self, inputs: numpy.ndarray) -> numpy.ndarray:
+        # (N, STATE_SIZE) inputs to (N, DECK_SIZE) Q-values, as the Keras model computes them
+        layer = numpy.asarray(inputs, dtype=numpy.float32)
+        if self.embedding is not None:
+            table, bias = self.embedding
+            rows = layer.astype(numpy.intp) + self.offsets
+            layer = numpy.maximum(table[rows].sum(axis=1) + bias, 0)
+        hidden = self.layers[:len(self.config.hidden)]
+        for kernel, bias in hidden:
+            layer = numpy.maximum(layer @ kernel + bias, 0)
+        if self.config.dueling:
+            (value_kernel, value_bias), (advantage_kernel, advantage_bias) = self.layers[len(hidden):]
+            advantage = layer @ advantage_kernel + advantage_bias
+            return layer @ value_kernel + value_bias + advantage - advantage.mean(axis=1, keepdims=True)
+        kernel, bias = self.layers[-1]
+        return layer @ kernel + bias
+
+
+if __name__ == '__main__':
+    from src.agents import DeepQLearnAgent
+    from src.architectures import ARCHITECTURES
+
+    parser = argparse.ArgumentParser(description='Export a trained Q-network for NumPy inference')
+    parser.add_argument('--architecture', choices=ARCHITECTURES, help='network to export, the original by default')
+    parser.add_argument('--int8', action='store_true', help='quantize the weights to int8')
+    parser.add_argument('--output', help='file to write, next to the Keras model by default')
+    args = parser.parse_args()
+
+    agent = DeepQLearnAgent(architecture=args.architecture)
+    output = args.output or f'{os.path.splitext(agent.data_file)[0]}{"-int8" if args.int8 else ""}.qnet'
+    export(agent.model.get_weights(), agent.config, output, args.int8)
+    print(f'{agent.data_file} exported to {output}')
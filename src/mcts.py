@@ -0,0 +1,204 @@
+import math
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy
+
+from src.agents import Agent, DeepQLearnAgent
+from src.encoding import STATE_SIZE, encode_game
+from src.endgame import EndgameTable
+from src.engine import CARD_BIT, BitState
+from src.inference import NumpyQNetwork
+from src.models import GameState
+from src.solver import remaining_tricks, to_bit_state
+
+# Monte Carlo tree search over the double-dummy game (all hands known, as the environment shows them), with a
+# Q-network (N, STATE_SIZE) -> (N, DECK_SIZE) for the player to move as prior and value. Values are kept from North
+# and South's side, as the trick margin over 13, and every node picks moves for the side to move (PUCT).
+# Simulations run in rounds of `batch_size`: each descends with a virtual loss on its path, so the round spreads
+# over the tree, and the leaves of the whole round are evaluated in one network call.
+Network = Callable[[numpy.ndarray], numpy.ndarray]
+VIRTUAL_LOSS = 1.0
+
+
+class _Node:
+    __slots__ = ('moves', 'priors', 'visits', 'values', 'children', 'sign')
+
+    def __init__(self, moves: List[int], priors: numpy.ndarray, sign: int):
+        self.moves = moves
+        self.priors = priors
+        # per move: visits and the sum of their values, North and South's side
+        self.visits = numpy.zeros(len(moves), dtype=numpy.int64)
+        self.values = numpy.zeros(len(moves), dtype=numpy.float64)
+        self.children: List[Optional[_Node]] = [None] * len(moves)
+        # +1 when North or South moves, -1 for East or West
+        self.sign = sign
+
+    def select(self, c_puct: float) -> int:
+        total = self.visits.sum()
+        visited = self.visits > 0
+        # unvisited moves are valued as the node's mean so far
+        mean = self.values.sum() / total if total else 0.0
+        q = numpy.where(visited, self.values / numpy.maximum(self.visits, 1), mean) * self.sign
+        return int(numpy.argmax(q + c_puct * self.priors * math.sqrt(total + 1) / (1 + self.visits)))
+
+
+class _Leaf:
+    # a position waiting for the network: where to hang its node, what it needs, and the paths to back up
+    __slots__ = ('parent', 'index', 'moves', 'sign', 'margin', 'remaining', 'paths')
+
+    def __init__(self, parent: Optional[_Node], index: int, game: BitState):
+        self.parent = parent
+        self.index = index
+        self.moves = game.legal_moves()
+        self.sign = 1 if game.player % 2 else -1
+        self.margin = game.tricks_ns - game.tricks_ew
+        self.remaining = remaining_tricks(game)
+        self.paths: List[List[Tuple[_Node, int]]] = []
+
+
+class MCTSAgent(Agent):
+    # `simulations` per move, or as many as fit in `time_limit` seconds when it is set. With `reuse` the subtree of
+    # the position reached is kept for the next move of the same deal.
+    def __init__(
+        self,
+        network: Network,
+        simulations: int = 200,
+        time_limit: float = None,
+        batch_size: int = 16,
+        c_puct: float = 1.5,
+        temperature: float = 1.0,
+        value_scale: float = 10.0,
+        reuse: bool = True,
+        endgame: EndgameTable = None
+    ):
+        self.network = network
+        self.simulations = simulations
+        self.time_limit = time_limit
+        self.batch_size = batch_size
+        self.c_puct = c_puct
+        self.temperature = temperature
+        # Q-values are rewards (`env.Rewards`); the best one over this, squashed, is the share of the remaining
+        # tricks the side to move is expected to come out ahead by
+        self.value_scale = value_scale
+        self.reuse = reuse
+        # positions the table covers are valued exactly, and played from it once the root is one of them
+        self.endgame = endgame
+        self.inputs = numpy.empty((batch_size, STATE_SIZE), dtype=numpy.float32)
+        self.root: Optional[_Node] = None
+        self.root_game: Optional[BitState] = None
+
+    def move(self, state: GameState) -> int:
+        game = to_bit_state(state).copy()
+        if self.endgame is not None:
+            card = self.endgame.best_move(game)
+            if card is not None:
+                self.root = None
+                return card
+        root = self._reused_root(game) if self.reuse else None
+        if root is None:
+            leaf = _Leaf(None, 0, game)
+            encode_game(game, self.inputs[0])
+            root = self._expand(leaf, self.network(self.inputs[:1])[0])
+        self._search(root, game)
+        # the most visited card, by prior among equals
+        index = max(range(len(root.moves)), key=lambda move: (root.visits[move], root.priors[move]))
+        card = root.moves[index]
+        game.play(card)
+        self.root, self.root_game = root.children[index], game
+        return card
+
+    def _search(self, root: _Node, game: BitState) -> None:
+        deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        start = game.snapshot()
+        endgame = self.endgame
+        done = 0
+        while (done < self.simulations) if deadline is None else (time.perf_counter() < deadline):
+            rows: List[_Leaf] = []
+            pending = {}
+            count = self.batch_size if deadline else min(self.batch_size, self.simulations - done)
+            for _ in range(count):
+                node, path = root, []
+                while True:
+                    index = node.select(self.c_puct)
+                    node.visits[index] += 1
+                    node.values[index] -= node.sign * VIRTUAL_LOSS
+                    path.append((node, index))
+                    game.play(node.moves[index])
+                    child = node.children[index]
+                    if game.done:
+                        self._backup(path, (game.tricks_ns - game.tricks_ew) / 13)
+                        break
+                    if endgame is not None and endgame.covers(game):
+                        ns = endgame.ns_tricks(game)
+                        margin = game.tricks_ns + ns - game.tricks_ew - (remaining_tricks(game) - ns)
+                        self._backup(path, margin / 13)
+                        break
+                    if child is None:
+                        leaf = pending.get((id(node), index))
+                        if leaf is None:
+                            leaf = pending[(id(node), index)] = _Leaf(node, index, game)
+                            encode_game(game, self.inputs[len(rows)])
+                            rows.append(leaf)
+                        leaf.paths.append(path)
+                        break
+                    node = child
+                game.restore(start)
+            done += count
+            if rows:
+                q_values = self.network(self.inputs[:len(rows)])
+                for leaf, values in zip(rows, q_values):
+                    child = self._expand(leaf, values)
+                    leaf.parent.children[leaf.index] = child
+                    value = self._value(leaf, values)
+                    for path in leaf.paths:
+                        self._backup(path, value)
+
+    def _expand(self, leaf: _Leaf, q_values: numpy.ndarray) -> _Node:
+        legal = q_values[leaf.moves]
+        priors = numpy.exp((legal - legal.max()) / self.temperature)
+        return _Node(leaf.moves, priors / priors.sum(), leaf.sign)
+
+    def _value(self, leaf: _Leaf, q_values: numpy.ndarray) -> float:
+        expected = math.tanh(float(q_values[leaf.moves].max()) / self.value_scale)
+        return (leaf.margin + leaf.sign * leaf.remaining * expected) / 13
+
+    @staticmethod
+    def _backup(path: List[Tuple[_Node, int]], value: float) -> None:
+        # visits were counted on the way down; the virtual loss is taken back
+        for node, index in path:
+            node.values[index] += node.sign * VIRTUAL_LOSS + value
+
+    def _reused_root(self, game: BitState) -> Optional[_Node]:
+        # The node of `game` below the kept one, reached by the cards played since in some legal order.
+        if self.root is None or self.root_game.trump != game.trump:
+            return None
+        before = self.root_game.hands
+        if any(hand & ~old for hand, old in zip(game.hands, before)):
+            return None
+        played = sum(before) - sum(game.hands)
+        key = game.key()
+        work = self.root_game.copy()
+
+        def find(node: _Node, played: int) -> Optional[_Node]:
+            if not played:
+                return node if work.key() == key else None
+            for index, card in enumerate(node.moves):
+                child = node.children[index]
+                if child is not None and played & CARD_BIT[card]:
+                    work.play(card)
+                    found = find(child, played ^ CARD_BIT[card])
+                    work.unplay()
+                    if found is not None:
+                        return found
+            return None
+
+        return find(self.root, played)
+
+
+def mcts_agent(simulations: int = 200, architecture: str = None, numpy_file: str = None, **settings) -> MCTSAgent:
+    # An agent searching with a saved network, the Keras model of `architecture` or an exported NumPy one; picklable
+    # through `functools.partial` for worker processes.
+    if numpy_file:
+        return MCTSAgent(NumpyQNetwork.load(numpy_file), simulations, **settings)
+    return MCTSAgent(DeepQLearnAgent(architecture=architecture).predictor, simulations, **settings)
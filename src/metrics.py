@@ -0,0 +1,125 @@
+import os
+import resource
+import time
+from typing import Dict, Optional
+
+# Opt-in instrumentation of the training loops: phase timers, counters and gauges, exported every `interval`
+# seconds as a Prometheus text file (for a node exporter textfile collector or any local scraper).
+PREFIX = 'bridge'
+# counters reported as rolling rates as well, per second over the last export interval
+RATES = ('steps', 'episodes', 'fits')
+
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        metrics = self.metrics
+        metrics.phase_ns[self.name] = metrics.phase_ns.get(self.name, 0) + time.perf_counter_ns() - self.start
+        metrics.phase_calls[self.name] = metrics.phase_calls.get(self.name, 0) + 1
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+def rss_bytes() -> int:
+    # resident set size now, or the peak where /proc is missing
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class Metrics:
+    # Timers are reused per phase, so a timed block costs two clock reads and two dict updates.
+    # A disabled instance hands out a shared no-op timer and ignores counts.
+    def __init__(self, path: Optional[str] = None, interval: float = 10.0, enabled: bool = True):
+        self.path = path
+        self.interval = interval
+        self.enabled = enabled
+        self.phase_ns: Dict[str, int] = {}
+        self.phase_calls: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.rates: Dict[str, float] = {}
+        self.timers: Dict[str, _Timer] = {}
+        self.started = self.last_export = time.monotonic()
+        self.last_counters: Dict[str, int] = {}
+
+    def timer(self, phase: str):
+        if not self.enabled:
+            return NULL_TIMER
+        timer = self.timers.get(phase)
+        if timer is None:
+            timer = self.timers[phase] = _Timer(self, phase)
+        return timer
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float) -> None:
+        if self.enabled:
+            self.gauges[name] = value
+
+    def tick(self) -> None:
+        # Exports when the interval is over; cheap enough to call every episode.
+        if self.enabled and self.path and time.monotonic() - self.last_export >= self.interval:
+            self.export()
+
+    def _update_rates(self, now: float) -> None:
+        elapsed = now - self.last_export
+        if elapsed > 0:
+            for name in RATES:
+                delta = self.counters.get(name, 0) - self.last_counters.get(name, 0)
+                self.rates[name] = delta / elapsed
+        self.last_counters = dict(self.counters)
+        self.last_export = now
+
+    def text(self) -> str:
+        lines = [
+            f'# TYPE {PREFIX}_phase_seconds_total counter',
+            *(f'{PREFIX}_phase_seconds_total{{phase="{name}"}} {ns / 1e9:.6f}' for name, ns in self.phase_ns.items()),
+            f'# TYPE {PREFIX}_phase_calls_total counter',
+            *(f'{PREFIX}_phase_calls_total{{phase="{name}"}} {calls}' for name, calls in self.phase_calls.items()),
+        ]
+        for name, value in self.counters.items():
+            lines += [f'# TYPE {PREFIX}_{name}_total counter', f'{PREFIX}_{name}_total {value}']
+        for name, value in self.rates.items():
+            lines += [f'# TYPE {PREFIX}_{name}_per_second gauge', f'{PREFIX}_{name}_per_second {value:.3f}']
+        gauges = {**self.gauges, 'rss_bytes': rss_bytes(), 'uptime_seconds': time.monotonic() - self.started}
+        for name, value in gauges.items():
+            lines += [f'# TYPE {PREFIX}_{name} gauge', f'{PREFIX}_{name} {round(value, 6)}']
+        return '\n'.join(lines) + '\n'
+
+    def export(self) -> None:
+        # Rewrites the whole file through a rename, so a scraper never reads half of it.
+        self._update_rates(time.monotonic())
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as f:
+            f.write(self.text())
+        os.replace(temporary, self.path)
+
+
+NULL_METRICS = Metrics(enabled=False)
@@ -1,4 +1,3 @@
-from copy import deepcopy
 from dataclasses import asdict, dataclass
 from enum import Enum
 from typing import Dict, Iterable, List, Optional, Set
@@ -24,14 +23,21 @@ class Player(Enum):
 
     @property
     def next(self):
-        index = self.order.index(self.value)
-        return Player(self.order[(index + 1) % 4])
+        return NEXT_PLAYER[self]
 
     @property
     def partner(self):
         return self.next.next
 
 
+NEXT_PLAYER = {
+    Player.WEST: Player.NORTH,
+    Player.NORTH: Player.EAST,
+    Player.EAST: Player.SOUTH,
+    Player.SOUTH: Player.WEST,
+}
+
+
 class Color(Enum):
     CLUBS = 'C'
     DIAMONDS = 'D'
@@ -43,6 +49,9 @@ class Color(Enum):
         return COLORS.index(self.value)
 
 
+CARD_COLORS = tuple(Color(color) for color in COLORS)
+
+
 class Trump(Enum):
     NO_TRUMP = 'NT'
     CLUBS = 'C'
@@ -65,7 +74,7 @@ class Card(int):
 
     @property
     def color(self):
-        return Color(COLORS[self // 13])
+        return CARD_COLORS[self // 13]
 
     @property
     def value_str(self):
@@ -139,9 +148,10 @@ class Trick:
 
     @property
     def winner(self) -> Player:
-        winning_card_id = self.cards.index(self.winning_card) if self.winning_card is not None else -1
-        if winning_card_id < 0:
+        winning_card = self.winning_card
+        if winning_card is None:
             return None
+        winning_card_id = self.cards.index(winning_card)
         winner = self.leader
         for _ in range(winning_card_id):
             winner = winner.next
@@ -194,7 +204,7 @@ class GameState:
     def from_deal(deal: Deal):
         return GameState(
             current_player=deal.leader,
-            hands=deepcopy(deal.hands),
+            hands={player: set(hand) for player, hand in deal.hands.items()},
             trump=deal.trump,
             play_type=PlayType.DEFENCE,  # defence always start
             trick=Trick(deal.trump)
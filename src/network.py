@@ -1,66 +1,199 @@
-from enum import Enum
-from typing import Sequence
+from typing import Tuple
 
 import keras
 import numpy
+import tensorflow
 
-Hand = Sequence[int]
+from src.architectures import ARCHITECTURES, DEFAULT_ARCHITECTURE, ModelConfig, read_metadata, write_metadata
+from src.encoding import DECK_SIZE, INPUT_CODES, STATE_SIZE
 
-STATE_SIZE = 54
-DECK_SIZE = 52
 
+class CardEmbedding(keras.layers.Layer):
+    # Relu of the sum of a learned row per (input position, value) pair: a dense layer over one-hot input values,
+    # looked up instead of multiplied.
+    def __init__(self, units: int, **kwargs):
+        super().__init__(**kwargs)
+        self.units = units
 
-class CardPosition(Enum):
-    TRICK = 0
-    PLAYER = 1
-    LEFT_OPPONENT = 2
-    PARTNER = 3
-    RIGHT_OPPONENT = 4
+    def build(self, input_shape):
+        self.table = self.add_weight(
+            name='table', shape=(STATE_SIZE * INPUT_CODES, self.units), initializer='glorot_uniform'
+        )
+        self.bias = self.add_weight(name='bias', shape=(self.units, ), initializer='zeros')
+        self.offsets = tensorflow.range(STATE_SIZE) * INPUT_CODES + 1
 
+    def call(self, inputs):
+        rows = tensorflow.cast(inputs, tensorflow.int32) + self.offsets
+        return tensorflow.nn.relu(tensorflow.reduce_sum(tensorflow.gather(self.table, rows), axis=1) + self.bias)
 
-class Suit(Enum):
-    NONE = -1
-    CLUBS = 0
-    DIAMONDS = 1
-    HEARTS = 2
-    SPADES = 3
+    def get_config(self):
+        return {**super().get_config(), 'units': self.units}
 
 
-class Trump(Enum):
-    NO_TRUMP = -1
-    CLUBS = 0
-    DIAMONDS = 1
-    HEARTS = 2
-    SPADES = 3
+class DuelingHead(keras.layers.Layer):
+    def call(self, inputs):
+        value, advantage = inputs
+        return value + advantage - tensorflow.reduce_mean(advantage, axis=1, keepdims=True)
 
 
-class InputPattern:
-    def __init__(self, trump: int, hand1: Hand, hand2: Hand, hand3: Hand, hand4: Hand, trick: Hand, trick_suite: int):
-        self.input = numpy.repeat(-1, STATE_SIZE)
-        self._map_cards_to_input(hand1, CardPosition.PLAYER)
-        self._map_cards_to_input(hand2, CardPosition.LEFT_OPPONENT)
-        self._map_cards_to_input(hand3, CardPosition.PARTNER)
-        self._map_cards_to_input(hand4, CardPosition.RIGHT_OPPONENT)
-        self._map_cards_to_input(trick, CardPosition.TRICK)
-        self.input[52] = Trump(trump).value
-        self.input[53] = Suit(trick_suite).value
+CUSTOM_OBJECTS = {'CardEmbedding': CardEmbedding, 'DuelingHead': DuelingHead}
 
-    def _map_cards_to_input(self, input_list: Hand, position: CardPosition):
-        for item in input_list or []:
-            self.input[item] = position.value
 
-    def get_array(self) -> numpy.ndarray:
-        return self.input.reshape(1, len(self.input))
-
-
-def model() -> keras.Model:
-    model = keras.models.Sequential()
-    model.add(keras.layers.Dense(STATE_SIZE, input_dim=STATE_SIZE, activation=keras.activations.relu))
-    model.add(keras.layers.Dense(DECK_SIZE * STATE_SIZE, activation=keras.activations.relu))
-    model.add(keras.layers.Dense(DECK_SIZE, activation=keras.activations.linear))
+def model(config: ModelConfig = None) -> keras.Model:
+    config = config or ARCHITECTURES[DEFAULT_ARCHITECTURE]
+    inputs = keras.Input((STATE_SIZE, ))
+    layer = CardEmbedding(config.embedding)(inputs) if config.embedding else inputs
+    for units in config.hidden:
+        layer = keras.layers.Dense(units, activation=keras.activations.relu)(layer)
+    if config.dueling:
+        value = keras.layers.Dense(1, activation=keras.activations.linear)(layer)
+        advantage = keras.layers.Dense(DECK_SIZE, activation=keras.activations.linear)(layer)
+        outputs = DuelingHead()([value, advantage])
+    else:
+        outputs = keras.layers.Dense(DECK_SIZE, activation=keras.activations.linear)(layer)
+    model = keras.Model(inputs, outputs)
     model.compile(optimizer='adadelta', loss='mean_squared_error')
     return model
 
 
-def load_model(filename: str) -> keras.Model:
-    return keras.models.load_model(filename)
+def limit_threads(threads: int = 1) -> None:
+    # For worker processes sharing the machine; must run before TensorFlow executes anything.
+    tensorflow.config.threading.set_intra_op_parallelism_threads(threads)
+    tensorflow.config.threading.set_inter_op_parallelism_threads(threads)
+
+
+def save_model(model: keras.Model, config: ModelConfig, filename: str) -> None:
+    # The weights, and next to them the architecture to rebuild the model from with its size and cost.
+    model.save(filename)
+    write_metadata(config, filename)
+
+
+def load_model(filename: str) -> Tuple[keras.Model, ModelConfig]:
+    config = read_metadata(filename)
+    if config is None:
+        return keras.models.load_model(filename, custom_objects=CUSTOM_OBJECTS), ARCHITECTURES['legacy']
+    built = model(config)
+    built.load_weights(filename)
+    return built, config
+
+
+class Predictor:
+    # Forward pass through a compiled call with a fixed input signature. Unlike `Model.predict` it sets up no
+    # data adapter or callbacks, and inputs are copied into a reused float32 buffer.
+    def __init__(self, model: keras.Model, batch_size: int = 64):
+        self.model = model
+        self.buffer = numpy.empty((batch_size, STATE_SIZE), dtype=numpy.float32)
+        self._call = tensorflow.function(
+            lambda inputs: model(inputs, training=False),
+            input_signature=[tensorflow.TensorSpec((None, STATE_SIZE), tensorflow.float32)]
+        )
+
+    def __call__(self, inputs: numpy.ndarray) -> numpy.ndarray:
+        count = len(inputs)
+        if count > len(self.buffer):
+            self.buffer = numpy.empty((count, STATE_SIZE), dtype=numpy.float32)
+        batch = self.buffer[:count]
+        batch[...] = inputs
+        return self._call(batch).numpy()
+
+
+class Trainer:
+    # One compiled call per update: next-state evaluation, Q-learning targets and the gradient step.
+    # With `target_sync` > 0 next states are evaluated by a frozen copy of the model synced every that many updates.
+    # Next states are valued by their best legal action. `targets` picks what the other actions are trained to:
+    # 'q' their current values, which leaves only the action taken in the loss, or 'rules' valid / invalid move values.
+    def __init__(
+        self,
+        model: keras.Model,
+        learning_rate: float,
+        discount_factor: float,
+        target_sync: int = 0,
+        targets: str = 'q'
+    ):
+        assert targets in ('rules', 'q')
+        self.model = model
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.target_sync = target_sync
+        self.targets = targets
+        self.updates = 0
+        self.target_model = None
+        if target_sync:
+            self.target_model = keras.models.clone_model(model)
+            self.target_model.set_weights(model.get_weights())
+        self._step = tensorflow.function(
+            self._train_step,
+            input_signature=[
+                tensorflow.TensorSpec((None, STATE_SIZE), tensorflow.float32),
+                tensorflow.TensorSpec((None, ), tensorflow.int32),
+                tensorflow.TensorSpec((None, ), tensorflow.float32),
+                tensorflow.TensorSpec((None, STATE_SIZE), tensorflow.float32),
+                tensorflow.TensorSpec((None, ), tensorflow.float32),
+                tensorflow.TensorSpec((None, DECK_SIZE), tensorflow.bool),
+                tensorflow.TensorSpec((None, DECK_SIZE), tensorflow.bool),
+                tensorflow.TensorSpec((None, ), tensorflow.float32),
+            ]
+        )
+
+    def __call__(
+        self,
+        states: numpy.ndarray,
+        actions: numpy.ndarray,
+        rewards: numpy.ndarray,
+        next_states: numpy.ndarray,
+        dones: numpy.ndarray,
+        legal: numpy.ndarray,
+        next_legal: numpy.ndarray = None,
+        weights: numpy.ndarray = None
+    ) -> numpy.ndarray:
+        weights = numpy.ones(len(actions), dtype=numpy.float32) if weights is None else weights
+        next_legal = numpy.ones((len(actions), DECK_SIZE), dtype=bool) if next_legal is None else next_legal
+        errors = self._step(
+            numpy.asarray(states, dtype=numpy.float32),
+            numpy.asarray(actions, dtype=numpy.int32),
+            numpy.asarray(rewards, dtype=numpy.float32),
+            numpy.asarray(next_states, dtype=numpy.float32),
+            numpy.asarray(dones, dtype=numpy.float32),
+            numpy.asarray(legal, dtype=bool),
+            numpy.asarray(next_legal, dtype=bool),
+            numpy.asarray(weights, dtype=numpy.float32),
+        )
+        self.updates += 1
+        if self.target_sync and self.updates % self.target_sync == 0:
+            self.sync()
+        return errors.numpy()
+
+    def sync(self) -> None:
+        if self.target_model is not None:
+            self.target_model.set_weights(self.model.get_weights())
+
+    def _train_step(self, states, actions, rewards, next_states, dones, legal, next_legal, weights):
+        bootstrap = self.target_model or self.model
+        next_values = tensorflow.where(next_legal, bootstrap(next_states, training=False), -numpy.inf)
+        # a finished game has no legal actions left
+        next_max = tensorflow.where(dones > 0, 0.0, tensorflow.reduce_max(next_values, axis=1))
+        rows = tensorflow.range(tensorflow.shape(actions)[0])
+        indices = tensorflow.stack([rows, actions], axis=1)
+        with tensorflow.GradientTape() as tape:
+            q_values = self.model(states, training=True)
+            old_q_value = tensorflow.stop_gradient(tensorflow.gather_nd(q_values, indices))
+            new_q_value = (1 - self.learning_rate) * old_q_value \
+                        + self.learning_rate * (rewards + self.discount_factor * next_max)
+            if self.targets == 'rules':
+                reward_invalid = -13
+                raward_valid = 0.1
+                targets = tensorflow.where(legal, raward_valid, reward_invalid)
+            else:
+                targets = tensorflow.stop_gradient(q_values)
+            targets = tensorflow.tensor_scatter_nd_update(targets, indices, new_q_value)
+            loss = tensorflow.reduce_mean(
+                weights * tensorflow.reduce_mean(tensorflow.square(targets - q_values), axis=1)
+            )
+        gradients = tape.gradient(loss, self.model.trainable_variables)
+        self.model.optimizer.apply_gradients(zip(gradients, self.model.trainable_variables))
+        return new_q_value - old_q_value
+
+
+if __name__ == '__main__':
+    for name, config in ARCHITECTURES.items():
+        print(f'{name:10} parameters {config.parameters():>9} flops {config.flops():>9}  {config}')
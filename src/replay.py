@@ -0,0 +1,174 @@
+import json
+from typing import Dict, NamedTuple, Optional
+
+import numpy
+
+from src.encoding import DECK_SIZE, STATE_SIZE
+
+
+class Batch(NamedTuple):
+    states: numpy.ndarray
+    actions: numpy.ndarray
+    rewards: numpy.ndarray
+    next_states: numpy.ndarray
+    dones: numpy.ndarray
+    legal: numpy.ndarray
+    next_legal: numpy.ndarray
+    indices: numpy.ndarray
+    weights: numpy.ndarray
+
+
+class SumTree:
+    def __init__(self, capacity: int):
+        self.size = 1
+        while self.size < capacity:
+            self.size *= 2
+        self.nodes = numpy.zeros(2 * self.size, dtype=numpy.float64)
+
+    @property
+    def total(self) -> float:
+        return self.nodes[1]
+
+    def get(self, indices: numpy.ndarray) -> numpy.ndarray:
+        return self.nodes[indices + self.size]
+
+    def update(self, index: int, priority: float) -> None:
+        node = index + self.size
+        change = priority - self.nodes[node]
+        while node:
+            self.nodes[node] += change
+            node //= 2
+
+    def find(self, values: numpy.ndarray) -> numpy.ndarray:
+        # leaf index of every prefix-sum value, descending the tree for the whole batch at once
+        node = numpy.ones(len(values), dtype=numpy.int64)
+        while node[0] < self.size:
+            left = node * 2
+            go_right = values > self.nodes[left]
+            values = numpy.where(go_right, values - self.nodes[left], values)
+            node = numpy.where(go_right, left + 1, left)
+        return node - self.size
+
+
+class ReplayBuffer:
+    def __init__(
+        self,
+        capacity: int,
+        prioritized: bool = False,
+        alpha: float = 0.6,
+        beta: float = 0.4,
+        epsilon: float = 1e-3,
+        seed: Optional[int] = None
+    ):
+        self.capacity = capacity
+        self.states = numpy.zeros((capacity, STATE_SIZE), dtype=numpy.float32)
+        self.actions = numpy.zeros(capacity, dtype=numpy.int64)
+        self.rewards = numpy.zeros(capacity, dtype=numpy.float32)
+        self.next_states = numpy.zeros((capacity, STATE_SIZE), dtype=numpy.float32)
+        self.dones = numpy.zeros(capacity, dtype=bool)
+        self.legal = numpy.zeros((capacity, DECK_SIZE), dtype=bool)
+        self.next_legal = numpy.zeros((capacity, DECK_SIZE), dtype=bool)
+        self.position = 0
+        self.count = 0
+        self.rng = numpy.random.default_rng(seed)
+
+        self.prioritized = prioritized
+        self.alpha, self.beta, self.epsilon = alpha, beta, epsilon
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(
+        self, state: numpy.ndarray, action: int, reward: float, next_state: numpy.ndarray, done: bool,
+        legal: numpy.ndarray, next_legal: numpy.ndarray
+    ) -> None:
+        index = self.position
+        self.states[index] = state
+        self.actions[index] = action
+        self.rewards[index] = reward
+        self.next_states[index] = next_state
+        self.dones[index] = done
+        self.legal[index] = legal
+        self.next_legal[index] = next_legal
+        if self.prioritized:
+            self.tree.update(index, self.max_priority)
+        self.position = (index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def extend(
+        self, states: numpy.ndarray, actions: numpy.ndarray, rewards: numpy.ndarray, next_states: numpy.ndarray,
+        dones: numpy.ndarray, legal: numpy.ndarray, next_legal: numpy.ndarray
+    ) -> None:
+        # `add` for a whole batch of transitions, one row each
+        indices = (self.position + numpy.arange(len(actions))) % self.capacity
+        self.states[indices] = states
+        self.actions[indices] = actions
+        self.rewards[indices] = rewards
+        self.next_states[indices] = next_states
+        self.dones[indices] = dones
+        self.legal[indices] = legal
+        self.next_legal[indices] = next_legal
+        if self.prioritized:
+            for index in indices:
+                self.tree.update(int(index), self.max_priority)
+        self.position = int(indices[-1] + 1) % self.capacity if len(indices) else self.position
+        self.count = min(self.count + len(indices), self.capacity)
+
+    def sample(self, batch_size: int) -> Batch:
+        assert self.count, "cannot sample from an empty buffer"
+        if self.prioritized:
+            total = self.tree.total
+            # one value per equal segment of the priority mass
+            values = (numpy.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+            indices = numpy.minimum(self.tree.find(values), self.count - 1)
+            probabilities = self.tree.get(indices) / total
+            weights = (self.count * probabilities)**-self.beta
+            weights = (weights / weights.max()).astype(numpy.float32)
+        else:
+            indices = self.rng.integers(0, self.count, batch_size)
+            weights = numpy.ones(batch_size, dtype=numpy.float32)
+        return Batch(
+            self.states[indices], self.actions[indices], self.rewards[indices], self.next_states[indices],
+            self.dones[indices], self.legal[indices], self.next_legal[indices], indices, weights
+        )
+
+    def update_priorities(self, indices: numpy.ndarray, errors: numpy.ndarray) -> None:
+        if not self.prioritized:
+            return
+        priorities = (numpy.abs(errors) + self.epsilon)**self.alpha
+        for index, priority in zip(indices, priorities):
+            self.tree.update(int(index), float(priority))
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+    def get_state(self) -> Dict[str, numpy.ndarray]:
+        # copies of the filled rows, the priorities and the sampling generator, for checkpoints
+        count = self.count
+        state = {
+            'states': self.states[:count].copy(),
+            'actions': self.actions[:count].copy(),
+            'rewards': self.rewards[:count].copy(),
+            'next_states': self.next_states[:count].copy(),
+            'dones': self.dones[:count].copy(),
+            'legal': self.legal[:count].copy(),
+            'next_legal': self.next_legal[:count].copy(),
+            'position': numpy.array(self.position),
+            'max_priority': numpy.array(self.max_priority),
+            'rng': numpy.array(json.dumps(self.rng.bit_generator.state)),
+        }
+        if self.prioritized:
+            state['priorities'] = self.tree.nodes.copy()
+        return state
+
+    def set_state(self, state: Dict[str, numpy.ndarray]) -> None:
+        count = len(state['actions'])
+        assert count <= self.capacity, f'{count} transitions do not fit in a buffer of {self.capacity}'
+        for name in ('states', 'actions', 'rewards', 'next_states', 'dones', 'legal', 'next_legal'):
+            getattr(self, name)[:count] = state[name]
+        self.count = count
+        self.position = int(state['position'])
+        self.max_priority = float(state['max_priority'])
+        self.rng.bit_generator.state = json.loads(str(state['rng']))
+        if self.prioritized:
+            self.tree.nodes[...] = state['priorities']
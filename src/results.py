@@ -0,0 +1,197 @@
+import csv
+import os
+import queue
+import threading
+from typing import Dict, Iterator, List
+
+import numpy
+
+from src.engine import DECK_SIZE, PLAYERS
+from src.models import COLORS, Card
+
+# Binary results: the magic and value dtype, then appended chunks of an uint32 row count followed by every column
+# of the chunk in `columns` order. Cards are played in order, one byte each: player index * 64 + card id.
+MAGIC = b'RESULTS1'
+HEADER_SIZE = 16
+NO_CARD = 255
+CARD_NAMES = {index * 64 + card: f'{player.value}:{Card(card)}' for index, player in enumerate(PLAYERS)
+              for card in range(DECK_SIZE)}
+CARD_NAME_SIZE = 4  # 'W:SA'
+
+
+def _byte_table(symbols: str, step: int) -> numpy.ndarray:
+    table = numpy.zeros(256, dtype=numpy.uint8)
+    table[numpy.frombuffer(symbols.encode(), dtype=numpy.uint8)] = numpy.arange(len(symbols)) * step
+    return table
+
+
+# code parts by the ASCII byte at every position of a card name
+PLAYER_CODES = _byte_table(''.join(player.value for player in PLAYERS), 64)
+SUIT_CODES = _byte_table(COLORS, 13)
+VALUE_CODES = _byte_table('23456789TJQKA', 1)
+
+
+def columns(value_dtype: numpy.dtype) -> Dict[str, tuple]:
+    return {
+        'episode': (numpy.int32, ()),
+        'invalid': (numpy.int32, ()),
+        'value': (value_dtype, ()),
+        'cards': (numpy.uint8, (DECK_SIZE, )),
+    }
+
+
+def join_cards(cards_played: List[str]) -> str:
+    # `cards_played` as logged by the play loops, e.g. ['W:SA', 'N:S2E:S3', '.'], without the invalid moves
+    return ''.join(cards_played).replace('.', '')
+
+
+def encode_cards(games: List[str]) -> numpy.ndarray:
+    # (len(games), 52) codes of `join_cards` strings, all games at once
+    lengths = numpy.fromiter((len(game) // CARD_NAME_SIZE for game in games), dtype=numpy.int64, count=len(games))
+    names = numpy.frombuffer(''.join(games).encode('ascii'), dtype=numpy.uint8).reshape(-1, CARD_NAME_SIZE)
+    codes = numpy.full((len(games), DECK_SIZE), NO_CARD, dtype=numpy.uint8)
+    rows = numpy.repeat(numpy.arange(len(games)), lengths)
+    positions = numpy.arange(len(names)) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+    codes[rows, positions] = PLAYER_CODES[names[:, 0]] + SUIT_CODES[names[:, 2]] + VALUE_CODES[names[:, 3]]
+    return codes
+
+
+def decode_cards(codes: numpy.ndarray) -> str:
+    return ''.join(CARD_NAMES[code] for code in codes.tolist() if code != NO_CARD)
+
+
+class ResultWriter:
+    # Buffers episode results and appends them to `path` in chunks from a background thread, which turns them into
+    # typed columns, so the play loop never waits on conversion or disk. `csv_path` gets the old CSV layout on close.
+    def __init__(
+        self,
+        path: str,
+        value_dtype=numpy.float32,
+        chunk_size: int = 1024,
+        csv_path: str = None,
+        append: bool = False
+    ):
+        self.path = path
+        self.csv_path = csv_path
+        self.value_dtype = numpy.dtype(value_dtype)
+        self.chunk_size = chunk_size
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if append and os.path.exists(path) and os.path.getsize(path):
+            if read_header(path) != self.value_dtype:
+                raise ValueError(f'{path} holds other values than {self.value_dtype}')
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write((MAGIC + self.value_dtype.str.encode()).ljust(HEADER_SIZE, b'\0'))
+        self.error = None
+        self.chunks = queue.Queue(maxsize=4)
+        self.thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self.thread.start()
+        self._new_buffers()
+
+    def _new_buffers(self) -> None:
+        self.episodes, self.invalid, self.values, self.cards = [], [], [], []
+
+    def write(self, episode: int, invalid_actions: int, value: float, cards_played: List[str]) -> None:
+        self.episodes.append(episode)
+        self.invalid.append(invalid_actions)
+        self.values.append(value)
+        self.cards.append(join_cards(cards_played))
+        if len(self.episodes) == self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.episodes:
+            self.chunks.put((self.episodes, self.invalid, self.values, self.cards))
+            self._new_buffers()
+
+    def sync(self) -> int:
+        # Waits until everything written so far is in the file and returns its size, where a resumed run truncates it.
+        self.flush()
+        self.chunks.join()
+        if self.error:
+            raise self.error
+        return self.file.tell()
+
+    def _write_chunks(self) -> None:
+        while True:
+            chunk = self.chunks.get()
+            try:
+                if chunk is None:
+                    return
+                if not self.error:
+                    self._write_chunk(*chunk)
+            finally:
+                self.chunks.task_done()
+
+    def _write_chunk(self, episodes: List[int], invalid: List[int], values: List[float], cards: List[str]) -> None:
+        try:
+            codes = encode_cards(cards)
+            self.file.write(numpy.uint32(len(episodes)).tobytes())
+            self.file.write(numpy.asarray(episodes, dtype=numpy.int32).tobytes())
+            self.file.write(numpy.asarray(invalid, dtype=numpy.int32).tobytes())
+            self.file.write(numpy.asarray(values, dtype=self.value_dtype).tobytes())
+            self.file.write(codes.tobytes())
+            self.file.flush()
+        except Exception as error:
+            # kept for `sync` and `close` to raise; the thread goes on draining chunks so writers never block
+            self.error = error
+
+    def close(self) -> None:
+        self.flush()
+        self.chunks.put(None)
+        self.thread.join()
+        self.file.close()
+        if self.error:
+            raise self.error
+        if self.csv_path:
+            export_csv(self.path, self.csv_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_header(path: str) -> numpy.dtype:
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path} is not a results file')
+    return numpy.dtype(header[len(MAGIC):].rstrip(b'\0').decode())
+
+
+def read_chunks(path: str) -> Iterator[Dict[str, numpy.ndarray]]:
+    layout = columns(read_header(path))
+    with open(path, 'rb') as f:
+        f.seek(HEADER_SIZE)
+        while True:
+            count = f.read(4)
+            if len(count) < 4:
+                return
+            count = int(numpy.frombuffer(count, dtype=numpy.uint32)[0])
+            chunk = {}
+            for name, (dtype, shape) in layout.items():
+                size = count * int(numpy.prod(shape, dtype=int))
+                chunk[name] = numpy.fromfile(f, dtype=dtype, count=size).reshape(count, *shape)
+            yield chunk
+
+
+def read_results(path: str) -> Dict[str, numpy.ndarray]:
+    layout = columns(read_header(path))
+    chunks = list(read_chunks(path))
+    if not chunks:
+        return {name: numpy.empty((0, *shape), dtype=dtype) for name, (dtype, shape) in layout.items()}
+    return {name: numpy.concatenate([chunk[name] for chunk in chunks]) for name in layout}
+
+
+def export_csv(path: str, csv_path: str) -> None:
+    # rows as the play loops used to write them: episode, invalid moves, reward or tricks, cards played
+    with open(csv_path, 'w') as f:
+        writer = csv.writer(f)
+        for chunk in read_chunks(path):
+            # numpy scalars print their shortest round-trip form: 0.1 rather than 0.10000000149011612
+            values = chunk['value']
+            for row, (episode, invalid) in enumerate(zip(chunk['episode'].tolist(), chunk['invalid'].tolist())):
+                writer.writerow((episode, invalid, values[row], decode_cards(chunk['cards'][row])))
@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable
+
+import numpy
+
+from src.agents import Agent, DeepQLearnAgent, state_input
+from src.encoding import DECK_SIZE, STATE_SIZE
+from src.engine import StateView, hand_to_mask
+from src.inference import NumpyQNetwork
+from src.models import GameState
+
+# Moves of many games from one model: clients send a request per move over a Unix socket, the server groups the
+# requests waiting at most `max_latency` seconds into one forward pass of up to `max_batch` positions and answers
+# each with the best legal card, one byte.
+REQUEST = numpy.dtype([('input', '<f4', (STATE_SIZE, )), ('legal', '<u8')])
+SOCKET_FILE = os.path.join(tempfile.gettempdir(), 'bridge-q.sock')
+Forward = Callable[[numpy.ndarray], numpy.ndarray]  # (N, STATE_SIZE) inputs -> (N, DECK_SIZE) Q-values
+
+
+def best_legal(q_values: numpy.ndarray, legal: numpy.ndarray) -> numpy.ndarray:
+    # best card of every row out of its legal mask, the uint64 card bits of the engine
+    bits = numpy.unpackbits(legal.astype('<u8').view(numpy.uint8).reshape(-1, 8), axis=1, count=DECK_SIZE,
+                            bitorder='little').view(bool)
+    return numpy.argmax(numpy.where(bits, q_values, -numpy.inf), axis=1)
+
+
+class InferenceServer:
+    def __init__(self, forward: Forward, max_batch: int = 64, max_latency: float = 0.002):
+        self.forward = forward
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.requests = 0
+        self.batches = 0
+        self.loop = None
+        self.stopped = None
+        self.ready = threading.Event()
+
+    def run(self, path: str = SOCKET_FILE) -> None:
+        asyncio.run(self.serve(path))
+
+    def start(self, path: str = SOCKET_FILE) -> threading.Thread:
+        # In a thread of this process, for games played in other threads.
+        thread = threading.Thread(target=self.run, args=(path, ), daemon=True)
+        thread.start()
+        self.ready.wait()
+        return thread
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def serve(self, path: str) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        queue = asyncio.Queue()
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(lambda reader, writer: self._client(queue, reader, writer), path)
+        batcher = asyncio.create_task(self._batches(queue))
+        self.ready.set()
+        try:
+            await self.stopped.wait()
+        finally:
+            batcher.cancel()
+            server.close()
+            await server.wait_closed()
+            os.unlink(path)
+
+    async def _client(self, queue: asyncio.Queue, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await reader.readexactly(REQUEST.itemsize)
+                reply = self.loop.create_future()
+                queue.put_nowait((request, reply))
+                writer.write(bytes((await reply, )))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception:
+            # the forward pass failed and was reported by the batcher; closing tells the client
+            pass
+        finally:
+            writer.close()
+
+    async def _batches(self, queue: asyncio.Queue) -> None:
+        while True:
+            pending = [await queue.get()]
+            deadline = self.loop.time() + self.max_latency
+            while len(pending) < self.max_batch:
+                if queue.empty():
+                    timeout = deadline - self.loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        pending.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    pending.append(queue.get_nowait())
+            requests = numpy.frombuffer(b''.join(request for request, _ in pending), dtype=REQUEST)
+            try:
+                actions = best_legal(self.forward(requests['input']), requests['legal'])
+            except Exception as error:
+                # the batcher keeps serving, only the clients waiting on this batch are dropped
+                print(f'Forward pass of {len(pending)} requests failed: {error!r}', file=sys.stderr)
+                for _, reply in pending:
+                    reply.set_exception(error)
+                continue
+            for (_, reply), action in zip(pending, actions.tolist()):
+                reply.set_result(action)
+            self.requests += len(pending)
+            self.batches += 1
+
+
+class RemoteQAgent(Agent):
+    # Greedy moves from an `InferenceServer`. One connection per agent, so one agent per game thread or process.
+    def __init__(self, path: str = SOCKET_FILE, connect_timeout: float = 30.0):
+        self.path = path
+        self.request = numpy.zeros(1, dtype=REQUEST)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            try:
+                self.socket.connect(path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # the server may still be loading its model
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def move(self, state: GameState) -> int:
+        state_input(state, self.request['input'][0])
+        if isinstance(state, StateView):
+            self.request['legal'] = state.game.legal_mask()
+        else:
+            self.request['legal'] = hand_to_mask(state.valid_moves)
+        self.socket.sendall(self.request.tobytes())
+        reply = self.socket.recv(1)
+        if not reply:
+            raise ConnectionError(f'inference server at {self.path} closed the connection')
+        return reply[0]
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve batched greedy moves of a Q-network over a Unix socket')
+    parser.add_argument('--socket', default=SOCKET_FILE)
+    parser.add_argument('--numpy', metavar='FILE', help='network exported by src.inference instead of a Keras model')
+    parser.add_argument('--architecture', help='Keras network to serve, the original by default')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-latency-ms', type=float, default=2.0, help='longest wait for a batch to fill')
+    args = parser.parse_args()
+
+    if args.numpy:
+        forward = NumpyQNetwork.load(args.numpy)
+    else:
+        forward = DeepQLearnAgent(architecture=args.architecture).predictor
+    server = InferenceServer(forward, args.max_batch, args.max_latency_ms / 1000)
+    print(f'Serving on {args.socket}')
+    try:
+        server.run(args.socket)
+    except KeyboardInterrupt:
+        pass
+    print(f'{server.requests} moves in {server.batches} batches')
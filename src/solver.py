@@ -0,0 +1,358 @@
+from typing import Dict, List, Tuple, Union
+
+from src.engine import CARD_BIT, CARD_SUIT, NO_TRUMP, SUIT_MASKS, TRICK_RANKS, BitState, StateView
+from src.models import Deal, GameState
+
+AnyState = Union[BitState, StateView, GameState]
+
+
+def _sequence_tops(hand: int, present: int) -> Tuple[int, ...]:
+    # Cards of `hand` (one suit) that top a run of cards with no other card still in play between them,
+    # highest first. Playing any card of such a run gives the same result, so only its top is searched.
+    tops = []
+    previous_in_hand = False
+    for card in range(hand.bit_length() - 1, -1, -1):
+        bit = 1 << card
+        if not present & bit:
+            continue
+        in_hand = bool(hand & bit)
+        if in_hand and not previous_in_hand:
+            tops.append(card)
+        previous_in_hand = in_hand
+    return tuple(tops)
+
+
+def _suit_info(suit_hands: Tuple[int, int, int, int]) -> Tuple[int, Tuple[int, int, int, int], int]:
+    # Owners of the cards still in play in one suit from the highest, 2 bits each behind a marker bit, with the
+    # suit length of every hand. Positions that differ only in which small cards are already gone share both.
+    present = suit_hands[0] | suit_hands[1] | suit_hands[2] | suit_hands[3]
+    pattern = 1
+    for card in range(present.bit_length() - 1, -1, -1):
+        bit = 1 << card
+        if present & bit:
+            owner = 0 if suit_hands[0] & bit else 1 if suit_hands[1] & bit else 2 if suit_hands[2] & bit else 3
+            pattern = pattern << 2 | owner
+    lengths = tuple(bin(hand).count('1') for hand in suit_hands)
+    return pattern, lengths, sum(lengths)
+
+
+def _top_card(present: int, count: int) -> int:
+    # The `count`-th highest card of `present` (one suit).
+    for _ in range(count - 1):
+        present ^= 1 << present.bit_length() - 1
+    return present.bit_length() - 1
+
+
+def quick_tricks(hands: List[int], leader: int, trump: int) -> Tuple[int, int]:
+    # Tricks the leader cashes from the top at trick start: cards above every other card still in play in the
+    # suit. With trumps out, side suit winners only count while no trump holder can be void in the suit.
+    # Returns the tricks and the lowest counted winner of every suit, which the count depends on.
+    hand = hands[leader]
+    others = (hands[(leader + 1) % 4], hands[(leader + 2) % 4], hands[(leader + 3) % 4])
+    rest = others[0] | others[1] | others[2]
+    trump_holders = () if trump == NO_TRUMP else [other for other in others if other & SUIT_MASKS[trump]]
+    tricks = relevant = 0
+    for suit in range(4):
+        mask = SUIT_MASKS[suit]
+        own = hand & mask
+        if not own:
+            continue
+        top_other = rest & mask
+        winners = bin(own >> top_other.bit_length() if top_other else own).count('1')
+        if trump_holders and suit != trump:
+            winners = min([winners] + [bin(other & mask).count('1') for other in trump_holders])
+        if winners:
+            tricks += winners
+            relevant |= 1 << _top_card(own, winners)
+    return tricks, relevant
+
+
+def top_trumps(hands: List[int], trump: int) -> Tuple[int, int, int]:
+    # Each of the top trumps held in one hand wins a trick whenever it is played, whoever leads.
+    # Returns the owner, the number of such trumps and the lowest of them.
+    mask = SUIT_MASKS[trump]
+    top = (hands[0] | hands[1] | hands[2] | hands[3]) & mask
+    if not top:
+        return -1, 0, -1
+    owner = next(player for player in range(4) if hands[player] & 1 << top.bit_length() - 1)
+    rest = (top ^ hands[owner] & mask)
+    winners = hands[owner] & mask
+    winners = winners >> rest.bit_length() if rest else winners
+    count = bin(winners).count('1')
+    return owner, count, _top_card(top, count)
+
+
+def remaining_tricks(game: BitState) -> int:
+    cards = sum(bin(hand).count('1') for hand in game.hands)
+    return (cards + len(game.trick)) // 4
+
+
+def to_bit_state(state: AnyState) -> BitState:
+    if isinstance(state, BitState):
+        return state
+    if isinstance(state, StateView):
+        return state.game
+    return BitState.from_state(state)
+
+
+class DoubleDummySolver:
+    # Null-window alpha-beta ("can NS take `target` tricks?") with a partition-search transposition table.
+    # Entries are stored at trick start under the leader, trump and suit lengths of every hand, and only pin
+    # the owners of the cards that decided some trick below them. Every position agreeing on those matches.
+    def __init__(self, max_entries: int = 2000000, endgame=None):
+        # (leader, trump, suit lengths...) -> [[shifts, prefixes, relevant counts, lower, upper], ...]
+        self.table: Dict[Tuple, List[list]] = {}
+        self.entries = 0
+        self.max_entries = max_entries
+        # an `endgame.EndgameTable` answering the positions it covers; not consulted inside the search, where its
+        # results would pin every card left and leave the transposition entries above them unshared
+        self.endgame = endgame
+        self._tops: Dict[Tuple[int, int], Tuple[int, ...]] = {}
+        self._suits: Dict[Tuple[int, int, int, int], Tuple[int, Tuple[int, int, int, int], int]] = {}
+        self.nodes = 0
+
+    def ns_tricks(self, state: AnyState) -> int:
+        game = to_bit_state(state)
+        if self.endgame is not None and self.endgame.covers(game):
+            return self.endgame.ns_tricks(game)
+        lower, upper = 0, remaining_tricks(game)
+        while lower < upper:
+            target = (lower + upper + 1) // 2
+            if self.ns_makes(game, target):
+                lower = target
+            else:
+                upper = target - 1
+        return lower
+
+    def tricks(self, state: AnyState) -> int:
+        # Tricks the side to move takes from the remaining ones with perfect play of all four hands.
+        game = to_bit_state(state)
+        ns = self.ns_tricks(game)
+        return ns if game.player % 2 else remaining_tricks(game) - ns
+
+    def solve_deal(self, deal: Deal) -> int:
+        return self.ns_tricks(BitState.from_deal(deal))
+
+    def move_values(self, state: AnyState) -> Dict[int, int]:
+        # Tricks the side to move takes with each of its legal cards.
+        game = to_bit_state(state)
+        remaining = remaining_tricks(game)
+        values = {}
+        player = game.player
+        for card in game.legal_moves():
+            winner = game.play(card)
+            ns = (1 if winner >= 0 and winner % 2 else 0) + self.ns_tricks(game)
+            game.unplay()
+            values[card] = ns if player % 2 else remaining - ns
+        return values
+
+    def best_move(self, state: AnyState) -> int:
+        game = to_bit_state(state)
+        target = self.tricks(game)
+        remaining = remaining_tricks(game)
+        candidates = self._ordered_moves(game.hands, game.trick, game.player, game.trump, game.leader)
+        player = game.player
+        for card in candidates:
+            winner = game.play(card)
+            ns_now = 1 if winner >= 0 and winner % 2 else 0
+            if player % 2:
+                found = self.ns_makes(game, target - ns_now)
+            else:
+                found = not self.ns_makes(game, remaining - target - ns_now + 1)
+            game.unplay()
+            if found:
+                return card
+        return candidates[0]
+
+    def ns_makes(self, state: AnyState, target: int) -> bool:
+        game = to_bit_state(state)
+        if self.endgame is not None and self.endgame.covers(game):
+            return self.endgame.ns_tricks(game) >= target
+        if self.entries > self.max_entries:
+            self.table.clear()
+            self.entries = 0
+        result, _ = self._search(
+            list(game.hands), list(game.trick), game.player, game.leader, game.trump, target, remaining_tricks(game)
+        )
+        return result
+
+    def _ordered_moves(self, hands: List[int], trick: List[int], player: int, trump: int, leader: int) -> List[int]:
+        hand = hands[player]
+        present = hands[0] | hands[1] | hands[2] | hands[3]
+        for card in trick:
+            present |= CARD_BIT[card]
+        tops_cache = self._tops
+
+        if trick:
+            lead = CARD_SUIT[trick[0]]
+            suits = (lead, ) if hand & SUIT_MASKS[lead] else range(4)
+        else:
+            suits = range(4)
+
+        moves = []
+        for suit in suits:
+            suit_hand = hand & SUIT_MASKS[suit]
+            if not suit_hand:
+                continue
+            key = (suit_hand, present & SUIT_MASKS[suit])
+            tops = tops_cache.get(key)
+            if tops is None:
+                tops = tops_cache[key] = _sequence_tops(*key)
+            moves.extend(tops)
+
+        if not trick:
+            # lead winners first, then the remaining cards from the lowest
+            others = present & ~hand
+            winners = [card for card in moves if not others & SUIT_MASKS[CARD_SUIT[card]] & ~(CARD_BIT[card] * 2 - 1)]
+            rest = [card for card in reversed(moves) if card not in winners]
+            return winners + rest
+
+        ranks = TRICK_RANKS[lead * 5 + trump]
+        best = 0
+        for index in range(1, len(trick)):
+            if ranks[trick[index]] > ranks[trick[best]]:
+                best = index
+        best_card = trick[best]
+        partner_winning = (leader + best) % 2 == player % 2
+        if len(suits) == 1:
+            # following suit: `moves` are cards of the led suit from the highest
+            moves.reverse()
+            if partner_winning or CARD_SUIT[best_card] != lead:
+                return moves
+            split = next((index for index, card in enumerate(moves) if card > best_card), len(moves))
+            return moves[split:] + moves[:split]
+
+        best_rank = ranks[best_card]
+        beating = sorted((card for card in moves if ranks[card] > best_rank), key=ranks.__getitem__)
+        losing = sorted((card for card in moves if ranks[card] <= best_rank), key=ranks.__getitem__)
+        if partner_winning:
+            return losing + beating
+        # cheapest winners first, then the lowest discards
+        return beating + losing
+
+    def _search(
+        self, hands: List[int], trick: List[int], player: int, leader: int, trump: int, needed: int, tricks_left: int
+    ) -> Tuple[bool, int]:
+        # Returns the result with the cards it depends on: the winners of the tricks decided below by rank.
+        table = self.table
+        suits_cache = self._suits
+        ordered_moves = self._ordered_moves
+        rank_tables = [TRICK_RANKS[lead * 5 + trump] for lead in range(4)]
+
+        def suit_infos() -> list:
+            infos = []
+            for mask in SUIT_MASKS:
+                suit_hands = (hands[0] & mask, hands[1] & mask, hands[2] & mask, hands[3] & mask)
+                info = suits_cache.get(suit_hands)
+                if info is None:
+                    info = suits_cache[suit_hands] = _suit_info(suit_hands)
+                infos.append(info)
+            return infos
+
+        def entry_relevance(counts: Tuple[int, ...]) -> int:
+            present = hands[0] | hands[1] | hands[2] | hands[3]
+            relevant = 0
+            for suit, count in enumerate(counts):
+                if count:
+                    relevant |= 1 << _top_card(present & SUIT_MASKS[suit], count)
+            return relevant
+
+        def store(infos: list, bucket_key: Tuple, relevant: int, result: bool, needed: int, tricks_left: int):
+            present = hands[0] | hands[1] | hands[2] | hands[3]
+            shifts, prefixes, counts = [], [], []
+            for suit, (pattern, _, size) in enumerate(infos):
+                low = relevant & SUIT_MASKS[suit]
+                count = bin((present & SUIT_MASKS[suit]) >> (low & -low).bit_length() - 1).count('1') if low else 0
+                shifts.append(2 * (size - count))
+                prefixes.append(pattern >> 2 * (size - count))
+                counts.append(count)
+            shifts, prefixes = tuple(shifts), tuple(prefixes)
+            bucket = table.setdefault(bucket_key, [])
+            for entry in bucket:
+                if entry[1] == prefixes and entry[0] == shifts:
+                    break
+            else:
+                entry = [shifts, prefixes, tuple(counts), 0, tricks_left]
+                bucket.append(entry)
+                self.entries += 1
+            if result:
+                entry[3] = max(entry[3], needed)
+            else:
+                entry[4] = min(entry[4], needed - 1)
+
+        def search(player: int, leader: int, needed: int, tricks_left: int) -> Tuple[bool, int]:
+            self.nodes += 1
+            infos = None
+            if not trick:
+                if needed <= 0:
+                    return True, 0
+                if needed > tricks_left:
+                    return False, 0
+                if tricks_left == 1:
+                    winner, card = self._last_trick(hands, player, trump)
+                    return winner % 2 == 1, CARD_BIT[card]
+                infos = suit_infos()
+                bucket_key = (player, trump, infos[0][1], infos[1][1], infos[2][1], infos[3][1])
+                bucket = table.get(bucket_key)
+                if bucket is not None:
+                    patterns = (infos[0][0], infos[1][0], infos[2][0], infos[3][0])
+                    for shifts, prefixes, counts, lower, upper in bucket:
+                        if lower < needed <= upper:
+                            continue
+                        if (
+                            patterns[0] >> shifts[0] == prefixes[0] and patterns[1] >> shifts[1] == prefixes[1]
+                            and patterns[2] >> shifts[2] == prefixes[2] and patterns[3] >> shifts[3] == prefixes[3]
+                        ):
+                            return lower >= needed, entry_relevance(counts)
+                sure, sure_relevant = quick_tricks(hands, player, trump)
+                if player % 2 and sure >= needed:
+                    return True, sure_relevant
+                if not player % 2 and tricks_left - sure < needed:
+                    return False, sure_relevant
+                owner, count, lowest = top_trumps(hands, trump) if trump != NO_TRUMP else (-1, 0, -1)
+                if count:
+                    if owner % 2 and count >= needed:
+                        return True, 1 << lowest
+                    if not owner % 2 and tricks_left - count < needed:
+                        return False, 1 << lowest
+
+            ns_to_move = player % 2 == 1
+            result = not ns_to_move
+            relevant = 0
+            for card in ordered_moves(hands, trick, player, trump, leader):
+                hands[player] ^= CARD_BIT[card]
+                trick.append(card)
+                if len(trick) < 4:
+                    outcome, below = search((player + 1) % 4, leader if len(trick) > 1 else player, needed, tricks_left)
+                    trick.pop()
+                else:
+                    ranks = rank_tables[CARD_SUIT[trick[0]]]
+                    best = 0
+                    for index in range(1, 4):
+                        if ranks[trick[index]] > ranks[trick[best]]:
+                            best = index
+                    winner = (leader + best) % 4
+                    played = trick[:]
+                    del trick[:]
+                    outcome, below = search(winner, winner, needed - winner % 2, tricks_left - 1)
+                    below |= CARD_BIT[played[best]]
+                    trick.extend(played)
+                    trick.pop()
+                hands[player] ^= CARD_BIT[card]
+                if outcome == ns_to_move:
+                    result, relevant = outcome, below
+                    break
+                relevant |= below
+
+            if infos is not None:
+                store(infos, bucket_key, relevant, result, needed, tricks_left)
+            return result, relevant
+
+        return search(player, leader, needed, tricks_left)
+
+    @staticmethod
+    def _last_trick(hands: List[int], leader: int, trump: int) -> Tuple[int, int]:
+        cards = [hands[(leader + offset) % 4].bit_length() - 1 for offset in range(4)]
+        ranks = TRICK_RANKS[CARD_SUIT[cards[0]] * 5 + trump]
+        best = max(range(4), key=lambda index: ranks[cards[index]])
+        return (leader + best) % 4, cards[best]
@@ -0,0 +1,126 @@
+import os
+import struct
+
+import numpy
+
+MAGIC = b'HSTORE01'
+# magic, value dtype, row width, capacity, count; padded to 64 bytes so the arrays stay aligned
+HEADER = struct.Struct('<8s8sIQQ')
+HEADER_SIZE = 64
+EMPTY = numpy.uint64(0)
+MAX_LOAD = 0.7
+
+
+class HashStore:
+    # Open-addressing (linear probing) table from non-zero 64-bit keys to fixed-width rows of `dtype` values,
+    # kept in two flat arrays. Files are the header followed by the raw arrays, so `load` can memory-map them.
+    def __init__(self, width: int, dtype=numpy.float32, capacity: int = 1024):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.width = width
+        self.dtype = numpy.dtype(dtype)
+        self.keys = numpy.zeros(size, dtype=numpy.uint64)
+        self.values = numpy.zeros((size, width), dtype=self.dtype)
+        self.count = 0
+        self._default = numpy.zeros(width, dtype=self.dtype)
+        self._default.flags.writeable = False
+
+    @property
+    def capacity(self) -> int:
+        return len(self.keys)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, key: int) -> bool:
+        return self.find(key) >= 0
+
+    def find(self, key: int) -> int:
+        keys = self.keys
+        mask = len(keys) - 1
+        index = key & mask
+        while True:
+            stored = keys[index]
+            if stored == key:
+                return index
+            if stored == EMPTY:
+                return -1
+            index = (index + 1) & mask
+
+    def get(self, key: int) -> numpy.ndarray:
+        # Row of `key`, or a read-only row of zeros when it was never stored.
+        index = self.find(key)
+        return self.values[index] if index >= 0 else self._default
+
+    def row(self, key: int) -> numpy.ndarray:
+        # Writable row of `key`, inserted as zeros when missing.
+        assert key, "key 0 marks empty slots"
+        keys = self.keys
+        mask = len(keys) - 1
+        index = key & mask
+        while True:
+            stored = keys[index]
+            if stored == key:
+                return self.values[index]
+            if stored == EMPTY:
+                break
+            index = (index + 1) & mask
+        if (self.count + 1) > MAX_LOAD * len(keys):
+            self._resize(len(keys) * 2)
+            return self.row(key)
+        keys[index] = key
+        self.count += 1
+        return self.values[index]
+
+    def _resize(self, capacity: int) -> None:
+        used = numpy.nonzero(self.keys != EMPTY)[0]
+        old_keys, old_values = self.keys[used], self.values[used]
+        self.keys = numpy.zeros(capacity, dtype=numpy.uint64)
+        self.values = numpy.zeros((capacity, self.width), dtype=self.dtype)
+        mask = numpy.uint64(capacity - 1)
+        slots = old_keys & mask
+        pending = numpy.arange(len(old_keys))
+        # linear probing for all keys at once: every round, free slots go to the first key probing them,
+        # the others move one slot on
+        while len(pending):
+            candidates = slots[pending]
+            free = self.keys[candidates] == EMPTY
+            taken, first = numpy.unique(candidates[free], return_index=True)
+            winners = pending[free][first]
+            self.keys[taken] = old_keys[winners]
+            self.values[taken] = old_values[winners]
+            placed = numpy.zeros(len(old_keys), dtype=bool)
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            slots[pending] = (slots[pending] + numpy.uint64(1)) & mask
+
+    def save(self, path: str) -> None:
+        # written next to the target and renamed, so a mapped previous version stays valid
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as f:
+            header = HEADER.pack(MAGIC, self.dtype.str.encode(), self.width, self.capacity, self.count)
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+            f.write(self.keys.tobytes())
+            f.write(self.values.tobytes())
+        os.replace(temporary, path)
+
+    @staticmethod
+    def load(path: str, mmap: bool = True) -> 'HashStore':
+        with open(path, 'rb') as f:
+            magic, dtype, width, capacity, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a hash store file')
+        dtype = numpy.dtype(dtype.rstrip(b'\0').decode())
+        store = HashStore(width, dtype, capacity=1)
+        values_offset = HEADER_SIZE + capacity * 8
+        if mmap:
+            # copy-on-write: pages are read lazily and updates never reach the file until `save`
+            store.keys = numpy.memmap(path, numpy.uint64, 'c', HEADER_SIZE, (capacity, ))
+            store.values = numpy.memmap(path, dtype, 'c', values_offset, (capacity, width))
+        else:
+            store.keys = numpy.fromfile(path, numpy.uint64, capacity, offset=HEADER_SIZE)
+            store.values = numpy.fromfile(path, dtype, capacity * width, offset=values_offset).reshape(capacity, width)
+        store.count = count
+        return store
+
@@ -0,0 +1,113 @@
+import json
+import os
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+import numpy
+import pandas
+
+from src.results import read_chunks
+
+# Per results file statistics for the charts, cached next to the files and recomputed only for files whose
+# modification time or size changed.
+CACHE_FILE = '.summary-cache.json'
+CACHE_VERSION = 1
+RESULT_SUFFIXES = ('.csv', '.bin')
+Summary = Dict[str, object]
+
+
+def _chunks(path: str, chunk_size: int) -> Iterator[Tuple[numpy.ndarray, numpy.ndarray]]:
+    # (invalid, value) columns of a results file, a chunk at a time
+    if path.endswith('.bin'):
+        for chunk in read_chunks(path):
+            yield chunk['invalid'], chunk['value']
+        return
+    # episode, invalid, reward or tricks, cards played; the cards are never parsed
+    reader = pandas.read_csv(path, header=None, usecols=[0, 1, 2], names=['episode', 'invalid', 'value'],
+                             chunksize=chunk_size)
+    for frame in reader:
+        yield frame['invalid'].to_numpy(), frame['value'].to_numpy()
+
+
+def _count(counts: Counter, values: numpy.ndarray) -> None:
+    unique, numbers = numpy.unique(values, return_counts=True)
+    counts.update(dict(zip(unique.tolist(), numbers.tolist())))
+
+
+def summarize(path: str, chunk_size: int = 65536) -> Summary:
+    invalid_series: List[int] = []
+    invalid_counts, value_counts = Counter(), Counter()
+    for invalid, value in _chunks(path, chunk_size):
+        invalid_series.extend(invalid.tolist())
+        _count(invalid_counts, invalid)
+        _count(value_counts, value)
+    # JSON keys are strings, so counts are kept as [value, count] pairs
+    return {
+        'rows': len(invalid_series),
+        'invalid': invalid_series,
+        'invalid_counts': sorted(invalid_counts.items()),
+        'value_counts': sorted(value_counts.items()),
+    }
+
+
+def summarize_folder(folder: str) -> Dict[str, Summary]:
+    # Summaries of every results file in `folder` by file name, from the sidecar cache where still valid.
+    cache_path = os.path.join(folder, CACHE_FILE)
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+        if cache.get('version') != CACHE_VERSION:
+            cache = {}
+    except (OSError, ValueError):
+        cache = {}
+    entries = cache.get('files', {})
+
+    summaries, changed = {}, False
+    with os.scandir(folder) as files:
+        for entry in files:
+            if not entry.is_file() or not entry.name.endswith(RESULT_SUFFIXES):
+                continue
+            stat = entry.stat()
+            cached = entries.get(entry.name)
+            if cached is None or cached['mtime'] != stat.st_mtime_ns or cached['size'] != stat.st_size:
+                cached = {'mtime': stat.st_mtime_ns, 'size': stat.st_size, **summarize(entry.path)}
+                changed = True
+            summaries[entry.name] = cached
+    if changed or len(summaries) != len(entries):
+        temporary = f'{cache_path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'files': summaries}, f)
+        os.replace(temporary, cache_path)
+    return summaries
+
+
+def quantile(counts: List[Tuple[float, int]], q: float) -> float:
+    # `numpy.percentile` (linear interpolation) of the data the sorted counts describe
+    total = sum(count for _, count in counts)
+    position = q * (total - 1)
+    low, high = int(numpy.floor(position)), int(numpy.ceil(position))
+    # the k-th smallest value is the first one whose cumulative count exceeds k
+    cumulative = numpy.cumsum([count for _, count in counts])
+    low_value = counts[int(numpy.searchsorted(cumulative, low, side='right'))][0]
+    high_value = counts[int(numpy.searchsorted(cumulative, high, side='right'))][0]
+    return float(low_value + (high_value - low_value) * (position - low))
+
+
+def box_stats(counts: List[Tuple[float, int]], label: str = None, whis: float = 1.5) -> Dict[str, object]:
+    # What `matplotlib.cbook.boxplot_stats` computes from the raw data, for `Axes.bxp`.
+    q1, median, q3 = quantile(counts, 0.25), quantile(counts, 0.5), quantile(counts, 0.75)
+    iqr = q3 - q1
+    inside = [value for value, _ in counts if q1 - whis * iqr <= value <= q3 + whis * iqr]
+    outside = [(value, count) for value, count in counts if value not in inside]
+    total = sum(count for _, count in counts)
+    return {
+        'label': label,
+        'mean': sum(value * count for value, count in counts) / total,
+        'med': median,
+        'q1': q1,
+        'q3': q3,
+        'iqr': iqr,
+        'whislo': min(inside) if inside else q1,
+        'whishi': max(inside) if inside else q3,
+        'fliers': numpy.repeat([value for value, _ in outside], [count for _, count in outside]),
+    }
@@ -0,0 +1,228 @@
+import argparse
+import csv
+import math
+import multiprocessing
+import os
+import random
+import statistics
+import time
+from collections import deque
+from dataclasses import dataclass
+from itertools import product
+from typing import Dict, Iterator, List, MutableMapping, Sequence, Tuple
+
+import numpy
+
+from src.agents import DeepQLearnAgent
+from src.env import BridgeEnv
+from src.replay import ReplayBuffer
+from src.train import learn
+
+# Hyperparameter search over the agent and `learn` settings. Trials run on a process pool, TensorFlow in each limited
+# to a thread budget, and report a rolling score every `report_every` episodes; a trial scoring below the median of
+# the other trials at the same report stops there (the median stopping rule).
+RESULTS_FILE = 'results/sweep.csv'
+AGENT_PARAMETERS = {
+    'learning_rate': float,
+    'discount_factor': float,
+    'rand_factor': float,
+    'target_sync': int,
+    'architecture': str,
+}
+LEARN_PARAMETERS = {'train_every': int, 'batch_size': int}
+PARAMETERS = {**AGENT_PARAMETERS, **LEARN_PARAMETERS}
+# what `train.py` plays with
+DEFAULTS = {'learning_rate': 0.2, 'discount_factor': 0.4, 'rand_factor': 0.1}
+Trial = Dict[str, object]
+# ('choice', values), ('uniform', low, high) or ('log', low, high)
+Domain = Tuple
+
+
+def parse_domain(name: str, text: str) -> Domain:
+    # 'a,b,c' choices, 'low:high' uniform, 'log:low:high' log-uniform
+    if name not in PARAMETERS:
+        raise ValueError(f'unknown parameter {name}, expected one of {", ".join(PARAMETERS)}')
+    kind = PARAMETERS[name]
+    parts = text.split(':')
+    if len(parts) == 1:
+        return 'choice', [kind(value) for value in text.split(',')]
+    if kind is str:
+        raise ValueError(f'{name} takes a list of choices, not a range')
+    if len(parts) == 3 and parts[0] == 'log':
+        return 'log', float(parts[1]), float(parts[2])
+    if len(parts) == 2:
+        return 'uniform', kind(parts[0]), kind(parts[1])
+    raise ValueError(f'cannot parse the range {text} of {name}')
+
+
+def parse_space(specs: Sequence[str]) -> Dict[str, Domain]:
+    space = {}
+    for spec in specs:
+        name, _, text = spec.partition('=')
+        name = name.strip().replace('-', '_')
+        space[name] = parse_domain(name, text)
+    return space
+
+
+def grid(space: Dict[str, Domain]) -> List[Trial]:
+    ranges = [name for name, domain in space.items() if domain[0] != 'choice']
+    if ranges:
+        raise ValueError(f'a grid needs choices, {", ".join(ranges)} are ranges; use random samples instead')
+    names = list(space)
+    return [dict(zip(names, values)) for values in product(*(space[name][1] for name in names))]
+
+
+def sample(space: Dict[str, Domain], count: int, seed: int = None) -> List[Trial]:
+    rng = random.Random(seed)
+    trials = []
+    for _ in range(count):
+        trial = {}
+        for name, domain in space.items():
+            if domain[0] == 'choice':
+                trial[name] = rng.choice(domain[1])
+            elif domain[0] == 'log':
+                trial[name] = math.exp(rng.uniform(math.log(domain[1]), math.log(domain[2])))
+            elif PARAMETERS[name] is int:
+                trial[name] = rng.randint(domain[1], domain[2])
+            else:
+                trial[name] = rng.uniform(domain[1], domain[2])
+        trials.append(trial)
+    return trials
+
+
+@dataclass(frozen=True)
+class StoppingRule:
+    report_every: int = 50
+    # episodes in the rolling statistics, even so that offence and defence deals weigh the same
+    window: int = 50
+    # reports every trial gets before it can be stopped
+    grace: int = 2
+    # other trials needed at a report for a median to compare with
+    min_trials: int = 3
+    invalid_penalty: float = 1.0
+
+    def score(self, rewards: Sequence[float], invalid_actions: Sequence[int]) -> float:
+        return statistics.mean(rewards) - self.invalid_penalty * statistics.mean(invalid_actions)
+
+    def should_stop(self, scores: MutableMapping, trial: int, report: int, score: float) -> bool:
+        # `scores` is shared by all trials, a manager dict across processes
+        scores[(report, trial)] = score
+        if report < self.grace:
+            return False
+        others = [value for (at, other), value in scores.items() if at == report and other != trial]
+        return len(others) >= self.min_trials and score < statistics.median(others)
+
+
+def run_trial(
+    trial: int, settings: Trial, episodes: int, rule: StoppingRule, scores: MutableMapping, seed: int
+) -> Dict[str, object]:
+    random.seed(seed + trial)
+    numpy.random.seed(seed + trial)
+    parameters = {**DEFAULTS, **settings}
+    player = DeepQLearnAgent(**{name: value for name, value in parameters.items() if name in AGENT_PARAMETERS})
+    opponent = DeepQLearnAgent()
+    replay = ReplayBuffer(100000, prioritized=True, seed=seed + trial)
+    learn_settings = {name: value for name, value in parameters.items() if name in LEARN_PARAMETERS}
+    rewards, invalid = deque(maxlen=rule.window), deque(maxlen=rule.window)
+    played, stopped = 0, False
+    start = time.perf_counter()
+    for _, invalid_actions, reward, _ in learn(BridgeEnv(), player, opponent, episodes, replay, **learn_settings):
+        rewards.append(reward)
+        invalid.append(invalid_actions)
+        played += 1
+        if played % rule.report_every == 0 and played < episodes:
+            if rule.should_stop(scores, trial, played // rule.report_every, rule.score(rewards, invalid)):
+                stopped = True
+                break
+    return {
+        'trial': trial,
+        **settings,
+        'episodes': played,
+        'stopped': stopped,
+        'score': rule.score(rewards, invalid),
+        'reward_mean': statistics.mean(rewards),
+        'invalid_mean': statistics.mean(invalid),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def _init_worker(threads: int) -> None:
+    from src.network import limit_threads
+
+    limit_threads(threads)
+
+
+def _run_trial(arguments: Tuple) -> Dict[str, object]:
+    return run_trial(*arguments)
+
+
+def sweep(
+    trials: List[Trial],
+    episodes: int,
+    processes: int = 0,
+    threads: int = 1,
+    rule: StoppingRule = StoppingRule(),
+    seed: int = 0
+) -> Iterator[Dict[str, object]]:
+    # Yields the result of every trial as it finishes; `processes=0` runs them one after another in this process.
+    if not processes:
+        scores = {}
+        for trial, settings in enumerate(trials):
+            yield run_trial(trial, settings, episodes, rule, scores, seed)
+        return
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        scores = manager.dict()
+        arguments = [(trial, settings, episodes, rule, scores, seed) for trial, settings in enumerate(trials)]
+        # a fresh process per trial, so the TensorFlow state of one does not pile up in the next
+        with context.Pool(processes, _init_worker, (threads, ), maxtasksperchild=1) as pool:
+            yield from pool.imap_unordered(_run_trial, arguments)
+
+
+def write_table(path: str, results: List[Dict[str, object]]) -> None:
+    # All trials, best score first, rewritten through a rename after every finished trial.
+    columns = ['trial', *sorted({name for result in results for name in result if name in PARAMETERS})]
+    columns += ['episodes', 'stopped', 'score', 'reward_mean', 'invalid_mean', 'seconds']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', newline='') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(sorted(results, key=lambda result: result['score'], reverse=True))
+    os.replace(temporary, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search agent and training parameters on a process pool')
+    parser.add_argument(
+        'space',
+        nargs='+',
+        metavar='NAME=VALUES',
+        help=f'a,b,c choices, low:high or log:low:high ranges of {", ".join(PARAMETERS)}'
+    )
+    parser.add_argument('--samples', type=int, default=0, help='random trials, 0 tries the whole grid of choices')
+    parser.add_argument('--episodes', type=int, default=200, help='episodes of a trial that is not stopped')
+    parser.add_argument('--threads', type=int, default=1, help='TensorFlow threads of every trial')
+    parser.add_argument('--processes', type=int, help='trials at a time, by default as many as the threads fit')
+    parser.add_argument('--report-every', type=int, default=50, help='episodes between early stopping checks')
+    parser.add_argument('--window', type=int, default=50, help='episodes in the rolling score')
+    parser.add_argument('--grace', type=int, default=2, help='checks before a trial can be stopped')
+    parser.add_argument('--min-trials', type=int, default=3, help='other trials a median needs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    space = parse_space(args.space)
+    trials = sample(space, args.samples, args.seed) if args.samples else grid(space)
+    processes = args.processes if args.processes is not None else max(1, (os.cpu_count() or 1) // args.threads)
+    rule = StoppingRule(args.report_every, args.window, args.grace, args.min_trials)
+    print(f'{len(trials)} trials on {processes} processes of {args.threads} threads')
+    results = []
+    for result in sweep(trials, args.episodes, processes, args.threads, rule, args.seed):
+        results.append(result)
+        write_table(args.output, results)
+        status = 'stopped' if result['stopped'] else 'done'
+        print(f"trial {result['trial']} {status} after {result['episodes']} episodes, score {result['score']:.3f}")
+    best = max(results, key=lambda result: result['score'])
+    print(f"best trial {best['trial']}: {', '.join(f'{name}={best[name]}' for name in space)}")
+    print(f'results in {args.output}')
@@ -0,0 +1,127 @@
+import argparse
+import multiprocessing
+import os
+from itertools import islice
+from typing import Iterable, List, Optional, Tuple
+
+import numpy
+
+from src.deals import DealCorpus, parse_pbn
+from src.engine import PLAYER_ID, TRUMP_ID, TRUMPS, BitState, hand_to_mask, mix_64
+from src.models import Deal, Player, Trump
+from src.solver import DoubleDummySolver
+from src.store import HashStore
+
+# One row per deal: tricks taken by every declarer (engine player index) in every strain (engine trump index)
+TABLE_SIZE = 5 * 4
+TABLES_FILE = 'src/q_models_data/trick_tables.bin'
+
+
+def table_index(declarer: int, trump: int) -> int:
+    return trump * 4 + declarer
+
+
+def deal_key(deal: Deal) -> int:
+    # Content address of a deal: its hands only, so boards with other contracts or leaders share a table.
+    return hands_key([hand_to_mask(hand) for hand in (deal.hand_w, deal.hand_n, deal.hand_e, deal.hand_s)])
+
+
+def hands_key(hands: List[int]) -> int:
+    key = 0
+    for hand in hands:
+        key = mix_64(key ^ hand)
+    return key or 1
+
+
+def solve_strain(job: Tuple[List[int], int]) -> Tuple[int, int, List[int]]:
+    # Tricks of the four declarers in one strain; one solver so the four searches share its table.
+    hands, trump = job
+    solver = DoubleDummySolver()
+    size = sum(bin(hand).count('1') for hand in hands) // 4
+    tricks = []
+    for declarer in range(4):
+        ns = solver.ns_tricks(BitState(list(hands), (declarer + 1) % 4, trump))
+        tricks.append(ns if declarer % 2 else size - ns)
+    return hands_key(hands), trump, tricks
+
+
+class TrickTables:
+    # Persistent double-dummy tables keyed by `deal_key`, kept in a `HashStore` file of int8 rows.
+    def __init__(self, path: str = TABLES_FILE):
+        self.path = path
+        try:
+            self.store = HashStore.load(path)
+        except FileNotFoundError:
+            self.store = HashStore(TABLE_SIZE, numpy.int8)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __contains__(self, deal: Deal) -> bool:
+        return deal_key(deal) in self.store
+
+    def table(self, deal: Deal) -> Optional[numpy.ndarray]:
+        index = self.store.find(deal_key(deal))
+        return self.store.values[index] if index >= 0 else None
+
+    def tricks(self, deal: Deal, declarer: Player = None, trump: Trump = None) -> Optional[int]:
+        # Optimal tricks of the declarer, in the deal's contract unless given otherwise.
+        table = self.table(deal)
+        if table is None:
+            return None
+        declarer = PLAYER_ID[declarer or deal.declarer]
+        return int(table[table_index(declarer, TRUMP_ID[trump or deal.trump])])
+
+    def ns_tricks(self, deal: Deal) -> Optional[int]:
+        # Optimal tricks of North-South, the side the agents play, in the deal's contract.
+        tricks = self.tricks(deal)
+        if tricks is None:
+            return None
+        return tricks if PLAYER_ID[deal.declarer] % 2 else len(deal.hand_n) - tricks
+
+    def fill(self, deals: Iterable[Deal], processes: int = None) -> int:
+        # Solves the deals missing from the tables on a process pool, one job per deal and strain.
+        # Returns how many deals were added.
+        jobs, seen = [], set()
+        for deal in deals:
+            hands = [hand_to_mask(hand) for hand in (deal.hand_w, deal.hand_n, deal.hand_e, deal.hand_s)]
+            key = hands_key(hands)
+            if key in seen or key in self.store:
+                continue
+            seen.add(key)
+            jobs.extend((hands, trump) for trump in range(len(TRUMPS)))
+        if not jobs:
+            return 0
+
+        solved, strains = {}, {}
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            for key, trump, tricks in pool.imap_unordered(solve_strain, jobs):
+                table = solved.setdefault(key, numpy.zeros(TABLE_SIZE, dtype=numpy.int8))
+                table[table_index(0, trump):table_index(0, trump + 1)] = tricks
+                strains[key] = strains.get(key, 0) + 1
+                if strains[key] == len(TRUMPS):
+                    self.store.row(key)[:] = solved.pop(key)
+        return len(strains)
+
+    def save(self) -> None:
+        self.store.save(self.path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill the double-dummy trick tables for a deal file')
+    parser.add_argument('deals', help='PBN or deal corpus file')
+    parser.add_argument('--tables', default=TABLES_FILE)
+    parser.add_argument('--limit', type=int, help='deals to take from the file, all by default')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    if args.deals.lower().endswith('.pbn'):
+        with open(args.deals) as f:
+            deals = list(islice(parse_pbn(f), args.limit))
+    else:
+        corpus = DealCorpus(args.deals)
+        deals = (corpus[index] for index in range(min(len(corpus), args.limit or len(corpus))))
+    tables = TrickTables(args.tables)
+    added = tables.fill(deals, args.processes)
+    tables.save()
+    print(f'{added} deals solved, {len(tables)} in {args.tables}')
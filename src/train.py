@@ -1,13 +1,27 @@
-import csv
+import argparse
+import multiprocessing
+import os
+import queue
+import random
 import statistics
-from copy import deepcopy
+import sys
+from itertools import islice
+from typing import Dict, Iterator, List, Tuple
 
 import gym
+import numpy
 from gym.envs.registration import register
 
 from src.agents import Agent, DeepQLearnAgent
+from src.architectures import ARCHITECTURES
+from src.checkpoint import CHECKPOINT_FILE, Checkpointer, Progress, restore
 from src.data import opponent_deal, player_deal
-from src.env import BridgeEnv
+from src.deals import DealSource, deal_source
+from src.env import BridgeEnv, Rewards
+from src.metrics import NULL_METRICS, Metrics
+from src.network import limit_threads
+from src.replay import ReplayBuffer
+from src.results import ResultWriter
 
 register(id='Bridge-v0', entry_point='src.env:BridgeEnv', nondeterministic=False)
 
@@ -18,75 +32,353 @@ def get_next_deal():
         yield opponent_deal
 
 
-def learn(env: BridgeEnv, player: Agent, opponent: Agent, episodes=10000):
+def learn(
+    env: BridgeEnv,
+    player: Agent,
+    opponent: Agent,
+    episodes=10000,
+    replay: ReplayBuffer = None,
+    train_every: int = 4,
+    batch_size: int = 32,
+    deals: DealSource = None,
+    metrics: Metrics = NULL_METRICS,
+    first_episode: int = 0,
+    progress: Progress = None
+):
+    # With a replay buffer transitions are stored and the player trains on a sampled minibatch every
+    # `train_every` steps, instead of fitting every single transition. `train_every=0` only stores them.
+    # `deals` defaults to alternating the two training deals. A resumed run starts at `first_episode`, and
+    # `progress['steps']`, kept up to date here, carries the step count through checkpoints so the minibatch updates
+    # fall on the same steps as in an uninterrupted run.
     max_invalid = 50
-    deal_iterator = get_next_deal()
-    for i in range(episodes):
+    progress = progress if progress is not None else {}
+    steps = progress.get('steps', 0)
+    deal_iterator = deals if deals is not None else islice(get_next_deal(), first_episode % 2, None)
+    for i in range(first_episode, episodes):
         done = False
         first_move = env.setup(next(deal_iterator), opponent)
         cumulative_reward = 0
         invalid_actions = 0
         cards_played = [first_move] if first_move else []
         while not done:
-            state = deepcopy(env.state)
-            action = player.move(state)
-            observation, reward, done, info = env.step(action)
-            if reward >= -1:
-                cumulative_reward += reward
-            else:
+            with metrics.timer('copy'):
+                state = env.state.copy()
+            with metrics.timer('move'):
+                action = player.move(state)
+            # the opponent's moves are played inside the step
+            with metrics.timer('step'):
+                observation, reward, done, info = env.step(action)
+            metrics.count('steps')
+            # a lost match (Rewards.MATCH_LOST) used to be counted as an invalid move
+            if reward == Rewards.INVALID_MOVE.value:
                 invalid_actions += 1
+            else:
+                cumulative_reward += reward
             cards_played.append(info)
-            player.update_q(state, action, reward, env.state)
+            if replay is None:
+                with metrics.timer('fit'):
+                    player.update_q(state, action, reward, env.state, done)
+                metrics.count('fits')
+            else:
+                with metrics.timer('store'):
+                    replay.add(*player.transition(state, action, reward, env.state, done))
+                steps += 1
+                progress['steps'] = steps
+                if train_every and steps % train_every == 0 and len(replay) >= batch_size:
+                    _train(player, replay, batch_size, metrics)
             if done or invalid_actions > max_invalid:
+                metrics.count('episodes')
+                _table_gauges(metrics, player, replay)
+                metrics.tick()
                 yield i, invalid_actions, cumulative_reward, cards_played
                 break
 
 
+def _train(player: Agent, replay: ReplayBuffer, batch_size: int, metrics: Metrics) -> None:
+    with metrics.timer('sample'):
+        batch = replay.sample(batch_size)
+    with metrics.timer('fit'):
+        errors = player.update_batch(batch)
+    replay.update_priorities(batch.indices, errors)
+    metrics.count('fits')
+
+
+def _table_gauges(metrics: Metrics, player: Agent, replay: ReplayBuffer) -> None:
+    if not metrics.enabled:
+        return
+    q_table = getattr(player, 'q_table', None)
+    if q_table is not None:
+        metrics.gauge('q_table_entries', len(q_table))
+    if replay is not None:
+        metrics.gauge('replay_size', len(replay))
+
+
+class Outbox:
+    # Replay stand-in for actors: collects the transitions of an episode to send them in one message.
+    def __init__(self):
+        self.transitions: List[Tuple] = []
+
+    def __len__(self) -> int:
+        return 0
+
+    def add(self, *transition) -> None:
+        self.transitions.append(transition)
+
+    def drain(self) -> Tuple[numpy.ndarray, ...]:
+        columns = tuple(numpy.asarray(column) for column in zip(*self.transitions))
+        self.transitions = []
+        return columns
+
+
+def _publish(weights_queue: multiprocessing.Queue, weights: List[numpy.ndarray]) -> None:
+    # Keeps only the latest weights. The previous ones may still be on their way into the pipe, where `get_nowait`
+    # does not see them yet; then they stay and these are skipped, as a blocking put would wait on an actor that
+    # may never read again.
+    try:
+        weights_queue.get_nowait()
+    except queue.Empty:
+        pass
+    try:
+        weights_queue.put_nowait(weights)
+    except queue.Full:
+        pass
+
+
+def _actor(
+    index: int, episodes: int, settings: Dict[str, object], transitions: multiprocessing.Queue,
+    weights: multiprocessing.Queue, seed: int, deals: str
+) -> None:
+    # one core per actor, the learner keeps the rest
+    limit_threads()
+    random.seed(seed)
+    numpy.random.seed(seed)
+    env = BridgeEnv()
+    player = DeepQLearnAgent(**settings)
+    opponent = DeepQLearnAgent()
+    outbox = Outbox()
+    source = deal_source(deals, seed) if deals else None
+    episodes = learn(env, player, opponent, episodes, outbox, 0, deals=source)
+    for episode, invalid_actions, reward, cards_played in episodes:
+        try:
+            player.model.set_weights(weights.get_nowait())
+        except queue.Empty:
+            pass
+        transitions.put((index, episode, invalid_actions, reward, cards_played, outbox.drain()))
+    transitions.put(None)
+
+
+def learn_parallel(
+    player: DeepQLearnAgent,
+    actors: int,
+    episodes=10000,
+    replay: ReplayBuffer = None,
+    train_every: int = 4,
+    batch_size: int = 32,
+    publish_every: int = 50,
+    seed: int = None,
+    deals: str = None,
+    metrics: Metrics = NULL_METRICS,
+    first_episode: int = 0
+) -> Iterator[Tuple[int, int, float, List[str]]]:
+    # Actor processes play the episodes with a recent copy of the player's weights and send their transitions
+    # here, where the player trains on the replay buffer and publishes new weights every `publish_every` updates.
+    # Yields like `learn`, with episodes numbered so that their parity still tells the deal apart.
+    # `deals` is a PBN or corpus file every actor streams its deals from, seeded differently.
+    # A resumed run plays the episodes from `first_episode` on, numbered from there. `train_every=0` only stores.
+    replay = replay if replay is not None else ReplayBuffer(100000, prioritized=True)
+    seed = seed if seed is not None else random.randrange(1 << 30)
+    context = multiprocessing.get_context('spawn')
+    transitions = context.Queue(maxsize=actors * 16)
+    weights = [context.Queue(maxsize=1) for _ in range(actors)]
+    settings = {
+        'learning_rate': player.learning_rate,
+        'discount_factor': player.discount_factor,
+        'rand_factor': player.rand_factor,
+        'architecture': player.architecture,
+    }
+    processes = []
+    offset = first_episode - first_episode % 2
+    episodes -= first_episode
+    for index in range(actors):
+        _publish(weights[index], player.model.get_weights())
+        actor_episodes = episodes // actors + (index < episodes % actors)
+        process = context.Process(
+            target=_actor,
+            args=(index, actor_episodes, settings, transitions, weights[index], seed + index, deals),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    running, pending, updates = actors, 0, 0
+    try:
+        while running:
+            try:
+                message = transitions.get(timeout=5)
+            except queue.Empty:
+                # an actor that died never sends its end of episodes
+                failed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f'actor processes exited with codes {failed}')
+                continue
+            if message is None:
+                running -= 1
+                continue
+            index, episode, invalid_actions, reward, cards_played, batch = message
+            if batch:
+                replay.extend(*batch)
+                pending += len(batch[1])
+                metrics.count('steps', len(batch[1]))
+            while train_every and pending >= train_every and len(replay) >= batch_size:
+                pending -= train_every
+                _train(player, replay, batch_size, metrics)
+                updates += 1
+                if updates % publish_every == 0:
+                    with metrics.timer('publish'):
+                        current = player.model.get_weights()
+                        for weights_queue in weights:
+                            _publish(weights_queue, current)
+            metrics.count('episodes')
+            _table_gauges(metrics, player, replay)
+            metrics.tick()
+            yield offset + (episode // 2 * actors + index) * 2 + episode % 2, invalid_actions, reward, cards_played
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        # weights nobody will read any more must not keep this process from exiting
+        for weights_queue in weights:
+            weights_queue.cancel_join_thread()
+
+
+def _summary(title: str, values: Dict[str, List[float]]) -> None:
+    print(title)
+    print(
+        f"invalid min:{min(values['invalid_actions'])} "
+        f"max:{max(values['invalid_actions'])} "
+        f"mean:{statistics.mean(values['invalid_actions'])} "
+    )
+    print(
+        f"rewards min:{min(values['rewards'])} "
+        f"max:{max(values['rewards'])} "
+        f"mean:{statistics.mean(values['rewards'])} "
+    )
+
+
 if __name__ == '__main__':
-    for i in range(30):
-        env: BridgeEnv = gym.make('Bridge-v0')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--actors', type=int, default=0, help='actor processes, 0 plays in this process')
+    parser.add_argument('--deals', help='PBN or deal corpus file to train on instead of the two built-in deals')
+    parser.add_argument('--no-csv', dest='csv', action='store_false', help='keep only the binary episode results')
+    parser.add_argument('--architecture', choices=ARCHITECTURES, help='network of the player, the original by default')
+    parser.add_argument('--opponent-architecture', choices=ARCHITECTURES, help='network of the opponent')
+    parser.add_argument('--metrics', help='Prometheus text file to rewrite with phase timings and throughput')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help='seconds between metrics file updates')
+    parser.add_argument('--learning-rate', type=float, default=0.2)
+    parser.add_argument('--discount-factor', type=float, default=0.4)
+    parser.add_argument('--rand-factor', type=float, default=0.1, help='exploration rate')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help='training state file, written in the background')
+    parser.add_argument('--checkpoint-every', type=int, default=50, help='episodes between checkpoints within a run')
+    parser.add_argument('--resume', action='store_true', help='continue from the checkpoint')
+    args = parser.parse_args()
 
-        player = DeepQLearnAgent(learning_rate=0.2, discount_factor=0.4, rand_factor=0.1)
-        opponent = DeepQLearnAgent()
+    runs, run_episodes = 30, 200
+    metrics = Metrics(args.metrics, args.metrics_interval) if args.metrics else NULL_METRICS
+    checkpointer = Checkpointer(args.checkpoint)
+    # one player for all runs, kept in memory; its model file is written once training is over
+    player = DeepQLearnAgent(
+        learning_rate=args.learning_rate,
+        discount_factor=args.discount_factor,
+        rand_factor=args.rand_factor,
+        architecture=args.architecture
+    )
+    opponent = DeepQLearnAgent(architecture=args.opponent_architecture)
+    replay = ReplayBuffer(100000, prioritized=True)
 
+    def new_run(run: int) -> Progress:
+        # `sizes` are the bytes of the run's result files at the checkpoint, to cut off what was written after it
+        return {
+            'run': run,
+            'episodes': 0,
+            'steps': 0,
+            'values': [{'invalid_actions': [], 'rewards': []} for _ in range(2)],
+            'sizes': None
+        }
+
+    progress = new_run(0)
+    if args.resume:
+        try:
+            progress = restore(args.checkpoint, player, replay)
+            print(f"Resuming run {progress['run']} after {progress['episodes']} episodes")
+        except FileNotFoundError:
+            print(f'Checkpoint {args.checkpoint} not found, starting over', file=sys.stderr)
+
+    while progress['run'] < runs:
+        i, first_episode, values = progress['run'], progress['episodes'], progress['values']
+        env: BridgeEnv = gym.make('Bridge-v0')
         env.setup(player_deal, opponent)
-        values = {0: {'invalid_actions': [], 'rewards': []}, 1: {'invalid_actions': [], 'rewards': []}}
-        with open(f'results/{i}offence-{player.__class__.__name__}-{player.__class__.__name__}.csv', 'w') as offence:
-            with open(
-                f'results/{i}defence-{player.__class__.__name__}-{player.__class__.__name__}.csv', 'w'
-            ) as defence:
-                for episode, invalid_actions, reward, cards_played in learn(env, player, opponent, 200):
-                    game_file = offence if episode % 2 else defence
-
-                    print(episode // 2, invalid_actions, reward, "".join(cards_played))
-                    values[episode % 2]['invalid_actions'].append(invalid_actions)
-                    values[episode % 2]['rewards'].append(reward)
-                    csv.writer(game_file).writerow((episode // 2, invalid_actions, reward, "".join(cards_played)))
+        name = f'{player.__class__.__name__}-{player.__class__.__name__}'
+        paths = [f'results/episodes/{i}{side}-{name}.bin' for side in ('defence', 'offence')]
+        if progress['sizes']:
+            for path, size in zip(paths, progress['sizes']):
+                os.truncate(path, size)
+        writers = [
+            ResultWriter(
+                path,
+                csv_path=f'results/{i}{side}-{name}.csv' if args.csv else None,
+                append=progress['sizes'] is not None
+            ) for path, side in zip(paths, ('defence', 'offence'))
+        ]
+        if args.actors:
+            episodes = learn_parallel(
+                player,
+                args.actors,
+                run_episodes,
+                replay,
+                deals=args.deals,
+                metrics=metrics,
+                first_episode=first_episode
+            )
+        else:
+            deals = islice(deal_source(args.deals), first_episode, None) if args.deals else None
+            episodes = learn(
+                env,
+                player,
+                opponent,
+                run_episodes,
+                replay,
+                deals=deals,
+                metrics=metrics,
+                first_episode=first_episode,
+                progress=progress
+            )
+        for played, (episode, invalid_actions, reward, cards_played) in enumerate(episodes, first_episode + 1):
+            with metrics.timer('write'):
+                print(episode // 2, invalid_actions, reward, "".join(cards_played))
+                values[episode % 2]['invalid_actions'].append(invalid_actions)
+                values[episode % 2]['rewards'].append(reward)
+                writers[episode % 2].write(episode // 2, invalid_actions, reward, cards_played)
+            if args.checkpoint_every and played % args.checkpoint_every == 0 and played < run_episodes:
+                with metrics.timer('checkpoint'):
+                    progress.update(episodes=played, sizes=[writer.sync() for writer in writers])
+                    checkpointer.save(player, replay, **progress)
+        with metrics.timer('write'):
+            for writer in writers:
+                writer.close()
 
         print("################SUMMARY############")
-        print("OFFENCE")
-        print(
-            f"invalid min:{min(values[0]['invalid_actions'])} "
-            f"max:{max(values[0]['invalid_actions'])} "
-            f"mean:{statistics.mean(values[0]['invalid_actions'])} "
-        )
-        print(
-            f"rewards min:{min(values[0]['rewards'])} "
-            f"max:{max(values[0]['rewards'])} "
-            f"mean:{statistics.mean(values[0]['rewards'])} "
-        )
-        print("DEFENCE")
-        print(
-            f"invalid min:{min(values[1]['invalid_actions'])} "
-            f"max:{max(values[1]['invalid_actions'])} "
-            f"mean:{statistics.mean(values[1]['invalid_actions'])} "
-        )
-        print(
-            f"rewards min:{min(values[1]['rewards'])} "
-            f"max:{max(values[1]['rewards'])} "
-            f"mean:{statistics.mean(values[1]['rewards'])} "
-        )
+        _summary("OFFENCE", values[0])
+        _summary("DEFENCE", values[1])
 
         env.close()
-        player.save()
-        print("Saved")
\ No newline at end of file
+        progress = new_run(i + 1)
+        with metrics.timer('checkpoint'):
+            checkpointer.save(player, replay, **progress)
+        print("Checkpointed")
+        if args.metrics:
+            metrics.export()
+
+    checkpointer.wait()
+    player.save()
+    print("Saved")
@@ -1,14 +1,25 @@
-import csv
+import argparse
+import multiprocessing
 import random
 import statistics
-from copy import deepcopy
+import sys
+from functools import partial
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Tuple
 
 import gym
+import numpy
 from gym.envs.registration import register
 
-from src.agents import Agent, DeepQLearnAgent
+from src.agents import Agent, DeepQLearnAgent, EndgameAgent, NumpyQAgent
+from src.architectures import ARCHITECTURES
 from src.data import opponent_deal, player_deal, validation_deal_other_trump, validation_deal_same_trump
+from src.deals import DealSource
+from src.endgame import EndgameTable
 from src.env import BridgeEnv
+from src.mcts import mcts_agent
+from src.results import ResultWriter
+from src.tables import TABLES_FILE, TrickTables
 
 register(id='Bridge-v0', entry_point='src.env:BridgeEnv', nondeterministic=False)
 
@@ -21,51 +32,165 @@ def get_next_deal():
         yield validation_deal_other_trump
 
 
-def play(env: BridgeEnv, player: Agent, opponent: Agent, episodes=10000):
-    deal_iterator = get_next_deal()
+def play(
+    env: BridgeEnv,
+    player: Agent,
+    opponent: Agent,
+    episodes=10000,
+    deals: DealSource = None,
+    tables: TrickTables = None
+):
+    # Also yields how many tricks North-South took below double-dummy optimum, None for deals not in `tables`.
+    deal_iterator = deals if deals is not None else get_next_deal()
     for i in range(episodes):
         done = False
-        first_move = env.setup(next(deal_iterator), opponent)
+        deal = next(deal_iterator)
+        optimal = tables.ns_tricks(deal) if tables is not None else None
+        first_move = env.setup(deal, opponent)
         trick_won = 0
         invalid_actions = 0
         cards_played = [first_move] if first_move else []
         while not done:
-            state = deepcopy(env.state)
+            state = env.state
             action = player.move(state)
-            if action not in state.valid_moves:
+            if not env.game.is_legal(action):
                 invalid_actions += 1
-                action = random.sample(state.valid_moves, 1)[0]
+                action = random.choice(env.game.legal_moves())
             _, reward, done, info = env.step(action)
             cards_played.append(info)
             if reward == 1:
                 trick_won += 1
             if done:
-                yield i, invalid_actions, trick_won, cards_played
+                below_optimal = optimal - env.state.tricks_ns if optimal is not None else None
+                yield i, invalid_actions, trick_won, cards_played, below_optimal
                 break
 
 
 DEALS = ['offence', 'defence', 'same_trump', 'other_trump']
 
+_worker = None
+
+
+def _init_worker(
+    agent: Callable[[], Agent], opponent: Optional[Callable[[], Agent]], tables_path: Optional[str], tensorflow: bool
+) -> None:
+    global _worker
+    if tensorflow:
+        from src.network import limit_threads
+
+        limit_threads()
+    # without an opponent of its own the player is loaded once and plays both sides
+    player = agent()
+    tables = TrickTables(tables_path) if tables_path else None
+    _worker = (BridgeEnv(), player, opponent() if opponent else player, tables)
+
+
+def _play_shard(shard: Tuple[int, int, int]) -> List[Tuple]:
+    start, episodes, seed = shard
+    env, player, opponent, tables = _worker
+    random.seed(seed)
+    numpy.random.seed(seed)
+    deals = islice(get_next_deal(), start % len(DEALS), None)
+    return [(start + episode, *result) for episode, *result in play(env, player, opponent, episodes, deals, tables)]
+
+
+def _endgame_agent(agent: Callable[[], Agent], path: str) -> Agent:
+    return EndgameAgent(agent(), EndgameTable(path))
+
+
+def agent_factories(args: argparse.Namespace) -> Tuple[Callable[[], Agent], Optional[Callable[[], Agent]]]:
+    # Player and opponent of the command line, as factories for the workers; no opponent: the player plays both.
+    opponent = None
+    if args.mcts:
+        player = partial(mcts_agent, args.mcts, args.architecture, args.numpy)
+    elif args.numpy:
+        player = partial(NumpyQAgent, args.numpy)
+    else:
+        player = partial(DeepQLearnAgent, architecture=args.architecture)
+        if args.opponent_architecture != args.architecture:
+            opponent = partial(DeepQLearnAgent, architecture=args.opponent_architecture)
+    if args.endgame:
+        player = partial(_endgame_agent, player, args.endgame)
+        opponent = partial(_endgame_agent, opponent, args.endgame) if opponent else None
+    return player, opponent
+
+
+def play_parallel(
+    episodes: int,
+    processes: int = None,
+    shard_size: int = 100,
+    seed: int = 0,
+    agent: Callable[[], Agent] = DeepQLearnAgent,
+    tables_path: str = None,
+    tensorflow: bool = True,
+    opponent: Callable[[], Agent] = None
+) -> Iterator[Tuple]:
+    # `play` sharded over a process pool. Shard `i` is seeded with `seed + i`, so results only depend on the seed
+    # and shard size, not on the number of processes. Yields like `play`, in episode order.
+    # Without `tensorflow` the workers never import it, for agents like `NumpyQAgent`. Without `opponent` the
+    # agent plays both sides.
+    shards = [
+        (start, min(shard_size, episodes - start), seed + index)
+        for index, start in enumerate(range(0, episodes, shard_size))
+    ]
+    initargs = (agent, opponent, tables_path, tensorflow)
+    with multiprocessing.get_context('spawn').Pool(processes, _init_worker, initargs) as pool:
+        for rows in pool.imap(_play_shard, shards):
+            yield from rows
+
+
 if __name__ == '__main__':
-    env: BridgeEnv = gym.make('Bridge-v0')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, default=0, help='worker processes, 0 plays in this process')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first shard')
+    parser.add_argument('--architecture', choices=ARCHITECTURES, help='network of the player, the original by default')
+    parser.add_argument('--opponent-architecture', choices=ARCHITECTURES, help='network of the opponent')
+    parser.add_argument('--numpy', metavar='FILE', help='play both sides with a network exported by src.inference')
+    parser.add_argument('--mcts', type=int, metavar='SIMULATIONS', help='search every move with the network')
+    parser.add_argument('--endgame', metavar='FILE', help='play the endings an endgame table covers from it')
+    parser.add_argument('--no-csv', dest='csv', action='store_false', help='keep only the binary episode results')
+    args = parser.parse_args()
+    if args.opponent_architecture and (args.mcts or args.numpy):
+        parser.error('--mcts and --numpy play both sides with the same agent, drop --opponent-architecture')
 
-    player = DeepQLearnAgent()
-    opponent = DeepQLearnAgent()
-    env.setup(player_deal, opponent)
+    env: BridgeEnv = gym.make('Bridge-v0')
     deals_count = len(DEALS)
-    values = {i: {'invalid_actions': [], 'tricks_won': []} for i in range(deals_count)}
-    files = dict(zip(DEALS, [None] * deals_count))
-    files = {i: open(f'results/validate/{deal}.csv', 'w') for i, deal in enumerate(DEALS)}
-
-    for episode, invalid_actions, trick_won, cards_played in play(env, player, opponent, deals_count * 100):
-        game_file = files[episode % deals_count]
+    values = {i: {'invalid_actions': [], 'tricks_won': [], 'below_optimal': []} for i in range(deals_count)}
+    writers = {
+        i: ResultWriter(
+            f'results/episodes/validate/{deal}.bin',
+            numpy.int32,
+            csv_path=f'results/validate/{deal}.csv' if args.csv else None
+        )
+        for i, deal in enumerate(DEALS)
+    }
+    # optimal results come from tables filled beforehand with `python -m src.tables`
+    tables = TrickTables()
 
+    player, opponent = agent_factories(args)
+    if args.processes:
+        results = play_parallel(
+            deals_count * 100,
+            args.processes,
+            seed=args.seed,
+            agent=player,
+            tables_path=TABLES_FILE,
+            tensorflow=not args.numpy,
+            opponent=opponent
+        )
+    else:
+        player = player()
+        opponent = opponent() if opponent else player
+        results = play(env, player, opponent, deals_count * 100, tables=tables)
+    for episode, invalid_actions, trick_won, cards_played, below_optimal in results:
         values[episode % deals_count]['invalid_actions'].append(invalid_actions)
         values[episode % deals_count]['tricks_won'].append(trick_won)
-        csv.writer(game_file).writerow((episode // deals_count, invalid_actions, trick_won, "".join(cards_played)))
+        if below_optimal is not None:
+            values[episode % deals_count]['below_optimal'].append(below_optimal)
+        writers[episode % deals_count].write(episode // deals_count, invalid_actions, trick_won, cards_played)
 
-    for fd in files.values():
-        fd.close()
+    for writer in writers.values():
+        writer.close()
 
     print("################SUMMARY############")
     for i, value in values.items():
@@ -80,4 +205,12 @@ if __name__ == '__main__':
             f"max:{max(value['tricks_won'])} "
             f"mean:{statistics.mean(value['tricks_won'])} "
         )
+        if value['below_optimal']:
+            print(
+                f"below_optimal min:{min(value['below_optimal'])} "
+                f"max:{max(value['below_optimal'])} "
+                f"mean:{statistics.mean(value['below_optimal'])} "
+            )
+        else:
+            print(f"below_optimal: deal not in {tables.path}", file=sys.stderr)
     env.close()
@@ -0,0 +1,172 @@
+from typing import Callable, Iterator, Optional, Tuple
+
+import gym
+import numpy
+
+from src.engine import CARD_SUIT, DECK_SIZE, EAST, NO_TRUMP, PLAYER_ID, TRICK_RANKS, TRUMP_ID, WEST
+from src.env import Rewards
+from src.models import Deal
+from src.encoding import STATE_SIZE
+
+Observations = numpy.ndarray  # (N, STATE_SIZE) float32, `InputPattern` layout
+Actions = numpy.ndarray  # (N,) card ids
+LegalMasks = numpy.ndarray  # (N, DECK_SIZE) bool
+# Batched opponent: (observations, legal masks) of the games waiting for it -> one card per game
+BatchPolicy = Callable[[Observations, LegalMasks], Actions]
+
+SUITS = numpy.asarray(CARD_SUIT, dtype=numpy.int8)
+RANKS = numpy.asarray(TRICK_RANKS, dtype=numpy.int8)
+NO_CARD = -1
+
+
+def deal_to_owners(deal: Deal) -> numpy.ndarray:
+    owners = numpy.full(DECK_SIZE, NO_CARD, dtype=numpy.int8)
+    for player, hand in deal.hands.items():
+        owners[list(hand)] = PLAYER_ID[player]
+    return owners
+
+
+def random_policy(seed: Optional[int] = None) -> BatchPolicy:
+    rng = numpy.random.default_rng(seed)
+
+    def policy(observations: Observations, legal: LegalMasks) -> Actions:
+        return numpy.argmax(rng.random(legal.shape) * legal, axis=1)
+
+    return policy
+
+
+class VectorBridgeEnv:
+    def __init__(self, num_envs: int, deals: Iterator[Deal], opponent: BatchPolicy = None, seed: Optional[int] = None):
+        self.num_envs = num_envs
+        self.action_space = gym.spaces.MultiDiscrete([DECK_SIZE] * num_envs)
+        self.observation_space = gym.spaces.Box(-1, 4, (num_envs, STATE_SIZE), dtype=numpy.float32)
+        self.deals = deals
+        self.opponent = opponent or random_policy(seed)
+        self._fallback = random_policy(seed)
+
+        self.owners = numpy.full((num_envs, DECK_SIZE), NO_CARD, dtype=numpy.int8)
+        self.trick = numpy.full((num_envs, 4), NO_CARD, dtype=numpy.int8)
+        self.trick_size = numpy.zeros(num_envs, dtype=numpy.int8)
+        self.leader = numpy.zeros(num_envs, dtype=numpy.int8)
+        self.player = numpy.zeros(num_envs, dtype=numpy.int8)
+        self.trump = numpy.zeros(num_envs, dtype=numpy.int8)
+        self.tricks_ns = numpy.zeros(num_envs, dtype=numpy.int8)
+        self.tricks_ew = numpy.zeros(num_envs, dtype=numpy.int8)
+        # tricks of the last finished game in every slot, since finished games are reset immediately
+        self.final_tricks_ns = numpy.zeros(num_envs, dtype=numpy.int8)
+        self.final_tricks_ew = numpy.zeros(num_envs, dtype=numpy.int8)
+
+    def reset(self) -> Tuple[Observations, LegalMasks]:
+        self._reset_games(numpy.arange(self.num_envs))
+        return self.observations(), self.legal_masks()
+
+    def step(self, actions: Actions) -> Tuple[Observations, numpy.ndarray, numpy.ndarray, LegalMasks]:
+        actions = numpy.asarray(actions, dtype=numpy.int64)
+        assert actions.shape == (self.num_envs, )
+        rewards = numpy.full(self.num_envs, Rewards.INVALID_MOVE.value, dtype=numpy.float32)
+        dones = numpy.zeros(self.num_envs, dtype=bool)
+
+        games = numpy.arange(self.num_envs)
+        in_range = (actions >= 0) & (actions < DECK_SIZE)
+        valid = numpy.zeros(self.num_envs, dtype=bool)
+        valid[in_range] = self.legal_masks()[games[in_range], actions[in_range]]
+        games = games[valid]
+        rewards[games] = self._play(games, actions[games])
+
+        opponent_rewards = self._opponents_move(games)
+        lost_or_won = opponent_rewards != Rewards.VALID_MOVE.value
+        rewards[games[lost_or_won]] = -opponent_rewards[lost_or_won]
+
+        finished = games[self.tricks_ns[games] + self.tricks_ew[games] == DECK_SIZE // 4]
+        dones[finished] = True
+        ns, ew = self.tricks_ns[finished], self.tricks_ew[finished]
+        rewards[finished[ns > ew]] = Rewards.MATCH_WON.value
+        rewards[finished[ns < ew]] = Rewards.MATCH_LOST.value
+        self.final_tricks_ns[finished], self.final_tricks_ew[finished] = ns, ew
+        self._reset_games(finished)
+
+        return self.observations(), rewards, dones, self.legal_masks()
+
+    def legal_masks(self, games: numpy.ndarray = None) -> LegalMasks:
+        games = numpy.arange(self.num_envs) if games is None else games
+        in_hand = self.owners[games] == self.player[games, None]
+        lead = numpy.where(self.trick_size[games] > 0, SUITS[self.trick[games, 0]], -1)
+        follow = in_hand & (SUITS[None, :] == lead[:, None])
+        return numpy.where(follow.any(axis=1)[:, None], follow, in_hand)
+
+    def observations(self, games: numpy.ndarray = None, out: Observations = None) -> Observations:
+        games = numpy.arange(self.num_envs) if games is None else games
+        owners = self.owners[games]
+        out = numpy.empty((len(games), STATE_SIZE), dtype=numpy.float32) if out is None else out
+        # card positions relative to the player to move: 1 own hand, 2 left, 3 partner, 4 right, 0 trick, -1 gone
+        cards = out[:, :DECK_SIZE]
+        numpy.subtract(owners, self.player[games, None], out=cards)
+        numpy.mod(cards, 4, out=cards)
+        cards += 1
+        cards[owners == NO_CARD] = -1
+        trick = self.trick[games]
+        rows, slots = numpy.nonzero(trick != NO_CARD)
+        cards[rows, trick[rows, slots]] = 0
+        out[:, DECK_SIZE] = numpy.where(self.trump[games] == NO_TRUMP, -1, self.trump[games])
+        out[:, DECK_SIZE + 1] = numpy.where(self.trick_size[games] > 0, SUITS[trick[:, 0]], -1)
+        return out
+
+    def _reset_games(self, games: numpy.ndarray) -> None:
+        for game in games:
+            deal = next(self.deals)
+            self.owners[game] = deal_to_owners(deal)
+            self.player[game] = PLAYER_ID[deal.leader]
+            self.trump[game] = TRUMP_ID[deal.trump]
+        self.trick[games] = NO_CARD
+        self.trick_size[games] = 0
+        self.tricks_ns[games] = 0
+        self.tricks_ew[games] = 0
+        self._opponents_move(games)
+
+    def _opponents_move(self, games: numpy.ndarray) -> numpy.ndarray:
+        # Plays opponent cards until every game in `games` waits for the player again (or is finished).
+        # Returns the reward of the last opponent card that closed a trick, VALID_MOVE where none did.
+        rewards = numpy.full(len(games), Rewards.VALID_MOVE.value, dtype=numpy.float32)
+        while True:
+            done = self.tricks_ns[games] + self.tricks_ew[games] == DECK_SIZE // 4
+            waiting = numpy.nonzero(((self.player[games] == WEST) | (self.player[games] == EAST)) & ~done)[0]
+            if not len(waiting):
+                return rewards
+            selected = games[waiting]
+            legal = self.legal_masks(selected)
+            actions = numpy.asarray(self.opponent(self.observations(selected), legal), dtype=numpy.int64)
+            in_range = (actions >= 0) & (actions < DECK_SIZE)
+            valid = in_range & legal[numpy.arange(len(selected)), numpy.where(in_range, actions, 0)]
+            if not valid.all():
+                # fallback to random card if opponent move is invalid
+                actions[~valid] = self._fallback(None, legal[~valid])
+            played = self._play(selected, actions)
+            closed = played != Rewards.VALID_MOVE.value
+            rewards[waiting[closed]] = played[closed]
+
+    def _play(self, games: numpy.ndarray, cards: numpy.ndarray) -> numpy.ndarray:
+        movers = self.player[games].copy()
+        self.owners[games, cards] = NO_CARD
+        leading = self.trick_size[games] == 0
+        self.leader[games[leading]] = movers[leading]
+        self.trick[games, self.trick_size[games]] = cards
+        self.trick_size[games] += 1
+        self.player[games] = (movers + 1) % 4
+
+        rewards = numpy.full(len(games), Rewards.VALID_MOVE.value, dtype=numpy.float32)
+        full = self.trick_size[games] == 4
+        if full.any():
+            done_games = games[full]
+            trick = self.trick[done_games].astype(numpy.int64)
+            tables = SUITS[trick[:, 0]].astype(numpy.int64) * 5 + self.trump[done_games]
+            best = numpy.argmax(RANKS[tables[:, None], trick], axis=1)
+            winners = (self.leader[done_games] + best) % 4
+            ns_won = winners % 2 == 1
+            self.tricks_ns[done_games] += ns_won
+            self.tricks_ew[done_games] += ~ns_won
+            self.player[done_games] = winners
+            self.trick[done_games] = NO_CARD
+            self.trick_size[done_games] = 0
+            pair_won = (winners - movers[full]) % 2 == 0
+            rewards[full] = numpy.where(pair_won, Rewards.TRICK_WON.value, Rewards.TRICK_LOST.value)
+        return rewards
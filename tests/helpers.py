@@ -0,0 +1,4 @@
+class LowestCardAgent:
+    # deterministic opponent for comparing play loops: always the lowest legal card
+    def move(self, state):
+        return min(state.valid_moves)
@@ -0,0 +1,15 @@
+from src.benchmark import compare, run
+
+
+def test_compare_reports_slowdowns_beyond_threshold():
+    baseline = {'fast': {'rate': 100.0}, 'slow': {'rate': 100.0}, 'gone': {'rate': 1.0}}
+    results = {'fast': {'rate': 85.0}, 'slow': {'rate': 70.0}, 'new': {'rate': 5.0}}
+    regressions = compare(results, baseline, 0.2)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('slow:')
+
+
+def test_run_measures_selected_groups():
+    results = run(['models'], min_time=0.001)
+    assert set(results) == {'models.valid_moves', 'models.trick_winner', 'models.card_color'}
+    assert all(result['rate'] > 0 for result in results.values())
@@ -0,0 +1,87 @@
+import random
+from functools import partial
+
+import numpy
+import pytest
+
+from src import checkpoint
+from src.agents import DeepQLearnAgent, QLearnAgent, RandomAgent
+from src.checkpoint import Checkpointer, restore
+from src.env import BridgeEnv
+from src.replay import ReplayBuffer
+from src.train import learn
+
+
+def _results(episodes):
+    return [(episode, invalid_actions, reward, ''.join(cards)) for episode, invalid_actions, reward, cards in episodes]
+
+
+def _replay(agent):
+    # the Q-table learns from every transition, the network from the replay buffer
+    return ReplayBuffer(1000, prioritized=True, seed=0) if isinstance(agent, DeepQLearnAgent) else None
+
+
+@pytest.mark.parametrize(
+    'agent', [
+        partial(QLearnAgent, 0.2, 0.4, 0.1),
+        partial(DeepQLearnAgent, 0.2, 0.4, 0.1, target_sync=3, architecture='small'),
+    ]
+)
+def test_resumed_training_continues_exactly(tmp_path, agent):
+    # a minibatch every 3 steps, which a resume restarting the step count would shift
+    settings = {'batch_size': 8, 'train_every': 3}
+    random.seed(0)
+    numpy.random.seed(0)
+    player = agent()
+    initial = player.get_state()
+    replay = _replay(player)
+    expected = _results(learn(BridgeEnv(), player, RandomAgent(), 4, replay, **settings))[2:]
+
+    random.seed(0)
+    numpy.random.seed(0)
+    path = str(tmp_path / 'train.npz')
+    # the same starting weights, which a new network draws at random
+    interrupted = agent()
+    interrupted.set_state(initial)
+    progress = {'run': 3, 'episodes': 2}
+    interrupted_replay = _replay(interrupted)
+    list(learn(BridgeEnv(), interrupted, RandomAgent(), 2, interrupted_replay, progress=progress, **settings))
+    checkpointer = Checkpointer(path)
+    checkpointer.save(interrupted, interrupted_replay, **progress)
+    checkpointer.wait()
+
+    resumed = agent()
+    resumed_replay = _replay(resumed)
+    progress = restore(path, resumed, resumed_replay)
+    assert progress['episodes'] == 2
+    results = _results(
+        learn(BridgeEnv(), resumed, RandomAgent(), 4, resumed_replay, first_episode=2, progress=progress, **settings)
+    )
+
+    assert [episode for episode, _, _, _ in results] == [2, 3]
+    assert results == expected
+    if replay is not None:
+        assert len(resumed_replay) == len(replay)
+    for name, array in player.get_state().items():
+        numpy.testing.assert_array_equal(resumed.get_state()[name], array)
+
+
+def test_write_errors_surface_on_wait(tmp_path):
+    blocked = tmp_path / 'file'
+    blocked.write_text('')
+    checkpointer = Checkpointer(str(blocked / 'train.npz'))
+    checkpointer.save(QLearnAgent())
+    with pytest.raises(OSError):
+        checkpointer.wait()
+    checkpointer.wait()
+
+
+def test_any_write_error_surfaces_on_wait(tmp_path, monkeypatch):
+    def write(path, arrays):
+        raise ValueError('cannot serialize')
+
+    monkeypatch.setattr(checkpoint, 'write', write)
+    checkpointer = Checkpointer(str(tmp_path / 'train.npz'))
+    checkpointer.save(QLearnAgent())
+    with pytest.raises(ValueError):
+        checkpointer.wait()
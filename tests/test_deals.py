@@ -0,0 +1,67 @@
+from itertools import islice
+
+import numpy
+
+from src.data import player_deal, validation_deal_other_trump
+from src.deals import DealCorpus, format_pbn, parse_pbn, random_deals, write_corpus
+from src.models import Contract, Player, Trump
+
+PBN = '''
+% generated
+[Event "club"]
+[Board "1"]
+[Dealer "N"]
+[Deal "W:42.AK875.Q32.K93 KJ93.J4.A98.Q764 T6.QT3.KJT654.T2 AQ875.962.7.AJ85"]
+[Declarer "S"]
+[Contract "4SX"]
+
+[Board "2"]
+[Deal "N:KJ93.J4.A98.Q764 T6.QT3.KJT654.T2 AQ875.962.7.AJ85 42.AK875.Q32.K93"]
+[Declarer ""]
+[Contract "Pass"]
+
+[Board "3"]
+[Deal "N:KJ93.J4.A98.Q764 T6.QT3.KJT654.T2 AQ875.962.7.AJ85 42.AK875.Q32.K93"]
+'''
+
+
+def test_parse_pbn():
+    deals = list(parse_pbn(PBN.splitlines()))
+    assert deals == [player_deal]
+
+    deals = list(parse_pbn(PBN.splitlines(), Player.EAST, Contract(3, Trump.NO_TRUMP)))
+    assert len(deals) == 2
+    assert deals[1].declarer == Player.EAST and deals[1].leader == Player.SOUTH
+    assert deals[1].hands == player_deal.hands
+
+
+def test_format_pbn_round_trip():
+    for deal in [validation_deal_other_trump, *islice(random_deals(5), 20)]:
+        assert list(parse_pbn(format_pbn(deal).splitlines())) == [deal]
+
+
+def test_random_deals_are_seeded_and_complete():
+    first, second = list(islice(random_deals(1), 3)), list(islice(random_deals(1), 3))
+    assert first == second
+    for deal in first:
+        hands = deal.hands.values()
+        assert all(len(hand) == 13 for hand in hands)
+        assert set().union(*hands) == set(range(52))
+        assert deal.leader == deal.declarer.next
+
+
+def test_corpus_round_trip(tmp_path):
+    path = str(tmp_path / 'deals.bin')
+    deals = [player_deal, *islice(random_deals(2), 99)]
+    assert write_corpus(path, deals, chunk=32) == 100
+
+    corpus = DealCorpus(path)
+    assert len(corpus) == 100
+    assert corpus.records.itemsize == 16
+    assert all(corpus[index] == deal for index, deal in enumerate(deals))
+    owners = corpus.owners(numpy.arange(2))
+    assert owners.shape == (2, 52)
+    assert set(numpy.nonzero(owners[0] == 1)[0]) == player_deal.hand_n
+
+    streamed = list(islice(corpus.stream(seed=0), 100))
+    assert sorted(map(format_pbn, streamed)) == sorted(map(format_pbn, deals))
@@ -0,0 +1,51 @@
+import random
+
+import numpy
+import pytest
+
+from src.data import opponent_deal, player_deal, validation_deal_other_trump
+from src.encoding import PLANES, STATE_SIZE, InputPattern, encode_game
+from src.env import BridgeEnv
+from tests.helpers import LowestCardAgent
+
+
+def input_pattern(state):
+    return InputPattern(
+        trump=state.trump.id,
+        hand1=state.player_hand,
+        hand2=state.left_opponent_hand,
+        hand3=state.partner_hand,
+        hand4=state.right_opponent_hand,
+        trick=state.trick.cards,
+        trick_suite=state.trick.color.id if state.trick.color else -1
+    ).get_array()[0]
+
+
+@pytest.mark.parametrize('deal', [player_deal, opponent_deal, validation_deal_other_trump])
+def test_observations_follow_the_game(deal):
+    random.seed(3)
+    env = BridgeEnv()
+    env.setup(deal, LowestCardAgent())
+    planes_env = BridgeEnv(planes=True)
+    planes_env.setup(deal, LowestCardAgent())
+    snapshot, expected = None, None
+    done = False
+    while not done:
+        action = random.choice(env.game.legal_moves())
+        observation, _, done, _ = env.step(action)
+        planes, _, _, _ = planes_env.step(action)
+        if done:
+            break
+        numpy.testing.assert_array_equal(observation, input_pattern(env.state.to_state()))
+        numpy.testing.assert_array_equal(observation, encode_game(env.game))
+        # every card in one plane, at the index of its `InputPattern` value
+        cards = planes[:-2].reshape(PLANES, -1)
+        positions = numpy.where(cards.any(axis=0), cards.argmax(axis=0), -1)
+        numpy.testing.assert_array_equal(positions, observation[:-2])
+        numpy.testing.assert_array_equal(planes[-2:], observation[-2:])
+        if snapshot is None and len(env.game.moves) > 10:
+            snapshot, expected = env.snapshot(), observation.copy()
+
+    env.restore(snapshot)
+    numpy.testing.assert_array_equal(env._state_to_observation(), expected)
+    assert env.observation_space.contains(expected) and expected.shape == (STATE_SIZE, )
@@ -0,0 +1,71 @@
+import random
+from itertools import islice
+
+import pytest
+
+from src.agents import EndgameAgent, RandomAgent
+from src.deals import random_deals
+from src.endgame import KINDS, EndgameTable, Level, generate, position_of, solve_position, word_rank, words, write
+from src.engine import NO_TRUMP, BitState
+from src.solver import DoubleDummySolver
+
+
+@pytest.fixture(scope='module')
+def table(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('endgame') / 'endgame.bin')
+    write(path, 1, generate(1))
+    return EndgameTable(path)
+
+
+def _endings(cards: int, count: int, seed: int = 0):
+    # positions with `cards` cards left in the hand of the player to move, mid-trick ones included
+    rng = random.Random(seed)
+    for deal in islice(random_deals(seed), count):
+        game = BitState.from_deal(deal)
+        while bin(game.hands[game.player]).count('1') > cards:
+            game.play(rng.choice(game.legal_moves()))
+        yield game
+
+
+def test_positions_are_numbered_in_order():
+    for cards in (1, 2):
+        assert [word_rank(word, cards) for word in words(cards)] == list(range(Level(cards).words))
+    level = Level(2)
+    for index, position in enumerate(islice(level.positions(), 0, None, 997)):
+        assert level.index(position) == index * 997
+    assert level.size == 415800
+
+
+def test_lookups_match_the_solver(table):
+    solver = DoubleDummySolver()
+    for game in _endings(2, 200):
+        # the table holds 1-card endings, which a 2-card one reaches once its trick is under way
+        mid_trick = bool(game.trick)
+        assert table.covers(game) == mid_trick
+        if mid_trick:
+            assert table.move_values(game) == solver.move_values(game)
+            assert table.tricks(game) == solver.tricks(game)
+        else:
+            assert table.tricks(game) is None and table.best_move(game) is None
+
+
+def test_larger_endings_solve_from_smaller_ones(table):
+    tables = generate(1)
+    solver = DoubleDummySolver()
+    for game in _endings(2, 200, seed=1):
+        if game.trick:
+            continue
+        kind = KINDS[game.trump != NO_TRUMP]
+        position = position_of(game.hands, game.player, game.trump)
+        assert solve_position(position, 2, kind == 'trump', tables[(1, kind)], Level(1)) == solver.tricks(game)
+
+
+def test_solver_and_agents_use_the_table(table):
+    plain, backed = DoubleDummySolver(), DoubleDummySolver(endgame=table)
+    for game in _endings(4, 20, seed=2):
+        assert backed.move_values(game) == plain.move_values(game)
+
+    agent = EndgameAgent(RandomAgent(), table)
+    for game in _endings(1, 50, seed=3):
+        values = plain.move_values(game)
+        assert values[agent.move(game.view())] == max(values.values())
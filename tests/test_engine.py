@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from src.data import opponent_deal, player_deal, validation_deal_other_trump, validation_deal_same_trump
+from src.engine import (
+    EAST, FULL_DECK, NO_TRUMP, NORTH, SOUTH, SUIT_MASKS, WEST, BitState, cards_of, hand_to_mask, mask_to_array,
+    mask_to_hand, trick_winner
+)
+from src.models import Card, GameState, Player, Trick, Trump
+
+
+def test_hand_mask_round_trip():
+    hand = {Card(0), Card(12), Card(13), Card(51)}
+    mask = hand_to_mask(hand)
+    assert mask == 1 | 1 << 12 | 1 << 13 | 1 << 51
+    assert mask_to_hand(mask) == hand
+    assert list(cards_of(mask)) == [0, 12, 13, 51]
+    assert mask_to_array(mask).nonzero()[0].tolist() == [0, 12, 13, 51]
+
+
+def test_suit_masks_cover_deck():
+    assert SUIT_MASKS[0] | SUIT_MASKS[1] | SUIT_MASKS[2] | SUIT_MASKS[3] == FULL_DECK
+    assert list(cards_of(SUIT_MASKS[1])) == list(range(13, 26))
+
+
+@pytest.mark.parametrize(
+    'cards,trump,winner', (
+        ([0, 1, 2, 3], NO_TRUMP, NORTH),
+        ([0, 1, 2, 3], 0, NORTH),
+        ([0, 13, 14, 15], 0, EAST),
+        ([0, 13, 15, 14], 1, WEST),
+        ([0, 3, 2, 1], 1, SOUTH),
+    )
+)
+def test_trick_winner(cards, trump, winner):
+    assert trick_winner(cards, EAST, trump) == winner
+
+
+@pytest.mark.parametrize('deal', (player_deal, opponent_deal, validation_deal_same_trump, validation_deal_other_trump))
+def test_random_games_match_object_model(deal):
+    rng = random.Random(7)
+    for _ in range(20):
+        game = BitState.from_deal(deal)
+        state = GameState.from_deal(deal)
+        while state.any_hand_not_empty:
+            view = game.view()
+            assert view.valid_moves == state.valid_moves
+            assert view.current_player == state.current_player
+            assert view.player_hand == state.player_hand
+
+            card = rng.choice(sorted(state.valid_moves))
+            state.trick.add_card(card, state.current_player)
+            state.player_hand.remove(card)
+            winner = game.play(card)
+            if state.trick.full:
+                expected = state.trick.winner
+                assert winner >= 0 and game.view().current_player == expected
+                if expected in (Player.NORTH, Player.SOUTH):
+                    state.tricks_ns += 1
+                else:
+                    state.tricks_ew += 1
+                state.trick.clear()
+                state.current_player = expected
+            else:
+                assert winner == -1
+                state.current_player = state.current_player.next
+        assert game.done
+        assert (game.tricks_ns, game.tricks_ew) == (state.tricks_ns, state.tricks_ew)
+
+
+def test_view_matches_state():
+    state = GameState.from_deal(player_deal)
+    state.trick = Trick(Trump.SPADES, [Card(3)], Player.SOUTH)
+    state.hands[Player.SOUTH].discard(Card(3))
+    view = BitState.from_state(state).view()
+    assert view.to_state() == state
+    assert str(view) == str(BitState.from_state(view).view())
+
+
+def fields(game: BitState):
+    return (
+        list(game.hands), game.player, list(game.trick), game.leader, game.tricks_ns, game.tricks_ew,
+        list(game.moves), list(game.closed)
+    )
+
+
+@pytest.mark.parametrize('deal', (player_deal, validation_deal_other_trump))
+def test_unplay_restores_every_position(deal):
+    rng = random.Random(3)
+    game = BitState.from_deal(deal)
+    positions = []
+    while not game.done:
+        positions.append(fields(game))
+        game.play(rng.choice(game.legal_moves()))
+    assert len(game.closed) == 13 and len(game.moves) == 52
+
+    middle = game.copy()
+    middle.restore(30)
+    assert fields(middle) == positions[30]
+    for position in reversed(positions):
+        game.unplay()
+        assert fields(game) == position
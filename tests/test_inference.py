@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import numpy
+import pytest
+
+from src.agents import DeepQLearnAgent, NumpyQAgent
+from src.data import player_deal
+from src.env import BridgeEnv
+from src.inference import NumpyQNetwork, export
+from src.network import ARCHITECTURES, STATE_SIZE, model
+
+
+@pytest.mark.parametrize('name', ['legacy', 'embedding', 'dueling'])
+def test_numpy_forward_pass_matches_keras(tmp_path, name):
+    config = ARCHITECTURES[name]
+    network = model(config)
+    inputs = numpy.random.default_rng(0).integers(-1, 5, (16, STATE_SIZE)).astype(numpy.float32)
+    expected = network(inputs).numpy()
+
+    path = str(tmp_path / 'network.qnet')
+    export(network.get_weights(), config, path)
+    loaded = NumpyQNetwork.load(path)
+    numpy.testing.assert_allclose(loaded(inputs), expected, atol=1e-5)
+    # float32 weights are views of the mapping, shared by every process loading the file
+    assert all(not kernel.flags.owndata for kernel, _ in loaded.layers)
+
+    export(network.get_weights(), config, path, int8=True)
+    quantized = NumpyQNetwork.load(path)(inputs)
+    assert numpy.abs(quantized - expected).max() < 0.02 * numpy.abs(expected).max()
+
+
+def test_numpy_agent_plays_like_the_greedy_keras_agent(tmp_path):
+    keras_agent = DeepQLearnAgent(architecture='small')
+    path = str(tmp_path / 'small.qnet')
+    export(keras_agent.model.get_weights(), keras_agent.config, path)
+    numpy_agent = NumpyQAgent(path)
+
+    env = BridgeEnv()
+    env.setup(player_deal, numpy_agent)
+    states = []
+    done = False
+    while not done:
+        states.append(env.state.copy())
+        assert numpy_agent.move(env.state) == keras_agent.move(env.state)
+        _, _, done, _ = env.step(sorted(env.state.valid_moves)[0])
+    numpy.testing.assert_array_equal(numpy_agent.move_batch(states), keras_agent.move_batch(states))
+
+
+def test_agents_import_without_tensorflow():
+    code = 'import sys, src.agents, src.inference, src.validate; assert "tensorflow" not in sys.modules'
+    subprocess.run([sys.executable, '-c', code], check=True)
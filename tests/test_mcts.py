@@ -0,0 +1,79 @@
+import random
+
+import numpy
+
+from src.agents import RandomAgent
+from src.data import player_deal
+from src.deals import random_deals
+from src.engine import BitState
+from src.env import BridgeEnv
+from src.mcts import MCTSAgent
+from src.solver import DoubleDummySolver
+
+
+def uniform(inputs):
+    # no knowledge: even priors, and leaves valued by the tricks taken so far
+    return numpy.zeros((len(inputs), 52), dtype=numpy.float32)
+
+
+def _endgame(deal, cards: int, rng: random.Random) -> BitState:
+    game = BitState.from_deal(deal)
+    while sum(bin(hand).count('1') for hand in game.hands) + len(game.trick) > cards:
+        game.play(rng.choice(game.legal_moves()))
+    return game
+
+
+def test_search_finds_double_dummy_moves_in_endgames():
+    solver = DoubleDummySolver()
+    rng = random.Random(1)
+    deals = random_deals(1)
+    compared = 0
+    while compared < 10:
+        game = _endgame(next(deals), 8, rng)
+        values = solver.move_values(game)
+        if len(set(values.values())) < 2:
+            continue
+        card = MCTSAgent(uniform, simulations=300).move(game.view())
+        assert values[card] == max(values.values())
+        compared += 1
+
+
+def test_leaves_are_evaluated_in_batches():
+    sizes = []
+
+    def network(inputs):
+        sizes.append(len(inputs))
+        return uniform(inputs)
+
+    agent = MCTSAgent(network, simulations=64, batch_size=16, reuse=False)
+    agent.move(BitState.from_deal(player_deal).view())
+    # the root, then rounds of up to 16 leaves
+    assert sizes[0] == 1 and max(sizes) > 1 and all(size <= 16 for size in sizes)
+    assert sum(sizes) <= 65
+
+
+def test_tree_is_reused_for_the_next_move_of_a_deal():
+    reused = []
+
+    class Recording(MCTSAgent):
+        def _reused_root(self, game):
+            root = super()._reused_root(game)
+            reused.append(0 if root is None else int(root.visits.sum()))
+            return root
+
+    env = BridgeEnv()
+    env.setup(player_deal, RandomAgent())
+    agent = Recording(uniform, simulations=200)
+    done = False
+    while not done:
+        card = agent.move(env.state)
+        assert env.game.is_legal(card)
+        _, _, done, _ = env.step(card)
+    assert reused[0] == 0
+    # later moves start from the simulations already spent below them
+    assert sum(1 for visits in reused[1:] if visits) >= len(reused) // 2
+
+    # a new deal is searched from scratch
+    env.setup(player_deal, RandomAgent())
+    agent.move(env.state)
+    assert reused[-1] == 0
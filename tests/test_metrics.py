@@ -0,0 +1,27 @@
+from src.agents import QLearnAgent, RandomAgent
+from src.env import BridgeEnv
+from src.metrics import NULL_METRICS, Metrics
+from src.train import learn
+
+
+def test_disabled_metrics_record_nothing():
+    with NULL_METRICS.timer('move'):
+        NULL_METRICS.count('steps')
+    assert NULL_METRICS.phase_ns == {} and NULL_METRICS.counters == {}
+
+
+def test_learn_exports_phases_and_throughput(tmp_path):
+    path = str(tmp_path / 'train.prom')
+    metrics = Metrics(path, interval=0)
+    player = QLearnAgent(0.1, 0.9, 0.1)
+    for _ in learn(BridgeEnv(), player, RandomAgent(), 2, metrics=metrics):
+        pass
+    assert set(metrics.phase_ns) == {'copy', 'move', 'step', 'fit'}
+    assert metrics.counters['episodes'] == 2
+    assert metrics.counters['steps'] == metrics.phase_calls['move'] == metrics.counters['fits']
+    with open(path) as f:
+        text = f.read()
+    assert 'bridge_phase_seconds_total{phase="step"}' in text
+    assert 'bridge_episodes_per_second' in text
+    assert f'bridge_q_table_entries {len(player.q_table)}' in text
+    assert 'bridge_rss_bytes' in text
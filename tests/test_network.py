@@ -0,0 +1,42 @@
+import numpy
+import pytest
+
+from src.network import ARCHITECTURES, STATE_SIZE, Trainer, load_model, model, save_model
+
+
+@pytest.mark.parametrize('name', ['embedding', 'dueling'])
+def test_architecture_round_trips_through_metadata(tmp_path, name):
+    config = ARCHITECTURES[name]
+    network = model(config)
+    assert network.count_params() == config.parameters()
+    states = numpy.random.default_rng(0).integers(-1, 5, (4, STATE_SIZE)).astype(numpy.float32)
+    # a training step with a target network touches every custom layer
+    trainer = Trainer(network, 0.2, 0.4, target_sync=1)
+    trainer(states, [0, 1, 2, 3], [0.1] * 4, states, [0, 0, 0, 1], numpy.ones((4, 52), dtype=bool))
+
+    filename = str(tmp_path / 'network.h5')
+    save_model(network, config, filename)
+    loaded, loaded_config = load_model(filename)
+    assert loaded_config == config
+    numpy.testing.assert_allclose(loaded(states).numpy(), network(states).numpy(), rtol=1e-6)
+
+
+def test_smaller_architectures_are_cheaper():
+    legacy = ARCHITECTURES['legacy']
+    assert legacy.parameters() == model(legacy).count_params()
+    assert ARCHITECTURES['small'].flops() < ARCHITECTURES['medium'].flops() < legacy.flops()
+
+
+def _step_changes_weights(**targets) -> bool:
+    network = model(ARCHITECTURES['small'])
+    weights = network.get_weights()
+    states = numpy.random.default_rng(1).integers(-1, 5, (4, STATE_SIZE)).astype(numpy.float32)
+    # a Q-learning rate of 0 keeps the action taken at its current value; no action is legal
+    Trainer(network, 0.0, 0.4, **targets)(states, [0, 1, 2, 3], [1.0] * 4, states, [0] * 4, numpy.zeros((4, 52), bool))
+    return any(not numpy.array_equal(new, old) for new, old in zip(network.get_weights(), weights))
+
+
+def test_default_targets_leave_only_the_action_taken_in_the_loss():
+    assert not _step_changes_weights()
+    # 'rules' also trains the other actions to the invalid move value
+    assert _step_changes_weights(targets='rules')
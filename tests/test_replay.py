@@ -0,0 +1,63 @@
+import numpy
+
+from src.replay import ReplayBuffer, SumTree
+
+
+def add(buffer: ReplayBuffer, value: int):
+    state = numpy.full(54, value, dtype=numpy.float32)
+    legal = numpy.zeros(52, dtype=bool)
+    legal[value % 52] = True
+    buffer.add(state, value % 52, float(value), state + 1, value % 2 == 0, legal, legal)
+
+
+def test_ring_overwrites_oldest():
+    buffer = ReplayBuffer(4, seed=0)
+    for value in range(6):
+        add(buffer, value)
+    assert len(buffer) == 4
+    assert sorted(buffer.rewards) == [2, 3, 4, 5]
+
+    batch = buffer.sample(16)
+    assert batch.states.shape == (16, 54)
+    assert set(batch.rewards) <= {2, 3, 4, 5}
+    assert (batch.actions == batch.rewards % 52).all()
+    assert (batch.next_states[:, 0] == batch.states[:, 0] + 1).all()
+    assert (batch.weights == 1).all()
+
+
+def test_sum_tree_find():
+    tree = SumTree(5)
+    for index, priority in enumerate([1.0, 0.0, 2.0, 3.0, 4.0]):
+        tree.update(index, priority)
+    assert tree.total == 10
+    assert list(tree.find(numpy.array([0.5, 1.5, 2.9, 3.5, 9.9]))) == [0, 2, 2, 3, 4]
+
+
+def test_prioritized_sampling_prefers_large_errors():
+    buffer = ReplayBuffer(8, prioritized=True, seed=1)
+    for value in range(8):
+        add(buffer, value)
+    errors = numpy.ones(8)
+    errors[3] = 100
+    buffer.update_priorities(numpy.arange(8), errors)
+
+    batch = buffer.sample(64)
+    assert (batch.indices == 3).mean() > 0.5
+    assert batch.weights[batch.indices == 3].max() < batch.weights.max()
+
+
+def test_extend_wraps_like_add():
+    added, extended = ReplayBuffer(5, prioritized=True), ReplayBuffer(5, prioritized=True)
+    for value in range(7):
+        add(added, value)
+    states = numpy.repeat(numpy.arange(7, dtype=numpy.float32)[:, None], 54, axis=1)
+    legal = numpy.zeros((7, 52), dtype=bool)
+    legal[numpy.arange(7), numpy.arange(7)] = True
+    actions = numpy.arange(7)
+    extended.extend(states[:4], actions[:4], actions[:4], states[:4] + 1, actions[:4] % 2 == 0, legal[:4], legal[:4])
+    extended.extend(states[4:], actions[4:], actions[4:], states[4:] + 1, actions[4:] % 2 == 0, legal[4:], legal[4:])
+    assert len(extended) == len(added) == 5
+    assert extended.position == added.position
+    assert (extended.rewards == added.rewards).all()
+    assert (extended.states == added.states).all()
+    assert extended.tree.total == added.tree.total
@@ -0,0 +1,70 @@
+import csv
+import os
+
+import numpy
+import pytest
+
+from src.results import ResultWriter, decode_cards, encode_cards, join_cards, read_results
+
+GAME = ['W:SA', 'N:S2E:S3', '.', 'S:SK', 'E:HTS:CJW:D9N:C2']
+
+
+def test_encode_cards():
+    codes = encode_cards([join_cards(GAME), '', 'N:CA'])
+    assert codes.shape == (3, 52)
+    assert decode_cards(codes[0]) == 'W:SAN:S2E:S3S:SKE:HTS:CJW:D9N:C2'
+    assert decode_cards(codes[1]) == ''
+    assert list(codes[2][:2]) == [1 * 64 + 12, 255]
+
+
+def test_chunks_append_and_export(tmp_path):
+    path, csv_path = str(tmp_path / 'run' / 'offence.bin'), str(tmp_path / 'offence.csv')
+    with ResultWriter(path, chunk_size=2, csv_path=csv_path) as writer:
+        for episode in range(5):
+            writer.write(episode, episode % 2, episode / 10, GAME[:episode])
+    with ResultWriter(path, chunk_size=2, append=True) as writer:
+        writer.write(5, 3, -1.5, GAME)
+
+    results = read_results(path)
+    assert list(results['episode']) == list(range(6))
+    assert list(results['invalid']) == [0, 1, 0, 1, 0, 3]
+    assert results['value'].dtype == numpy.float32 and results['value'][5] == -1.5
+    assert decode_cards(results['cards'][3]) == 'W:SAN:S2E:S3'
+
+    with open(csv_path) as f:
+        rows = list(csv.reader(f))
+    assert rows[4] == ['4', '0', '0.4', 'W:SAN:S2E:S3S:SK']
+    assert len(rows) == 5
+
+
+def test_integer_values(tmp_path):
+    path = str(tmp_path / 'tricks.bin')
+    with ResultWriter(path, numpy.int32) as writer:
+        writer.write(0, 0, 7, GAME)
+    assert read_results(path)['value'].tolist() == [7]
+
+
+def test_sync_size_truncates_to_the_synced_rows(tmp_path):
+    path = str(tmp_path / 'offence.bin')
+    writer = ResultWriter(path)
+    writer.write(0, 0, 1.0, GAME)
+    size = writer.sync()
+    writer.write(1, 0, 2.0, GAME)
+    writer.close()
+
+    os.truncate(path, size)
+    with ResultWriter(path, append=True) as writer:
+        writer.write(1, 2, 3.0, GAME)
+    results = read_results(path)
+    assert results['episode'].tolist() == [0, 1]
+    assert results['value'].tolist() == [1.0, 3.0]
+
+
+def test_conversion_errors_surface_on_close(tmp_path):
+    writer = ResultWriter(str(tmp_path / 'offence.bin'), chunk_size=1)
+    writer.write(0, 0, 1.0, ['W:S'])
+    # more chunks than the queue holds, which used to block once the writer thread was gone
+    for episode in range(1, 10):
+        writer.write(episode, 0, 1.0, GAME)
+    with pytest.raises(ValueError):
+        writer.close()
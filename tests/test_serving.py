@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from src.agents import NumpyQAgent
+from src.data import opponent_deal, player_deal
+from src.env import BridgeEnv
+from src.inference import NumpyQNetwork, export
+from src.network import ARCHITECTURES, model
+from src.serving import InferenceServer, RemoteQAgent
+from tests.helpers import LowestCardAgent
+
+
+def test_batched_moves_match_local_inference(tmp_path):
+    config = ARCHITECTURES['small']
+    path = str(tmp_path / 'small.qnet')
+    export(model(config).get_weights(), config, path)
+    network = NumpyQNetwork.load(path)
+    sizes = []
+
+    def forward(inputs):
+        sizes.append(len(inputs))
+        return network(inputs)
+
+    server = InferenceServer(forward, max_batch=8, max_latency=0.02)
+    socket_path = str(tmp_path / 'q.sock')
+    server.start(socket_path)
+    local = NumpyQAgent(path)
+    mismatches, moves = [], []
+
+    def play_game(deal):
+        remote = RemoteQAgent(socket_path)
+        env = BridgeEnv()
+        env.setup(deal, LowestCardAgent())
+        done = False
+        while not done:
+            action = remote.move(env.state)
+            moves.append(action)
+            if action != local.move(env.state):
+                mismatches.append(action)
+            _, _, done, _ = env.step(action)
+        remote.close()
+
+    games = [threading.Thread(target=play_game, args=(deal, )) for deal in [player_deal, opponent_deal] * 4]
+    for game in games:
+        game.start()
+    for game in games:
+        game.join()
+    server.stop()
+
+    assert not mismatches
+    assert server.requests == sum(sizes) == len(moves)
+    assert max(sizes) > 1 and max(sizes) <= 8
+
+
+def test_failed_forward_pass_closes_connection(tmp_path):
+    config = ARCHITECTURES['small']
+    path = str(tmp_path / 'small.qnet')
+    export(model(config).get_weights(), config, path)
+    network = NumpyQNetwork.load(path)
+    calls = []
+
+    def forward(inputs):
+        calls.append(len(inputs))
+        if len(calls) == 1:
+            raise ValueError('bad batch')
+        return network(inputs)
+
+    server = InferenceServer(forward, max_batch=8, max_latency=0.001)
+    socket_path = str(tmp_path / 'q.sock')
+    server.start(socket_path)
+    env = BridgeEnv()
+    env.setup(player_deal, LowestCardAgent())
+    failing = RemoteQAgent(socket_path)
+    with pytest.raises(ConnectionError):
+        failing.move(env.state)
+    failing.close()
+    # the batcher survives the failure and serves the next client
+    remote = RemoteQAgent(socket_path)
+    assert remote.move(env.state) == NumpyQAgent(path).move(env.state)
+    remote.close()
+    server.stop()
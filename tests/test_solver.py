@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from src.agents import Agent, DoubleDummyAgent
+from src.data import player_deal
+from src.engine import NO_TRUMP, BitState
+from src.models import Card, Contract, Deal, GameState, Player, Trump, hand_factory
+from src.solver import DoubleDummySolver, quick_tricks, remaining_tricks
+
+
+def minimax(game: BitState) -> int:
+    if game.done:
+        return 0
+    values = []
+    for card in game.legal_moves():
+        child = game.copy()
+        winner = child.play(card)
+        values.append((1 if winner >= 0 and winner % 2 else 0) + minimax(child))
+    return max(values) if game.player % 2 else min(values)
+
+
+def random_ending(rng: random.Random, cards_per_hand: int) -> BitState:
+    cards = rng.sample(range(52), 4 * cards_per_hand)
+    hands = [sum(1 << card for card in cards[i * cards_per_hand:(i + 1) * cards_per_hand]) for i in range(4)]
+    game = BitState(hands, rng.randrange(4), rng.randrange(5))
+    for _ in range(rng.randrange(3)):
+        game.play(rng.choice(game.legal_moves()))
+    return game
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_matches_minimax(seed):
+    rng = random.Random(seed)
+    solver = DoubleDummySolver()
+    for _ in range(25):
+        game = random_ending(rng, rng.randint(1, 3))
+        assert solver.ns_tricks(game) == minimax(game)
+
+
+def test_best_move_is_optimal():
+    rng = random.Random(11)
+    solver = DoubleDummySolver()
+    for _ in range(25):
+        game = random_ending(rng, 3)
+        values = solver.move_values(game)
+        assert values[solver.best_move(game)] == max(values.values()) == solver.tricks(game)
+
+
+def test_accepts_game_state():
+    deal = Deal(
+        hand_w=hand_factory(['SA', 'S2']),
+        hand_n=hand_factory(['SK', 'HA']),
+        hand_e=hand_factory(['S3', 'S4']),
+        hand_s=hand_factory(['S5', 'S6']),
+        declarer=Player.SOUTH,
+        leader=Player.WEST,
+        contract=Contract(1, Trump.NO_TRUMP),
+    )
+    state = GameState.from_deal(deal)
+    solver = DoubleDummySolver()
+    # West cashes the ace, North then wins the king and the ace of hearts is stranded with the lead
+    assert solver.ns_tricks(state) == 1
+    assert solver.tricks(state) == 1
+    assert solver.best_move(state) == Card.from_str('SA')
+    assert remaining_tricks(BitState.from_state(state)) == 2
+
+
+class FixedAgent(Agent):
+    def __init__(self, card: int):
+        self.card = card
+
+    def move(self, state: GameState) -> int:
+        return self.card
+
+
+def test_double_dummy_agent():
+    deal = Deal(
+        hand_w=hand_factory(['SA', 'S2']),
+        hand_n=hand_factory(['SK', 'HA']),
+        hand_e=hand_factory(['S3', 'S4']),
+        hand_s=hand_factory(['S5', 'S6']),
+        declarer=Player.SOUTH,
+        leader=Player.WEST,
+        contract=Contract(1, Trump.NO_TRUMP),
+    )
+    ending = GameState.from_deal(deal)
+    fallback = FixedAgent(Card.from_str('S2'))
+    agent = DoubleDummyAgent(fallback=fallback)
+    assert agent.move(ending) == Card.from_str('SA')
+    assert agent.move_values(ending)[Card.from_str('SA')] == 1
+    # a full deal is past `max_cards` and left to the fallback instead of a full search
+    assert agent.move(GameState.from_deal(player_deal)) == fallback.card
+    assert DoubleDummyAgent(max_cards=1, fallback=fallback).move(ending) == fallback.card
+
+
+def test_quick_tricks():
+    hands = [
+        sum(1 << Card.from_str(card) for card in hand)
+        for hand in (['SA', 'SK', 'HA'], ['S2', 'H2', 'D2'], ['S3', 'H3', 'D3'], ['S4', 'H4', 'D4'])
+    ]
+    tricks, relevant = quick_tricks(hands, 0, NO_TRUMP)
+    assert tricks == 3
+    assert relevant == 1 << Card.from_str('SK') | 1 << Card.from_str('HA')
+    # with spades trumps the heart ace only counts while every other trump holder still follows hearts
+    assert quick_tricks(hands, 0, 3)[0] == 3
+    hands[2] = sum(1 << Card.from_str(card) for card in ['S3', 'D5', 'D3'])
+    assert quick_tricks(hands, 0, 3)[0] == 2
@@ -0,0 +1,62 @@
+import random
+
+import numpy
+
+from src.engine import BitState
+from src.models import Contract, Deal, Player, Trump, hand_factory
+from src.store import HashStore
+
+
+def test_insert_grow_and_find():
+    store = HashStore(3, capacity=4)
+    rng = random.Random(0)
+    keys = list({rng.getrandbits(64) or 1 for _ in range(1000)})
+    for value, key in enumerate(keys):
+        store.row(key)[:] = value
+    assert len(store) == len(keys)
+    assert store.capacity >= len(keys) / 0.7
+    for value, key in enumerate(keys):
+        assert key in store
+        assert (store.get(key) == value).all()
+    assert 12345 not in store
+    assert (store.get(12345) == 0).all()
+
+
+def test_save_and_memory_mapped_load(tmp_path):
+    path = str(tmp_path / 'store.bin')
+    store = HashStore(52, numpy.float16)
+    store.row(7)[3] = 1.5
+    store.row(9)[0] = -float('inf')
+    store.save(path)
+
+    loaded = HashStore.load(path)
+    assert loaded.dtype == numpy.float16 and len(loaded) == 2
+    assert loaded.get(7)[3] == 1.5
+    assert loaded.get(9)[0] == -float('inf')
+    # updates stay in memory until saved again
+    loaded.row(7)[3] = 2
+    loaded.row(11)[1] = 1
+    assert HashStore.load(path).get(7)[3] == 1.5
+    loaded.save(path)
+    reloaded = HashStore.load(path, mmap=False)
+    assert reloaded.get(7)[3] == 2 and reloaded.get(11)[1] == 1
+
+
+def test_state_key_depends_on_player_view():
+    deal = Deal(
+        hand_w=hand_factory(['SA', 'S2']),
+        hand_n=hand_factory(['SK', 'HA']),
+        hand_e=hand_factory(['S3', 'S4']),
+        hand_s=hand_factory(['S5', 'S6']),
+        declarer=Player.SOUTH,
+        leader=Player.WEST,
+        contract=Contract(1, Trump.NO_TRUMP),
+    )
+    game = BitState.from_deal(deal)
+    assert game.key() == BitState.from_deal(deal).key()
+    played = game.copy()
+    played.play(played.legal_moves()[0])
+    assert played.key() != game.key()
+    other_trump = game.copy()
+    other_trump.trump = 0
+    assert other_trump.key() != game.key()
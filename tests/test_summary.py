@@ -0,0 +1,50 @@
+import os
+
+import numpy
+from matplotlib import cbook
+
+from src import summary
+from src.results import ResultWriter
+from src.summary import box_stats, summarize_folder
+
+
+def write_csv(path, rows):
+    with open(path, 'w') as f:
+        for episode, (invalid, tricks) in enumerate(rows):
+            f.write(f'{episode},{invalid},{tricks},W:SAN:S2\n')
+
+
+def test_box_stats_match_matplotlib():
+    data = numpy.concatenate([numpy.random.default_rng(0).integers(3, 8, 101), [30, 31, 31]])
+    values, counts = numpy.unique(data, return_counts=True)
+    stats = box_stats(list(zip(values.tolist(), counts.tolist())))
+    expected = cbook.boxplot_stats(data)[0]
+    for key in ('mean', 'med', 'q1', 'q3', 'iqr', 'whislo', 'whishi'):
+        assert numpy.isclose(stats[key], expected[key])
+    assert sorted(stats['fliers']) == sorted(expected['fliers'])
+
+
+def test_folder_summaries_are_cached(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    write_csv(os.path.join(folder, 'offence.csv'), [(0, 7), (2, 5), (0, 7)])
+    write_csv(os.path.join(folder, 'defence.csv'), [(1, 3)])
+    with ResultWriter(os.path.join(folder, 'same_trump.bin'), numpy.int32) as writer:
+        writer.write(0, 4, 9, [])
+
+    summaries = summarize_folder(folder)
+    assert set(summaries) == {'offence.csv', 'defence.csv', 'same_trump.bin'}
+    assert summaries['offence.csv']['invalid'] == [0, 2, 0]
+    assert summaries['offence.csv']['value_counts'] == [(5, 1), (7, 2)]
+    assert summaries['same_trump.bin']['invalid_counts'] == [(4, 1)]
+
+    calls = []
+    original = summary.summarize
+    monkeypatch.setattr(summary, 'summarize', lambda path: calls.append(os.path.basename(path)) or original(path))
+    assert summarize_folder(folder)['offence.csv']['invalid'] == [0, 2, 0]
+    assert calls == []
+
+    write_csv(os.path.join(folder, 'defence.csv'), [(1, 3), (5, 2)])
+    summaries = summarize_folder(folder)
+    assert calls == ['defence.csv']
+    assert summaries['defence.csv']['invalid'] == [1, 5]
+    assert box_stats(summaries['offence.csv']['value_counts'])['med'] == 7
@@ -0,0 +1,63 @@
+import csv
+
+import pytest
+
+from src import sweep as sweep_module
+from src.sweep import StoppingRule, grid, parse_space, sample, sweep, write_table
+
+
+def test_grid_and_samples_of_a_space():
+    space = parse_space(['learning_rate=0.1,0.2', 'architecture=small,medium', 'batch-size=16:64'])
+    assert space['batch_size'] == ('uniform', 16, 64)
+    with pytest.raises(ValueError):
+        grid(space)
+    del space['batch_size']
+    assert grid(space) == [
+        {'learning_rate': 0.1, 'architecture': 'small'},
+        {'learning_rate': 0.1, 'architecture': 'medium'},
+        {'learning_rate': 0.2, 'architecture': 'small'},
+        {'learning_rate': 0.2, 'architecture': 'medium'},
+    ]
+
+    trials = sample(parse_space(['rand_factor=log:0.01:0.5', 'target_sync=0:100']), 20, seed=1)
+    assert trials == sample(parse_space(['rand_factor=log:0.01:0.5', 'target_sync=0:100']), 20, seed=1)
+    assert all(0.01 <= trial['rand_factor'] <= 0.5 for trial in trials)
+    assert all(isinstance(trial['target_sync'], int) and 0 <= trial['target_sync'] <= 100 for trial in trials)
+    with pytest.raises(ValueError):
+        parse_space(['epsilon=0.1'])
+
+
+def test_median_stopping_rule():
+    rule = StoppingRule(grace=1, min_trials=2)
+    scores = {}
+    # nothing to compare with, or still in the grace period
+    assert not rule.should_stop(scores, 0, 1, 5.0)
+    assert not rule.should_stop(scores, 1, 0, -9.0)
+    assert not rule.should_stop(scores, 1, 1, 3.0)
+    assert rule.should_stop(scores, 2, 1, 1.0)
+    assert not rule.should_stop(scores, 3, 1, 4.0)
+    assert rule.score([1.0, 3.0], [0, 1]) == 1.5
+
+
+def test_sweep_writes_one_table(tmp_path, monkeypatch):
+    def learn(env, player, opponent, episodes, replay, **settings):
+        # a fixed reward per trial, its learning rate times ten
+        for episode in range(episodes):
+            yield episode, 0, player.learning_rate * 10, []
+
+    monkeypatch.setattr(sweep_module, 'learn', learn)
+    trials = grid(parse_space(['architecture=small', 'learning_rate=0.3,0.1']))
+    rule = StoppingRule(report_every=2, window=2, grace=0, min_trials=1)
+    results = list(sweep(trials, 4, rule=rule))
+    assert [result['trial'] for result in results] == [0, 1]
+    assert results[0]['episodes'] == 4 and not results[0]['stopped']
+    # the second trial scores 1.0 at its first report, below the median of the first one's 3.0
+    assert results[1]['episodes'] == 2 and results[1]['stopped']
+    assert results[1]['score'] == pytest.approx(1.0)
+
+    path = str(tmp_path / 'sweep.csv')
+    write_table(path, results)
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    assert [float(row['score']) for row in rows] == sorted((result['score'] for result in results), reverse=True)
+    assert set(rows[0]) >= {'trial', 'architecture', 'learning_rate', 'episodes', 'stopped', 'score'}
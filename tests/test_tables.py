@@ -0,0 +1,53 @@
+import random
+
+from src.agents import RandomAgent
+from src.engine import PLAYER_ID, TRUMPS, BitState
+from src.env import BridgeEnv
+from src.models import Card, Contract, Deal, Player
+from src.tables import TrickTables, deal_key
+from src.validate import play
+from tests.test_solver import minimax
+
+
+def small_deal(rng: random.Random, size: int) -> Deal:
+    cards = [Card(card) for card in rng.sample(range(52), 4 * size)]
+    hands = [set(cards[i * size:(i + 1) * size]) for i in range(4)]
+    declarer = rng.choice([Player.NORTH, Player.SOUTH, Player.EAST])
+    return Deal(*hands, declarer=declarer, leader=declarer.next, contract=Contract(1, rng.choice(TRUMPS)))
+
+
+def test_fill_matches_minimax(tmp_path):
+    rng = random.Random(4)
+    deals = [small_deal(rng, 3) for _ in range(4)]
+    tables = TrickTables(str(tmp_path / 'tables.bin'))
+    assert tables.fill(deals + deals[:1], processes=2) == 4
+    assert tables.fill(deals, processes=2) == 0
+    tables.save()
+
+    loaded = TrickTables(tables.path)
+    assert len(loaded) == 4
+    for deal in deals:
+        assert deal in loaded
+        for declarer in Player:
+            for trump in TRUMPS:
+                board = Deal(
+                    deal.hand_w, deal.hand_n, deal.hand_e, deal.hand_s, declarer, declarer.next, Contract(1, trump)
+                )
+                ns = minimax(BitState.from_deal(board))
+                expected = ns if PLAYER_ID[declarer] % 2 else 3 - ns
+                assert loaded.tricks(deal, declarer, trump) == expected
+    assert loaded.table(small_deal(rng, 3)) is None
+
+
+def test_validation_reports_gap_to_optimum(tmp_path):
+    rng = random.Random(5)
+    deals = [small_deal(rng, 2) for _ in range(3)]
+    tables = TrickTables(str(tmp_path / 'tables.bin'))
+    tables.fill(deals, processes=1)
+
+    env = BridgeEnv()
+    results = list(play(env, RandomAgent(), RandomAgent(), 3, iter(deals), tables))
+    assert len(results) == 3
+    *_, below_optimal = results[-1]
+    assert below_optimal == tables.ns_tricks(deals[-1]) - env.state.tricks_ns
+    assert deal_key(deals[0]) != deal_key(deals[1])
@@ -0,0 +1,38 @@
+from functools import partial
+
+import pytest
+
+from src.agents import DeepQLearnAgent, QLearnAgent, RandomAgent
+from src.env import BridgeEnv, Rewards
+from src.replay import ReplayBuffer
+from src.train import learn, learn_parallel
+
+
+def test_actors_stream_episodes_to_learner():
+    player = DeepQLearnAgent(learning_rate=0.2, discount_factor=0.4, rand_factor=0.1)
+    replay = ReplayBuffer(1000)
+    results = list(learn_parallel(player, 2, 4, replay, batch_size=8, publish_every=1, seed=0))
+    episodes = sorted(episode for episode, _, _, _ in results)
+    # two actors, two episodes each, with the deal parity kept
+    assert episodes == [0, 1, 2, 3]
+    assert len(replay) >= 4 * 26
+    assert all(len(cards_played) >= 26 for _, _, _, cards_played in results)
+
+
+@pytest.mark.parametrize('agent', [QLearnAgent, partial(DeepQLearnAgent, architecture='small')])
+def test_exploring_agents_only_play_legal_cards(agent):
+    player = agent(learning_rate=0.2, discount_factor=0.4, rand_factor=0.5)
+    results = list(learn(BridgeEnv(), player, RandomAgent(), 4))
+    assert [invalid_actions for _, invalid_actions, _, _ in results] == [0] * 4
+
+
+class LosingEnv(BridgeEnv):
+    # every match ends lost
+    def step(self, action):
+        observation, reward, done, info = super().step(action)
+        return observation, Rewards.MATCH_LOST.value if done else reward, done, info
+
+
+def test_lost_matches_are_not_invalid_moves():
+    results = list(learn(LosingEnv(), QLearnAgent(0.2, 0.4, 0.0), RandomAgent(), 2))
+    assert [invalid_actions for _, invalid_actions, _, _ in results] == [0, 0]
@@ -0,0 +1,41 @@
+import argparse
+import random
+
+import numpy
+
+from src.agents import DeepQLearnAgent, RandomAgent
+from src.architectures import ARCHITECTURES
+from src.env import BridgeEnv
+from src.validate import agent_factories, play, play_parallel
+from tests.helpers import LowestCardAgent
+
+
+def test_shards_are_reproducible():
+    one = list(play_parallel(12, 1, shard_size=5, seed=7, agent=RandomAgent))
+    three = list(play_parallel(12, 3, shard_size=5, seed=7, agent=RandomAgent))
+    assert one == three
+    assert [row[0] for row in one] == list(range(12))
+
+    # the first shard is the serial run with the shard seed
+    random.seed(7)
+    numpy.random.seed(7)
+    agent = RandomAgent()
+    serial = list(play(BridgeEnv(), agent, agent, 5))
+    assert one[:5] == serial
+
+
+def test_workers_play_against_their_own_opponent():
+    parallel = list(play_parallel(5, 1, shard_size=5, seed=7, agent=RandomAgent, opponent=LowestCardAgent))
+    random.seed(7)
+    numpy.random.seed(7)
+    assert parallel == list(play(BridgeEnv(), RandomAgent(), LowestCardAgent(), 5))
+
+
+def test_opponent_architecture_builds_its_network():
+    args = argparse.Namespace(mcts=None, numpy=None, endgame=None, architecture=None, opponent_architecture='small')
+    player, opponent = agent_factories(args)
+    built = opponent()
+    assert isinstance(built, DeepQLearnAgent) and built.config == ARCHITECTURES['small']
+
+    args.opponent_architecture = None
+    assert agent_factories(args)[1] is None
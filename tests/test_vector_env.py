@@ -0,0 +1,49 @@
+import itertools
+
+import numpy
+import pytest
+
+from src.data import opponent_deal, player_deal, validation_deal_other_trump, validation_deal_same_trump
+from src.env import BridgeEnv, Rewards
+from src.vector_env import VectorBridgeEnv
+from tests.helpers import LowestCardAgent
+
+DEALS = (player_deal, opponent_deal, validation_deal_same_trump, validation_deal_other_trump)
+
+
+def lowest_card_policy(observations, legal):
+    return numpy.argmax(legal, axis=1)
+
+
+def test_matches_bridge_env():
+    vector_env = VectorBridgeEnv(len(DEALS), itertools.cycle(DEALS), lowest_card_policy)
+    _, legal = vector_env.reset()
+    envs = [BridgeEnv() for _ in DEALS]
+    for env, deal in zip(envs, DEALS):
+        env.setup(deal, LowestCardAgent())
+
+    for step in range(26):
+        actions = numpy.argmax(legal[:, ::-1], axis=1)
+        actions = 51 - actions  # highest legal card
+        observations, rewards, dones, legal = vector_env.step(actions)
+        for game, env in enumerate(envs):
+            observation, reward, done, _ = env.step(int(actions[game]))
+            assert rewards[game] == pytest.approx(reward)
+            assert dones[game] == done
+            if done:
+                assert vector_env.final_tricks_ns[game] == env.state.tricks_ns
+            else:
+                assert sorted(numpy.nonzero(legal[game])[0]) == sorted(env.state.valid_moves)
+                assert (observations[game] == observation).all()
+    assert dones.all()
+
+
+def test_invalid_action_keeps_state():
+    vector_env = VectorBridgeEnv(2, itertools.cycle(DEALS[:2]))
+    observations, legal = vector_env.reset()
+    illegal = numpy.argmin(legal, axis=1)
+    next_observations, rewards, dones, next_legal = vector_env.step(illegal)
+    assert (rewards == Rewards.INVALID_MOVE.value).all()
+    assert not dones.any()
+    assert (next_observations == observations).all()
+    assert (next_legal == legal).all()